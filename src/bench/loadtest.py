@@ -0,0 +1,406 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import socketio
+
+from bench.plans import make_plan
+from bench.run import versions
+from gantt import codec
+
+CLIENTS = (1, 5, 10, 25, 50)
+SOURCE_DIR = Path(__file__).resolve().parent.parent
+SOCKET_PATH = "/_nicegui_ws/socket.io"
+# the page embeds its elements as JSON in the same way for every NiceGUI 1.x page
+ELEMENTS = re.compile(r"String\.raw`(.*?)`\)", re.S)
+CLIENT_ID = re.compile(r"['\"]client_id['\"]: ['\"]([0-9a-f-]+)['\"]")
+SHARED_GANTT = "loadtest"
+# server gauges reported next to the process numbers
+SERVER_METRICS = ("gantt_clients", "gantt_sessions", "gantt_session_memory_bytes")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def is_update(event: str, args: tuple) -> bool:
+    return event == "update"
+
+
+def is_download(event: str, args: tuple) -> bool:
+    return event == "download"
+
+
+def is_diagram(event: str, args: tuple) -> bool:
+    # the mermaid element gets the new chart as argument of its update method
+    code = args[0].get("code", "") if event == "run_javascript" and args else ""
+    return '"update", ["' in code and '"update", [""]' not in code
+
+
+def percentiles(values: list) -> dict:
+    '''Nearest rank percentiles in milliseconds.'''
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def rank(p: float) -> float:
+        return values[max(0, math.ceil(p * len(values)) - 1)] * 1000
+
+    return {"count": len(values), "p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99), "max": values[-1] * 1000}
+
+
+class Server:
+    '''The app in a separate process on a free localhost port, with its own store and working directory.'''
+
+    def __init__(self, url: str = None) -> None:
+        self.url = url
+        self.process = None
+        self.directory = None
+
+    def start(self, timeout: float = 60) -> None:
+        if self.url is not None:
+            return
+        self.directory = tempfile.TemporaryDirectory(prefix="gantt-loadtest-")
+        port = free_port()
+        env = dict(os.environ, PORT=str(port), PYTHONPATH=str(SOURCE_DIR),
+                   GANTT_STORE=f"sqlite:///{self.directory.name}/loadtest.db", GANTT_RELOAD="0",
+                   GANTT_STORAGE_SECRET=os.environ.get("GANTT_STORAGE_SECRET") or secrets.token_hex(16))
+        self.process = subprocess.Popen([sys.executable, "-m", "ui.main"], cwd=self.directory.name, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with {self.process.returncode}")
+            try:
+                httpx.get(f"{self.url}/metrics", timeout=1)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Server did not answer within {timeout} seconds")
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.directory is not None:
+            self.directory.cleanup()
+            self.directory = None
+
+    def usage(self):
+        '''(rss bytes, cpu seconds) of the server process, None where /proc is not available.'''
+        if self.process is None:
+            return None
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                fields = f.read().rpartition(")")[2].split()
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                pages = int(f.read().split()[1])
+        except OSError:
+            return None
+        ticks = os.sysconf("SC_CLK_TCK")
+        # utime and stime are fields 14 and 15 of stat, counted from the state after the command name
+        return pages * os.sysconf("SC_PAGE_SIZE"), (int(fields[11]) + int(fields[12])) / ticks
+
+    def metrics(self) -> dict:
+        try:
+            text = httpx.get(f"{self.url}/metrics", timeout=5).text
+        except httpx.HTTPError:
+            return {}
+        values = {}
+        for line in text.splitlines():
+            name, _, value = line.partition(" ")
+            if name in SERVER_METRICS:
+                values[name] = float(value)
+        return values
+
+
+class SimulatedClient:
+    '''
+    One browser tab of the editor: loads the page, connects the websocket like nicegui.js does and
+    sends the events of clicks and tab changes. The elements are kept up to date from the updates
+    of the server, so rows added during the run can be clicked as well.
+    '''
+
+    def __init__(self, url: str, path: str, timeout: float) -> None:
+        self.url = url
+        self.path = path
+        self.timeout = timeout
+        self.http = httpx.AsyncClient(base_url=url, timeout=timeout)
+        self.socket = socketio.AsyncClient(reconnection=False)
+        self.socket.on("*", self.on_message)
+        self.client_id = None
+        self.elements = {}
+        self.latencies = {}
+        self.errors = {}
+        self.messages = 0
+        self.message_bytes = 0
+        self.events = 0
+        self.waiting = None
+
+    async def on_message(self, event: str, *args) -> None:
+        self.messages += 1
+        self.message_bytes += sum(len(arg) if isinstance(arg, bytes) else len(json.dumps(arg, default=repr))
+                                  for arg in args)
+        if event == "update" and args:
+            for id, element in args[0].items():
+                if element is None:
+                    self.elements.pop(id, None)
+                else:
+                    self.elements[id] = element
+        if self.waiting is not None and not self.waiting[1].done() and self.waiting[0](event, args):
+            self.waiting[1].set_result(event)
+
+    async def timed(self, name: str, action, expect=is_update) -> None:
+        '''Time from sending the action until the first message of the server matching expect arrives.'''
+        future = asyncio.get_running_loop().create_future()
+        self.waiting = (expect, future)
+        start = time.perf_counter()
+        try:
+            await action()
+            await asyncio.wait_for(future, self.timeout)
+        except Exception as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            self.errors.setdefault("last", f"{name}: {type(e).__name__} {e}")
+            return
+        finally:
+            self.waiting = None
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    async def open(self) -> None:
+        async def load():
+            response = await self.http.get(self.path)
+            response.raise_for_status()
+            raw = ELEMENTS.search(response.text).group(1)
+            for entity, char in (("&#36;", "$"), ("&#96;", "`"), ("&gt;", ">"), ("&lt;", "<"), ("&amp;", "&")):
+                raw = raw.replace(entity, char)
+            self.elements = json.loads(raw)
+            self.client_id = CLIENT_ID.search(response.text).group(1)
+            self.message_bytes += len(response.content)
+            await self.socket.connect(f"{self.url}?client_id={self.client_id}", socketio_path=SOCKET_PATH,
+                                      transports=["websocket"], wait_timeout=self.timeout)
+            if not await self.socket.call("handshake", {"client_id": self.client_id, "tab_id": self.client_id},
+                                          timeout=self.timeout):
+                raise RuntimeError("Handshake refused")
+            # nothing has to be waited for, the page is complete after the handshake
+            if not self.waiting[1].done():
+                self.waiting[1].set_result("handshake")
+
+        await self.timed("open", load)
+
+    async def close(self) -> None:
+        if self.socket.connected:
+            await self.socket.disconnect()
+        await self.http.aclose()
+
+    def find(self, tag: str, **props):
+        '''The id of the last element with the tag and props, None if there is none.'''
+        found = None
+        for id, element in self.elements.items():
+            if element.get("tag") == tag and all(element.get("props", {}).get(k) == v for k, v in props.items()):
+                if found is None or int(id) > int(found):
+                    found = id
+        return found
+
+    async def emit(self, id: str, type: str, *args) -> None:
+        if id is None:
+            raise LookupError(f"No element for {type}")
+        listener = next(event["listener_id"] for event in self.elements[id].get("events", ()) if event["type"] == type)
+        self.events += 1
+        await self.socket.emit("event", {"id": int(id), "client_id": self.client_id, "listener_id": listener,
+                                         "args": [json.dumps(arg) for arg in args]})
+
+    async def click(self, name: str, **props) -> None:
+        await self.timed(name, lambda: self.emit(self.find("q-btn", **props), "click"))
+
+    async def switch_tab(self, name: str, label: str, expect=is_update) -> None:
+        async def switch():
+            await self.emit(self.find("q-tabs"), "update:modelValue", label)
+            # the browser reports the end of the panel animation, the diagram is drawn then
+            await self.emit(self.find("q-tab-panels"), "transition", label)
+
+        await self.timed(name, switch, expect)
+
+    async def upload(self, data: bytes) -> None:
+        async def post():
+            upload = self.find("nicegui-upload")
+            if upload is None:
+                raise LookupError("No upload element")
+            response = await self.http.post(self.elements[upload]["props"]["url"],
+                                            files={"file": ("loadtest.json", data, "application/json")})
+            response.raise_for_status()
+
+        await self.timed("upload", post)
+
+    async def session(self, rounds: int, tasks: int, upload: bytes, think: float) -> None:
+        for _ in range(rounds):
+            await self.click("add_swimlane", label="Add Swimlane")
+            for _ in range(tasks):
+                await self.click("add_task", icon="add")
+                await asyncio.sleep(think)
+            await self.switch_tab("timeline", "Timeline", is_diagram)
+            await asyncio.sleep(think)
+            await self.switch_tab("data", "Data")
+            await self.timed("download", lambda: self.emit(self.find("q-btn", label="Save Diagram"), "click"),
+                             is_download)
+            if upload:
+                await self.upload(upload)
+            await asyncio.sleep(think)
+
+
+async def run_level(server: Server, count: int, args, upload: bytes) -> dict:
+    path = f"/?gantt={SHARED_GANTT}" if args.shared else "/"
+    clients = [SimulatedClient(server.url, path, args.timeout) for _ in range(count)]
+    before = server.usage()
+    peak = before[0] if before else 0
+    start = time.perf_counter()
+
+    async def sample():
+        nonlocal peak
+        while True:
+            usage = server.usage()
+            if usage:
+                peak = max(peak, usage[0])
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample())
+    try:
+        await asyncio.gather(*(client.open() for client in clients))
+        await asyncio.gather(*(client.session(args.rounds, args.tasks, upload, args.think)
+                               for client in clients if client.client_id))
+        after = server.usage()
+        elapsed = time.perf_counter() - start
+        metrics = await asyncio.to_thread(server.metrics)
+        # all clients stay connected without doing anything, the server should not do anything either
+        await asyncio.sleep(args.idle)
+        idle = server.usage()
+    finally:
+        sampler.cancel()
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+    latencies = {}
+    errors = {}
+    for client in clients:
+        for name, values in client.latencies.items():
+            latencies.setdefault(name, []).extend(values)
+        for name, value in client.errors.items():
+            if name == "last":
+                errors["last"] = value
+            else:
+                errors[name] = errors.get(name, 0) + value
+    result = {
+        "clients": count,
+        "seconds": elapsed,
+        "latency_ms": {name: percentiles(values) for name, values in latencies.items()},
+        "errors": errors,
+        "events_sent": sum(client.events for client in clients),
+        "messages_received": sum(client.messages for client in clients),
+        "bytes_received": sum(client.message_bytes for client in clients),
+        "server_metrics": metrics,
+    }
+    if before and after:
+        result["server"] = {
+            "rss_bytes": after[0],
+            "peak_rss_bytes": max(peak, after[0]),
+            "cpu_seconds": after[1] - before[1],
+            "cpu_percent": 100 * (after[1] - before[1]) / elapsed,
+            "idle_cpu_percent": 100 * (idle[1] - after[1]) / args.idle if args.idle and idle else None,
+        }
+    return result
+
+
+def print_level(result: dict) -> None:
+    print(f"{result['clients']} clients, {result['seconds']:.1f} s", file=sys.stderr)
+    for name, value in result["latency_ms"].items():
+        if value["count"]:
+            print(f"  {name:14} p50 {value['p50']:8.1f}  p90 {value['p90']:8.1f}  p99 {value['p99']:8.1f} ms",
+                  file=sys.stderr)
+    print(f"  {'messages':14} {result['messages_received'] / result['clients']:8.0f} per client, "
+          f"{result['bytes_received'] / result['clients'] / 1024:8.0f} KiB per client", file=sys.stderr)
+    server = result.get("server")
+    if server:
+        print(f"  {'server':14} {server['rss_bytes'] / 2 ** 20:8.0f} MiB rss, {server['peak_rss_bytes'] / 2 ** 20:.0f} "
+              f"MiB peak, {server['cpu_percent']:.0f} % cpu", file=sys.stderr)
+        if server["idle_cpu_percent"] is not None:
+            print(f"  {'idle':14} {server['idle_cpu_percent']:8.1f} % cpu", file=sys.stderr)
+    for name, value in result["errors"].items():
+        print(f"  error {name}: {value}", file=sys.stderr)
+
+
+async def run(args) -> dict:
+    upload = codec.dumps(make_plan(args.upload_tasks, 3, 0.2)) if args.upload_tasks else b""
+    server = Server(args.url)
+    await asyncio.to_thread(server.start)
+    report = {"versions": versions(), "parameters": vars(args), "results": []}
+    try:
+        if args.shared:
+            # all clients of a level open the same gantt and get the changes of the others pushed
+            httpx.put(f"{server.url}/api/gantts/{SHARED_GANTT}", content=codec.dumps(make_plan(10, 2, 0.2)),
+                      timeout=args.timeout).raise_for_status()
+        for count in map(int, args.clients.split(",")):
+            result = await run_level(server, count, args, upload)
+            report["results"].append(result)
+            print_level(result)
+    finally:
+        await asyncio.to_thread(server.stop)
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Drives simulated editor clients against a local instance")
+    parser.add_argument("--clients", default=",".join(map(str, CLIENTS)), help="comma separated client counts")
+    parser.add_argument("--rounds", type=int, default=3, help="scenario runs per client")
+    parser.add_argument("--tasks", type=int, default=5, help="tasks added per round")
+    parser.add_argument("--upload-tasks", type=int, default=50, help="tasks of the uploaded plan, 0 for no upload")
+    parser.add_argument("--think", type=float, default=0.1, help="seconds between the steps of a client")
+    parser.add_argument("--idle", type=float, default=5, help="seconds the clients stay connected doing nothing")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--shared", action="store_true", help="all clients edit the same gantt")
+    parser.add_argument("--url", help="use a running instance instead of starting one (no process numbers then)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
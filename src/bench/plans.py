@@ -0,0 +1,52 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import random
+import uuid
+from datetime import date, timedelta
+
+from gantt.gantt_builder import Gantt, Section, Task
+
+DURATION_UNITS = ("d", "d", "d", "w", "m")
+
+
+def make_plan(tasks: int, sections: int = 10, dependency_density: float = 0.0, seed: int = 42) -> Gantt:
+    '''
+    Synthetic plan with the given number of tasks spread evenly over the sections. Within a section
+    every task starts at the end of its predecessor like the editor sets it up, dependency_density
+    is the share of tasks with an "after" reference to one of the 50 tasks before them.
+    '''
+    rng = random.Random(seed)
+    sections = max(1, min(sections, tasks))
+    result = []
+    ids = []
+    for s in range(sections):
+        count = tasks // sections + (1 if s < tasks % sections else 0)
+        section_tasks = []
+        day = date(2024, 1, 1) + timedelta(days=rng.randrange(60))
+        for i in range(count):
+            length = rng.randint(1, 10)
+            task = Task(f"Task {s}.{i}", id=str(uuid.UUID(int=rng.getrandbits(128), version=4)), start=str(day), duration=f"{length}{rng.choice(DURATION_UNITS)}",
+                        end=str(day + timedelta(days=length)),
+                        type="Milestone" if rng.random() < 0.05 else "Task",
+                        status=rng.choice(("", "", "active", "done")), critical=rng.random() < 0.1)
+            if ids and rng.random() < dependency_density:
+                task.after = [rng.choice(ids[-50:])]
+            day += timedelta(days=length)
+            section_tasks.append(task)
+            ids.append(task.id)
+        result.append(Section(f"Swimlane {s}", section_tasks))
+    return Gantt(id=f"bench-{tasks}-{sections}-{dependency_density}", title=f"Benchmark {tasks}", sections=result)
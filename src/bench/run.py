@@ -0,0 +1,242 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from bench.plans import make_plan
+from gantt import codec
+from gantt.gantt_builder import gantt_decoder, gantt_encoder
+from gantt.levelling import Leveller, level
+from gantt.scheduler import schedule
+
+SIZES = (10, 1000, 10000, 100000)
+SOURCE_DIR = Path(__file__).resolve().parent.parent
+
+
+def timed(function, repeat: int, setup=None) -> dict:
+    '''With setup, function gets a fresh result of setup for every run, the setup is not timed.'''
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        function() if setup is None else function(argument)
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat}
+
+
+def allocated(function) -> int:
+    '''Bytes still allocated after function returned, the result is kept alive while measuring.'''
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def bench_model(tasks: int, sections: int, density: float, repeat: int) -> dict:
+    results = {}
+    gantt = make_plan(tasks, sections, density)
+    all_tasks = [task for section in gantt.sections for task in section.tasks]
+    middle = all_tasks[len(all_tasks) // 2]
+
+    results["mermaid_cold"] = timed(lambda: make_plan(tasks, sections, density).get_mermaid_str(), repeat)
+    results["mermaid_compact_cold"] = timed(
+        lambda: make_plan(tasks, sections, density).get_mermaid_str(compact=True), repeat)
+    results["plan_build"] = timed(lambda: make_plan(tasks, sections, density), repeat)
+    gantt.get_mermaid_str()
+
+    def edit_and_render():
+        middle.title = middle.title + "x"
+        gantt.get_mermaid_str()
+    results["mermaid_after_edit"] = timed(edit_and_render, repeat)
+
+    def insert_and_remove():
+        task = middle._parent.add_task("x", middle)
+        middle._parent.remove_task(task)
+    results["insert_remove_middle"] = timed(insert_and_remove, repeat)
+
+    results["schedule_plan"] = timed(lambda: schedule(gantt), repeat)
+    # levelled start days with two tasks per swimlane, the tasks are not changed. The dependency graph is
+    # kept with the gantt, so only the first run builds it
+    results["level_plan"] = timed(lambda: Leveller(gantt, 2).plan(), repeat)
+    # what the Level Resources button costs: graph, levelling and writing the dates of a plan levelled
+    # for the first time, and again after an edit with the graph kept with the gantt
+    results["level"] = timed(lambda plan: level(plan, 2), repeat, setup=lambda: make_plan(tasks, sections, density))
+    levelled = make_plan(tasks, sections, density)
+    level(levelled, 2)
+    edited = [task for section in levelled.sections for task in section.tasks][tasks // 2]
+
+    def edit_and_level():
+        edited.duration = "1d" if edited.duration != "1d" else "2d"
+        level(levelled, 2)
+    results["level_after_edit"] = timed(edit_and_level, repeat)
+
+    legacy = json.dumps(gantt, default=gantt_encoder)
+    results["legacy_encode"] = timed(lambda: json.dumps(gantt, default=gantt_encoder), repeat)
+    results["legacy_decode"] = timed(lambda: json.loads(legacy, object_hook=gantt_decoder), repeat)
+    data = codec.dumps(gantt)
+    results["codec_encode"] = timed(lambda: codec.dumps(gantt), repeat)
+    results["codec_decode"] = timed(lambda: codec.loads(data, None, None), repeat)
+    results["document_bytes"] = {"legacy": len(legacy.encode()), "codec": len(data)}
+    # the text sent to the browser, with the task ids and with the short names of the editor
+    results["mermaid_bytes"] = {"ids": len(gantt.get_mermaid_str().encode()),
+                                "compact": len(gantt.get_mermaid_str(compact=True).encode())}
+
+    memory = allocated(lambda: make_plan(tasks, sections, density))
+    rendered = allocated(lambda: (lambda g: (g, g.get_mermaid_str()))(make_plan(tasks, sections, density)))
+    results["memory"] = {"plan_bytes": memory, "bytes_per_task": memory / tasks,
+                         "rendered_bytes_per_task": rendered / tasks}
+    return results
+
+
+def bench_editor(tasks: int, sections: int, density: float, repeat: int) -> dict:
+    '''Builds the editor page without a browser, the client is never connected.'''
+    from nicegui import Client
+    from nicegui.page import page
+
+    from ui.main import GanttEditor
+
+    results = {}
+    gantt = make_plan(tasks, sections, density)
+    section = gantt.sections[len(gantt.sections) // 2]
+    task = section.tasks[len(section.tasks) // 2]
+
+    clients = []
+
+    def build_page():
+        client = Client(page("/"), request=None)
+        with client:
+            editor = GanttEditor()
+            editor.gantt = gantt
+            editor.create_ui(gantt)
+        clients.append(client)
+        return client
+
+    results["create_ui"] = timed(build_page, repeat)
+    client = build_page()
+    results["elements_per_client"] = len(client.elements)
+    results["memory"] = {"client_bytes": allocated(build_page)}
+    # every editor listens to the gantt, closed pages stop listening with the next change
+    for client in clients:
+        client.delete()
+    editor = GanttEditor()
+    editor.gantt = gantt
+    results["calc_end_date"] = timed(lambda: editor.calc_end_date(section, task), repeat)
+    return results
+
+
+def bench_startup(repeat: int) -> dict:
+    '''Imports in a fresh interpreter, what a new replica or a batch run pays before doing any work.'''
+    results = {}
+    for name, code in (("interpreter", "pass"), ("import_app", "import ui.main"), ("import_batch", "import gantt.batch")):
+        command = [sys.executable, "-c", code]
+        results[name] = timed(lambda: subprocess.run(command, cwd=SOURCE_DIR, check=True), repeat)
+    return results
+
+
+def timings(result: dict, prefix: str = ""):
+    for name, value in result.items():
+        if isinstance(value, dict) and "median" in value:
+            yield prefix + name, value["median"]
+        elif isinstance(value, dict):
+            yield from timings(value, f"{prefix}{name}.")
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    '''Benchmarks whose median is more than tolerance slower than in the baseline report.'''
+    found = []
+    groups = [(f"{size} tasks", result, baseline["results"].get(str(size), {}))
+              for size, result in report["results"].items()]
+    groups.append(("startup", report.get("startup", {}), baseline.get("startup", {})))
+    for label, result, old_result in groups:
+        old = dict(timings(old_result))
+        for name, median in timings(result):
+            if name in old and median > old[name] * (1 + tolerance):
+                found.append(f"{label} {name}: {old[name] * 1000:.2f} ms -> {median * 1000:.2f} ms")
+    return found
+
+
+def versions() -> dict:
+    import numpy
+
+    result = {"python": platform.python_version(), "numpy": numpy.__version__, "platform": platform.platform()}
+    try:
+        import nicegui
+
+        result["nicegui"] = nicegui.__version__
+    except ImportError:
+        pass
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of the gantt model, scheduling, serialization and page build")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated task counts")
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--density", type=float, default=0.2, help="share of tasks with an 'after' dependency")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-editor", action="store_true", help="skip the NiceGUI page build")
+    parser.add_argument("--no-startup", action="store_true", help="skip the import time measurements")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    report = {"versions": versions(), "parameters": vars(args), "results": {}}
+    if not args.no_startup:
+        report["startup"] = bench_startup(args.repeat)
+        print("startup", file=sys.stderr)
+        for name, median in timings(report["startup"]):
+            print(f"  {name:26} {median * 1000:10.2f} ms", file=sys.stderr)
+    for size in map(int, args.sizes.split(",")):
+        result = bench_model(size, args.sections, args.density, args.repeat)
+        if not args.no_editor:
+            result["editor"] = bench_editor(size, args.sections, args.density, args.repeat)
+        report["results"][size] = result
+        print(f"{size} tasks", file=sys.stderr)
+        for name, median in timings(result):
+            print(f"  {name:26} {median * 1000:10.2f} ms", file=sys.stderr)
+        print(f"  {'bytes per task':26} {result['memory']['bytes_per_task']:10.0f}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
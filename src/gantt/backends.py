@@ -0,0 +1,284 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import os
+import secrets
+import sqlite3
+import time
+from pathlib import Path
+
+
+class GanttBackend:
+    '''
+    Persistent storage of serialized gantts shared by all worker processes.
+
+    Every save returns a new version of the document, workers compare versions to find out
+    whether another process has changed a gantt.
+
+    A backend may keep a journal of changes per gantt. A save writes a snapshot of the
+    whole document and drops the journal, append adds the records of the latest changes.
+    '''
+
+    def load(self, id: str):
+        '''Returns (data, version, records) or None if there is no such gantt, records is the journal since data was saved.'''
+        raise NotImplementedError
+
+    def save(self, id: str, data: str):
+        raise NotImplementedError
+
+    def append(self, id: str, records: list, version):
+        '''
+        Adds journal records to a saved gantt and returns the new version. Records only apply to the version
+        they were made for, None if the gantt is no longer at version, there is no journal or no such gantt.
+        '''
+        return None
+
+    def delete(self, id: str) -> bool:
+        '''Removes the gantt, its journal and its share token.'''
+        raise NotImplementedError
+
+    def version(self, id: str):
+        raise NotImplementedError
+
+    def ids(self) -> list:
+        raise NotImplementedError
+
+    def share(self, id: str) -> str:
+        '''The token of the read-only link of a gantt, made up on the first call and kept with the gantt.'''
+        raise NotImplementedError
+
+    def shared(self, token: str):
+        '''The id of the gantt a token belongs to, None for unknown tokens.'''
+        raise NotImplementedError
+
+    def assign(self, user: str, id: str, replace: bool = True) -> str:
+        '''
+        Remembers the gantt a browser edits, so every worker opens the same one. Without replace an
+        existing assignment is kept. Returns the id assigned to user.
+        '''
+        raise NotImplementedError
+
+    def assigned(self, user: str):
+        '''The id of the gantt assigned to user, None if there is none.'''
+        raise NotImplementedError
+
+
+def new_token() -> str:
+    # random, nothing about the gantt can be derived from it
+    return secrets.token_urlsafe(18)
+
+
+def is_token(token: str) -> bool:
+    return bool(token) and len(token) <= 64 and all(c.isalnum() or c in "-_" for c in token)
+
+
+class SqliteBackend(GanttBackend):
+    def __init__(self, path: str) -> None:
+        # several processes may use the same database, WAL lets readers work while one of them writes
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS gantts (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(gantts)")]
+        if "version" not in columns:
+            self.db.execute("ALTER TABLE gantts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        self.db.execute("CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY, id TEXT NOT NULL, record TEXT NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS journal_id ON journal (id, seq)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS shares (token TEXT PRIMARY KEY, id TEXT NOT NULL UNIQUE)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS users (user TEXT PRIMARY KEY, id TEXT NOT NULL)")
+        self.db.commit()
+
+    def load(self, id: str):
+        # snapshot and journal are read in one transaction, a concurrent save must not come in between
+        with self.db:
+            self.db.execute("BEGIN")
+            row = self.db.execute("SELECT data, version FROM gantts WHERE id = ?", (id,)).fetchone()
+            if row is None:
+                return None
+            records = [record for (record,) in self.db.execute("SELECT record FROM journal WHERE id = ? ORDER BY seq", (id,))]
+        return row[0], row[1], records
+
+    def save(self, id: str, data: str):
+        with self.db:
+            # the snapshot contains everything in the journal, this is the compaction
+            self.db.execute("DELETE FROM journal WHERE id = ?", (id,))
+            return self.db.execute(
+                "INSERT INTO gantts (id, data, updated, version) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated = excluded.updated, version = version + 1 "
+                "RETURNING version", (id, data, time.time())).fetchone()[0]
+
+    def append(self, id: str, records: list, version):
+        with self.db:
+            # another worker may have written in between, its records would be mixed up with these
+            row = self.db.execute("UPDATE gantts SET updated = ?, version = version + 1 WHERE id = ? AND version = ? "
+                                  "RETURNING version", (time.time(), id, version)).fetchone()
+            if row is None:
+                return None
+            self.db.executemany("INSERT INTO journal (id, record) VALUES (?, ?)", ((id, record) for record in records))
+            return row[0]
+
+    def delete(self, id: str) -> bool:
+        with self.db:
+            self.db.execute("DELETE FROM journal WHERE id = ?", (id,))
+            self.db.execute("DELETE FROM shares WHERE id = ?", (id,))
+            return self.db.execute("DELETE FROM gantts WHERE id = ?", (id,)).rowcount > 0
+
+    def version(self, id: str):
+        row = self.db.execute("SELECT version FROM gantts WHERE id = ?", (id,)).fetchone()
+        return row[0] if row else None
+
+    def ids(self) -> list:
+        return [id for (id,) in self.db.execute("SELECT id FROM gantts")]
+
+    def share(self, id: str) -> str:
+        with self.db:
+            # the first worker to share a gantt decides its token
+            self.db.execute("INSERT INTO shares (token, id) VALUES (?, ?) ON CONFLICT(id) DO NOTHING", (new_token(), id))
+            return self.db.execute("SELECT token FROM shares WHERE id = ?", (id,)).fetchone()[0]
+
+    def shared(self, token: str):
+        row = self.db.execute("SELECT id FROM shares WHERE token = ?", (token,)).fetchone()
+        return row[0] if row else None
+
+    def assign(self, user: str, id: str, replace: bool = True) -> str:
+        with self.db:
+            conflict = "DO UPDATE SET id = excluded.id" if replace else "DO NOTHING"
+            self.db.execute(f"INSERT INTO users (user, id) VALUES (?, ?) ON CONFLICT(user) {conflict}", (user, id))
+            return self.db.execute("SELECT id FROM users WHERE user = ?", (user,)).fetchone()[0]
+
+    def assigned(self, user: str):
+        row = self.db.execute("SELECT id FROM users WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else None
+
+
+class FileBackend(GanttBackend):
+    '''
+    One JSON file per gantt, the modification time serves as version. There is no journal, every change writes the whole file.
+    The share token of a gantt is kept in <id>.share, shares/<token> holds the id for the lookup.
+    users/<user> holds the id of the gantt assigned to a browser.
+    '''
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shares = self.directory / "shares"
+        self.shares.mkdir(exist_ok=True)
+        self.users = self.directory / "users"
+        self.users.mkdir(exist_ok=True)
+
+    def path(self, id: str) -> Path:
+        check_name(id)
+        return self.directory / f"{id}.json"
+
+    def load(self, id: str):
+        try:
+            path = self.path(id)
+            stat = path.stat()
+            return path.read_text(), stat.st_mtime_ns, []
+        except (FileNotFoundError, KeyError):
+            return None
+
+    def save(self, id: str, data: str):
+        path = self.path(id)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(data)
+        # replace is atomic, other processes either see the old or the new document
+        os.replace(tmp, path)
+        return path.stat().st_mtime_ns
+
+    def delete(self, id: str) -> bool:
+        try:
+            path = self.path(id)
+        except KeyError:
+            return False
+        share = path.with_suffix(".share")
+        if share.exists():
+            (self.shares / share.read_text()).unlink(missing_ok=True)
+            share.unlink(missing_ok=True)
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def version(self, id: str):
+        try:
+            return self.path(id).stat().st_mtime_ns
+        except (FileNotFoundError, KeyError):
+            return None
+
+    def ids(self) -> list:
+        return [path.stem for path in self.directory.glob("*.json")]
+
+    def share(self, id: str) -> str:
+        share = self.path(id).with_suffix(".share")
+        token = new_token()
+        (self.shares / token).write_text(id)
+        try:
+            # exclusive create, the first worker to share a gantt decides its token
+            with open(share, "x") as f:
+                f.write(token)
+            return token
+        except FileExistsError:
+            (self.shares / token).unlink()
+            return share.read_text()
+
+    def shared(self, token: str):
+        if not is_token(token):
+            return None
+        try:
+            return (self.shares / token).read_text()
+        except FileNotFoundError:
+            return None
+
+    def assign(self, user: str, id: str, replace: bool = True) -> str:
+        check_name(id)
+        path = self.users / check_name(user)
+        if replace:
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(id)
+            os.replace(tmp, path)
+            return id
+        try:
+            # exclusive create, the first worker to assign a gantt to the browser decides
+            with open(path, "x") as f:
+                f.write(id)
+            return id
+        except FileExistsError:
+            return path.read_text()
+
+    def assigned(self, user: str):
+        try:
+            return (self.users / check_name(user)).read_text() or None
+        except (FileNotFoundError, KeyError):
+            return None
+
+
+def check_name(name: str) -> str:
+    # ids end up in file names, so only accept what uuids are made of
+    if not name or not all(c.isalnum() or c == "-" for c in name):
+        raise KeyError(name)
+    return name
+
+
+def open_backend(url: str) -> GanttBackend:
+    '''sqlite:///path/to/file.db or file:///path/to/directory, a plain path is taken as SQLite database.'''
+    if url.startswith("file://"):
+        return FileBackend(url[len("file://"):])
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://"):]
+        # sqlite:///relative.db and sqlite:////absolute.db like SQLAlchemy
+        url = url[1:] if url.startswith("/") else url
+    return SqliteBackend(url)
@@ -0,0 +1,121 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from gantt import codec
+from gantt.importers import IMPORTERS, load_file
+from gantt.levelling import level
+from gantt.svg_renderer import build_svg
+
+FORMATS = {"mermaid": ".mmd", "svg": ".svg", "json": ".json"}
+# files picked up from a directory, CSV and MS Project XML are imported
+SUFFIXES = (".json", *IMPORTERS)
+
+
+def find_files(patterns: list) -> list:
+    '''Gantt files for directories, glob patterns and plain file names, in a stable order.'''
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(path for path in Path(pattern).iterdir() if path.suffix.lower() in SUFFIXES))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            files.extend(Path(match) for match in (matches or [pattern]))
+    # the same file given twice is converted once
+    return list(dict.fromkeys(files))
+
+
+def convert(path: Path, output_dir: Path, formats: tuple, max_tasks: int, capacity: int = None) -> list:
+    '''
+    Converts one gantt file, runs in a worker process and returns the written files.
+    With a capacity the plan is levelled first, 0 resolves the dependencies without a limit.
+    '''
+    with open(path, "rb") as f:
+        gantt = load_file(f, path.name, None, max_tasks)
+    if capacity is not None:
+        level(gantt, capacity or None)
+    written = []
+    for format in formats:
+        target = (output_dir or path.parent) / (path.stem + FORMATS[format])
+        if target.resolve() == path.resolve():
+            raise ValueError(f"{target} would overwrite the input, use --output-dir")
+        if format == "json":
+            # imported plans saved in the editor's format
+            target.write_bytes(codec.dumps(gantt, indent=True))
+            written.append(str(target))
+            continue
+        if format == "svg":
+            content = build_svg(gantt)
+        else:
+            content = gantt.get_mermaid_document()
+        target.write_text(content, encoding="utf-8")
+        written.append(str(target))
+    return written
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m gantt.batch",
+                                     description="Converts saved gantt JSON, CSV and MS Project XML files to "
+                                                 "mermaid, SVG and gantt JSON")
+    parser.add_argument("paths", nargs="+", help="gantt files, directories or glob patterns like 'reports/**/*.json'")
+    parser.add_argument("-o", "--output-dir", help="directory for the results, next to the input files by default")
+    parser.add_argument("-f", "--format", action="append", choices=sorted(FORMATS),
+                        help="output format, can be given more than once (default mermaid)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--max-tasks", type=int, default=codec.MAX_TASKS)
+    parser.add_argument("--level", type=int, metavar="CAPACITY",
+                        help="level the plan first, at most CAPACITY tasks per swimlane at a time (0: no limit)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only report errors")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    formats = tuple(dict.fromkeys(args.format or ["mermaid"]))
+    output_dir = Path(args.output_dir) if args.output_dir else None
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(files) or 1))) as executor:
+        futures = {executor.submit(convert, path, output_dir, formats, args.max_tasks, args.level): path for path in files}
+        # results are reported as they finish, not in input order
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                written = future.result()
+            except Exception as e:
+                # one broken file must not stop the whole run
+                failed += 1
+                print(f"[{done}/{len(files)}] {path}: {e}", file=sys.stderr, flush=True)
+                continue
+            if not args.quiet:
+                print(f"[{done}/{len(files)}] {path} -> {', '.join(written)}", file=sys.stderr, flush=True)
+
+    if not args.quiet:
+        print(f"converted {len(files) - failed} of {len(files)} files in {time.perf_counter() - start:.1f}s",
+              file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import json
+
+from gantt.gantt_builder import Gantt, Section, Task
+
+# optional faster backends, the standard json module is used without them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# version 1: gantt fields, sections with title and tasks, task references (before/after) as ids.
+# Files without a schema are the documents written by gantt_encoder, they have the same layout
+# but carry complete tasks in before/after.
+SCHEMA_VERSION = 1
+GANTT_FIELDS = ("id", "title", "show_weekends", "show_title", "axis_format", "tick_interval", "show_today",
+                "section0bgcolor", "even_sectionbgcolor", "odd_sectionbgcolor", "taskbgcolor")
+TASK_FIELDS = ("id", "title", "type", "status", "critical", "active", "start", "end", "duration")
+REFERENCE_FIELDS = ("before", "after")
+# the types of the fields, null stands for the default value
+TASK_TYPES = {"title": str, "type": str, "status": str, "start": str, "end": str, "duration": str,
+              "critical": bool, "active": bool}
+GANTT_TYPES = {"title": str, "axis_format": str, "tick_interval": str, "section0bgcolor": str,
+               "even_sectionbgcolor": str, "odd_sectionbgcolor": str, "taskbgcolor": str,
+               "show_weekends": bool, "show_title": bool, "show_today": bool}
+TYPE_NAMES = {str: "a string", bool: "true or false"}
+
+MAX_BYTES = 20 * 1024 * 1024
+MAX_TASKS = 100000
+CHUNK_SIZE = 64 * 1024
+
+
+class GanttFormatError(ValueError):
+    pass
+
+
+class GanttLimitError(GanttFormatError):
+    pass
+
+
+def ref_id(ref) -> str:
+    if isinstance(ref, str):
+        return ref
+    if isinstance(ref, dict):
+        return ref["id"]
+    return ref.id
+
+
+def encode(gantt: Gantt) -> dict:
+    doc = {"schema": SCHEMA_VERSION}
+    for field in GANTT_FIELDS:
+        doc[field] = getattr(gantt, field)
+    doc["sections"] = [encode_section(section) for section in gantt.sections]
+    return doc
+
+
+def encode_section(section: Section) -> dict:
+    return {"title": section.title, "tasks": [encode_task(task) for task in section.tasks]}
+
+
+def encode_task(task: Task) -> dict:
+    doc = {field: getattr(task, field) for field in TASK_FIELDS}
+    for field in REFERENCE_FIELDS:
+        doc[field] = [ref_id(ref) for ref in getattr(task, field)]
+    return doc
+
+
+def typed_fields(doc: dict, types: dict) -> dict:
+    '''The fields of types present in doc. Raises GanttFormatError for values of another type.'''
+    fields = {}
+    # one pass over the document, this runs for every task of a large plan
+    for field, value in doc.items():
+        kind = types.get(field)
+        if kind is not None and value is not None:
+            if value.__class__ is not kind:
+                raise GanttFormatError(f"{field} must be {TYPE_NAMES[kind]}")
+            fields[field] = value
+    return fields
+
+
+def task_id(doc: dict):
+    '''The id of a task document, None if it has none.'''
+    id = doc.get("id")
+    if id is not None and (not isinstance(id, str) or not id):
+        raise GanttFormatError("Task id must be a non-empty string")
+    return id
+
+
+def task_fields(doc: dict) -> dict:
+    '''The fields of a task document except the id, checked for their types. Raises GanttFormatError.'''
+    if not isinstance(doc, dict):
+        raise GanttFormatError("Task is not an object")
+    fields = typed_fields(doc, TASK_TYPES)
+    for field in REFERENCE_FIELDS:
+        refs = doc.get(field)
+        if refs is None:
+            continue
+        if refs.__class__ is not list:
+            raise GanttFormatError(f"{field} must be a list of task ids")
+        if refs:
+            # legacy documents carry the referenced tasks instead of their ids
+            refs = [ref.get("id") if ref.__class__ is dict else ref for ref in refs]
+            for ref in refs:
+                if ref.__class__ is not str:
+                    raise GanttFormatError(f"{field} must be a list of task ids")
+        fields[field] = refs
+    return fields
+
+
+def decode_task(doc: dict) -> Task:
+    fields = task_fields(doc)
+    if "title" not in fields:
+        raise GanttFormatError("Task without title")
+    id = task_id(doc)
+    if id is not None:
+        fields["id"] = id
+    return Task(**fields)
+
+
+def section_parts(doc: dict) -> tuple:
+    '''Title and task documents of a section document.'''
+    if not isinstance(doc, dict):
+        raise GanttFormatError("Section is not an object")
+    title = doc.get("title")
+    if title is not None and not isinstance(title, str):
+        raise GanttFormatError("Section title must be a string")
+    tasks = doc.get("tasks")
+    if tasks is not None and not isinstance(tasks, list):
+        raise GanttFormatError("Section tasks must be a list")
+    return title or "", tasks or []
+
+
+def decode_section(doc: dict) -> Section:
+    title, tasks = section_parts(doc)
+    return Section(title, [decode_task(task) for task in tasks])
+
+
+def gantt_fields(doc: dict) -> dict:
+    '''The settings of a gantt document, checked for their types.'''
+    schema = doc.get("schema", SCHEMA_VERSION)
+    if not isinstance(schema, int) or isinstance(schema, bool) or schema > SCHEMA_VERSION:
+        raise GanttFormatError(f"Unsupported schema version {schema!r}")
+    fields = typed_fields(doc, GANTT_TYPES)
+    if doc.get("id") is not None:
+        if not isinstance(doc["id"], str):
+            raise GanttFormatError("id must be a string")
+        fields["id"] = doc["id"]
+    return fields
+
+
+def decode(doc: dict, max_tasks: int = MAX_TASKS) -> Gantt:
+    if not isinstance(doc, dict) or not isinstance(doc.get("sections"), list):
+        raise GanttFormatError("Not a gantt document")
+    fields = gantt_fields(doc)
+    builder = GanttBuilder(max_tasks)
+    for section in doc["sections"]:
+        title, tasks = section_parts(section)
+        builder.add_section(title)
+        for task in tasks:
+            builder.add_task(task)
+    return builder.build(fields)
+
+
+class GanttBuilder:
+    '''Collects sections and tasks of a document and enforces the task limit on the way.'''
+
+    def __init__(self, max_tasks: int = MAX_TASKS) -> None:
+        self.max_tasks = max_tasks
+        # title and tasks per section, the model objects are created at the end
+        self.sections = []
+        self.task_count = 0
+
+    def add_section(self, title: str) -> None:
+        self.sections.append([title, []])
+
+    def add_task(self, doc: dict) -> None:
+        self.task_count += 1
+        if self.max_tasks is not None and self.task_count > self.max_tasks:
+            raise GanttLimitError(f"More than {self.max_tasks} tasks")
+        self.sections[-1][1].append(decode_task(doc))
+
+    def build(self, fields: dict) -> Gantt:
+        return Gantt(sections=[Section(title, tasks) for title, tasks in self.sections], **fields)
+
+
+def dumps_json(doc, indent: bool = False) -> bytes:
+    '''Compact UTF-8 JSON, pretty printed with indent.'''
+    if orjson is not None:
+        return orjson.dumps(doc, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(doc, indent=2).encode()
+    return json.dumps(doc, separators=(",", ":")).encode()
+
+
+def loads_json(data):
+    try:
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    except ValueError as e:
+        raise GanttFormatError(str(e)) from e
+
+
+def dumps(gantt: Gantt, indent: bool = False) -> bytes:
+    return dumps_json(encode(gantt), indent)
+
+
+def loads(data, max_bytes: int = MAX_BYTES, max_tasks: int = MAX_TASKS) -> Gantt:
+    if max_bytes is not None and len(data) > max_bytes:
+        raise GanttLimitError(f"Document larger than {max_bytes} bytes")
+    return decode(loads_json(data), max_tasks)
+
+
+class LimitedReader:
+    '''File wrapper which stops reading as soon as more than max_bytes have been read.'''
+
+    def __init__(self, fileobj, max_bytes: int) -> None:
+        self.fileobj = fileobj
+        self.max_bytes = max_bytes
+        self.count = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size if size is not None and size >= 0 else CHUNK_SIZE)
+        self.count += len(data)
+        if self.max_bytes is not None and self.count > self.max_bytes:
+            raise GanttLimitError(f"Document larger than {self.max_bytes} bytes")
+        return data
+
+
+def load_stream(fileobj, max_bytes: int = MAX_BYTES, max_tasks: int = MAX_TASKS) -> Gantt:
+    '''
+    Reads a gantt from a binary file object. With ijson the document is parsed incrementally,
+    so the limits abort a large upload early and the raw document is never held in memory as a whole.
+    '''
+    reader = LimitedReader(fileobj, max_bytes)
+    if ijson is None:
+        chunks = []
+        while chunk := reader.read(CHUNK_SIZE):
+            chunks.append(chunk)
+        return loads(b"".join(chunks), None, max_tasks)
+
+    builder = GanttBuilder(max_tasks)
+    fields = {}
+    task = None
+    has_sections = False
+    # containers where a value is expected, they end up as a value of the wrong type and are refused
+    nested = ("start_map", "start_array")
+    # events which do not carry a value of the prefix itself
+    structure = ("map_key", "end_map", "end_array")
+    try:
+        for prefix, event, value in ijson.parse(reader, buf_size=CHUNK_SIZE):
+            if prefix == "sections":
+                if event == "start_array":
+                    has_sections = True
+                elif event != "end_array":
+                    raise GanttFormatError("Not a gantt document")
+            elif prefix == "sections.item":
+                if event == "start_map":
+                    builder.add_section("")
+                elif event not in structure:
+                    raise GanttFormatError("Section is not an object")
+            elif prefix == "sections.item.title":
+                builder.sections[-1][0] = section_parts({"title": {} if event in nested else value})[0]
+            elif prefix == "sections.item.tasks":
+                if event not in ("start_array", "end_array", "null"):
+                    raise GanttFormatError("Section tasks must be a list")
+            elif prefix == "sections.item.tasks.item":
+                if event == "start_map":
+                    task = {}
+                elif event == "end_map":
+                    builder.add_task(task)
+                    task = None
+                elif event != "map_key":
+                    raise GanttFormatError("Task is not an object")
+            elif task is not None:
+                field = prefix[len("sections.item.tasks.item."):]
+                if field in TASK_FIELDS:
+                    if event in nested:
+                        task[field] = {}
+                    elif event not in structure:
+                        task[field] = value
+                elif field in REFERENCE_FIELDS:
+                    if event == "start_array":
+                        task[field] = []
+                    elif event not in structure:
+                        task[field] = {} if event == "start_map" else value
+                elif field in ("before.item", "after.item"):
+                    # an id, or a legacy task which brings its id next
+                    if event in ("string", "start_map"):
+                        task[field.split(".")[0]].append(value)
+                    elif event not in structure:
+                        raise GanttFormatError(f"{field.split('.')[0]} must be a list of task ids")
+                elif field in ("before.item.id", "after.item.id") and event not in structure:
+                    task[field.split(".")[0]][-1] = value if event == "string" else None
+            elif "." not in prefix:
+                if event in ("string", "number", "boolean", "null"):
+                    fields[prefix] = value
+                elif event in nested:
+                    fields[prefix] = {}
+    except ijson.JSONError as e:
+        raise GanttFormatError(str(e)) from e
+    if not has_sections:
+        raise GanttFormatError("Not a gantt document")
+    return builder.build(gantt_fields(fields))
@@ -0,0 +1,256 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from collections import deque
+
+import numpy as np
+
+from gantt.gantt_builder import Gantt, Task
+from gantt.scheduler import parse_dates, parse_durations
+
+# dates are handled as business day numbers counted from this monday, a weekend day gets the number of the following monday
+ORIGIN = np.datetime64("1970-01-05", "D")
+
+# task fields read by the graph, a change of a reference or id needs a new graph
+DATE_FIELDS = frozenset(("start", "end", "duration"))
+STRUCTURE_FIELDS = frozenset(("before", "after", "id"))
+
+
+class DependencyCycleError(ValueError):
+    def __init__(self, task_ids: list) -> None:
+        super().__init__(f"Cyclic task dependencies: {', '.join(task_ids)}")
+        self.task_ids = task_ids
+
+
+def ref_id(ref) -> str:
+    # before/after hold Task objects when built in the editor and ids when they come from elsewhere
+    return ref if isinstance(ref, str) else ref.id
+
+
+class DependencyGraph:
+    '''
+    Resolves the after/before references of all tasks of a gantt.
+
+    "A after B" makes A start at the end of B, "A before B" makes B start at the end of A.
+    A task without predecessors keeps its start date. The graph has to be rebuilt with build()
+    after tasks or references have been added or removed, see follow() for a graph which is kept
+    up to date with the changes of the gantt.
+    '''
+
+    def __init__(self, gantt: Gantt) -> None:
+        self.gantt = gantt
+        self.build()
+
+    def build(self) -> None:
+        self.tasks = {}
+        for section in self.gantt.sections:
+            for task in section.tasks:
+                self.tasks[task.id] = task
+        # most tasks have no dependencies, they share the empty tuple until an edge is added
+        self.successors = dict.fromkeys(self.tasks, ())
+        self.predecessors = dict.fromkeys(self.tasks, ())
+        self.missing = set()
+        for task_id, task in self.tasks.items():
+            for ref in task.after:
+                self.add_edge(ref_id(ref), task_id)
+            for ref in task.before:
+                self.add_edge(task_id, ref_id(ref))
+        self.order = self.topological_order()
+        self.position = {task_id: i for i, task_id in enumerate(self.order)}
+        self.start_day = {}
+        self.length = {}
+        # tasks whose dates have changed in the model since they were read
+        self.stale = set()
+        self.read_dates(self.order)
+
+    def add_edge(self, source: str, target: str) -> None:
+        if source not in self.tasks:
+            self.missing.add(source)
+        elif target not in self.tasks:
+            self.missing.add(target)
+        else:
+            if not self.successors[source]:
+                self.successors[source] = []
+            self.successors[source].append(target)
+            if not self.predecessors[target]:
+                self.predecessors[target] = []
+            self.predecessors[target].append(source)
+
+    def topological_order(self) -> list:
+        # Kahn's algorithm, O(V+E)
+        in_degree = {task_id: len(preds) for task_id, preds in self.predecessors.items()}
+        queue = deque(task_id for task_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while queue:
+            task_id = queue.popleft()
+            order.append(task_id)
+            for succ in self.successors[task_id]:
+                in_degree[succ] -= 1
+                if in_degree[succ] == 0:
+                    queue.append(succ)
+        if len(order) < len(self.tasks):
+            raise DependencyCycleError([task_id for task_id, degree in in_degree.items() if degree > 0])
+        return order
+
+    def read_dates(self, task_ids: list) -> None:
+        '''Takes over start and length in business days of the given tasks from the model.'''
+        tasks = [self.tasks[task_id] for task_id in task_ids]
+        starts = parse_dates([t.start for t in tasks])
+        ends = parse_dates([t.end for t in tasks])
+        durations = parse_durations([t.duration for t in tasks])
+        start_days = np.busday_count(ORIGIN, np.where(np.isnat(starts), ORIGIN, starts))
+        end_days = np.busday_count(ORIGIN, np.where(np.isnat(ends), ORIGIN, ends))
+        # without a duration the length between the current start and end is kept
+        lengths = np.where(durations >= 0, durations, np.maximum(end_days - start_days, 0))
+        lengths = np.where(np.isnat(ends) & (durations < 0), 0, lengths)
+        for task_id, start, no_start, length in zip(task_ids, start_days.tolist(), np.isnat(starts).tolist(), lengths.tolist()):
+            self.start_day[task_id] = None if no_start else start
+            self.length[task_id] = length
+
+    def refresh(self, task_ids=()) -> None:
+        '''Reads the dates of the given and the stale tasks again.'''
+        task_ids = [task_id for task_id in self.stale.union(task_ids) if task_id in self.tasks]
+        self.stale.clear()
+        if task_ids:
+            self.read_dates(task_ids)
+
+    def end_day(self, task_id: str):
+        start = self.start_day[task_id]
+        return None if start is None else start + self.length[task_id]
+
+    def derive(self, task_ids: list) -> list:
+        '''Moves the given tasks to the end of their predecessors, returns the ids of those whose start changed.'''
+        moved = []
+        # task_ids are in topological order, so all predecessors are final when a task is reached
+        for task_id in task_ids:
+            pred_ends = [end for end in map(self.end_day, self.predecessors[task_id]) if end is not None]
+            if pred_ends and max(pred_ends) != self.start_day[task_id]:
+                self.start_day[task_id] = max(pred_ends)
+                moved.append(task_id)
+        return moved
+
+    def write_dates(self, task_ids: list) -> int:
+        task_ids = [task_id for task_id in task_ids if self.start_day[task_id] is not None]
+        if not task_ids:
+            return 0
+        starts = np.array([self.start_day[task_id] for task_id in task_ids])
+        lengths = np.array([self.length[task_id] for task_id in task_ids])
+        start_strs = np.datetime_as_string(np.busday_offset(ORIGIN, starts, roll="forward"), unit="D")
+        end_strs = np.datetime_as_string(np.busday_offset(ORIGIN, starts + lengths, roll="forward"), unit="D")
+        changed = 0
+        for task_id, start, end in zip(task_ids, start_strs.tolist(), end_strs.tolist()):
+            task = self.tasks[task_id]
+            # tasks with predecessors always start at a business day, the others keep their date
+            if self.predecessors[task_id] and task.start != start:
+                task.start = start
+                changed += 1
+            if task.end != end:
+                task.end = end
+                changed += 1
+        return changed
+
+    def resolve(self) -> int:
+        '''Derives the dates of all tasks from their dependencies, returns the number of changed dates.'''
+        self.refresh()
+        self.derive(self.order)
+        changed = self.write_dates(self.order)
+        # the dates just written are the ones of the graph
+        self.stale.clear()
+        return changed
+
+    def downstream(self, *task_ids: str) -> list:
+        '''The given tasks and all tasks depending directly or indirectly on them, in topological order.'''
+        seen = set(task_ids)
+        stack = list(task_ids)
+        while stack:
+            for succ in self.successors[stack.pop()]:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append(succ)
+        return sorted(seen, key=self.position.__getitem__)
+
+    def propagate(self, *tasks: Task) -> int:
+        '''
+        Re-propagates the dates after an edit of the given tasks, only their downstream tasks are touched.
+        The dates of tasks which do not move are left as they are, e.g. an end date on a weekend.
+        Returns the number of changed dates.
+        '''
+        task_ids = [task.id for task in tasks if task.id in self.tasks]
+        self.refresh(task_ids)
+        affected = self.downstream(*task_ids)
+        changed = self.write_dates(self.derive(affected))
+        self.stale.difference_update(affected)
+        return changed
+
+    def critical_path(self) -> list:
+        '''Ids of all tasks without slack, found with a forward and a backward pass over the graph.'''
+        self.refresh()
+        earliest = {}
+        for task_id in self.order:
+            pred_ends = [earliest[p] + self.length[p] for p in self.predecessors[task_id] if p in earliest]
+            own = self.start_day[task_id]
+            if pred_ends:
+                earliest[task_id] = max(pred_ends)
+            elif own is not None:
+                earliest[task_id] = own
+        if not earliest:
+            return []
+        project_end = max(earliest[t] + self.length[t] for t in earliest)
+        latest = {}
+        for task_id in reversed(self.order):
+            if task_id not in earliest:
+                continue
+            succ_starts = [latest[s] for s in self.successors[task_id] if s in latest]
+            latest[task_id] = (min(succ_starts) if succ_starts else project_end) - self.length[task_id]
+        return [task_id for task_id in self.order if task_id in earliest and latest[task_id] == earliest[task_id]]
+
+    def mark_critical(self) -> list:
+        '''Sets Task.critical for the tasks on the critical path and clears it for all others, returns their ids.'''
+        critical = set(self.critical_path())
+        for task_id, task in self.tasks.items():
+            if task.critical != (task_id in critical):
+                task.critical = task_id in critical
+        return [task_id for task_id in self.order if task_id in critical]
+
+
+def follow(gantt: Gantt) -> DependencyGraph:
+    '''
+    The dependency graph of the gantt, built on first use and kept with the gantt. Date changes are read
+    again when the graph is used, other changes of tasks or references drop it until the next call.
+    Raises DependencyCycleError.
+    '''
+    graph = getattr(gantt, "_graph", None)
+    if graph is None:
+        graph = DependencyGraph(gantt)
+        object.__setattr__(gantt, "_graph", graph)
+        gantt.add_listener(track)
+    return graph
+
+
+def track(gantt: Gantt, change: tuple) -> None:
+    '''Listener of the gantts with a graph from follow().'''
+    graph = getattr(gantt, "_graph", None)
+    if graph is None:
+        return
+    op = change[0]
+    if op == "task":
+        if change[2] in DATE_FIELDS:
+            graph.stale.add(change[1].id)
+        elif change[2] in STRUCTURE_FIELDS:
+            object.__setattr__(gantt, "_graph", None)
+    elif (op == "gantt" and change[1] == "sections") or (op == "section" and change[2] == "tasks") or \
+            op in ("add_section", "remove_section", "add_task", "remove_task"):
+        object.__setattr__(gantt, "_graph", None)
@@ -15,21 +15,39 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 GNU General Public License for more details.
 '''
 import uuid
-import json
+import hashlib
+import sys
+from datetime import date
+
+from gantt.indexed_list import SectionList, TaskList
 
 class Task:
-    def __init__(self, title: str, id = None, type = "Task", status = "", critical = False, active = False, before = [], after = [], start = "", end = "", duration = "") -> None:
-        self.id = id if id is not None else str(uuid.uuid4())
-        self.title = title
-        self.type = type
-        self.status = status # None, active or done
-        self.critical = critical
-        self.active = active
-        self.before = before
-        self.after = after
-        self.start = start
-        self.end = end
-        self.duration = duration
+    # slots instead of a __dict__ per task, large plans are kept in memory for every session
+    __slots__ = ("_parent", "_dirty", "_mermaid", "_compact", "id", "title", "type", "status", "critical", "active",
+                 "before", "after", "start", "end", "duration", "length", "done")
+    # attributes rendered into the mermaid line of a task, changing one of them invalidates the cached fragment
+    MERMAID_FIELDS = frozenset(("id", "title", "type", "status", "critical", "before", "after", "start", "end", "length"))
+
+    def __init__(self, title: str, id = None, type = "Task", status = "", critical = False, active = False, before = None, after = None, start = "", end = "", duration = "") -> None:
+        # a new task is dirty and not part of a section yet, so the fields are set without change tracking
+        init = object.__setattr__
+        init(self, "_parent", None)
+        init(self, "_dirty", True)
+        init(self, "_mermaid", "")
+        init(self, "_compact", "")
+        init(self, "id", id if id is not None else str(uuid.uuid4()))
+        init(self, "title", title)
+        init(self, "type", type)
+        init(self, "status", status) # None, active or done
+        init(self, "critical", critical)
+        init(self, "active", active)
+        # most tasks have no dependencies, they share the empty tuple instead of owning an empty list each
+        init(self, "before", before if before else ())
+        init(self, "after", after if after else ())
+        # dates and durations repeat a lot within a plan, share the string objects
+        init(self, "start", intern(start))
+        init(self, "end", intern(end))
+        init(self, "duration", intern(duration))
 
     #def to_json(self):
     #   return json.dumps(self, default=lambda obj: obj.__dict__)
@@ -40,11 +58,28 @@ class Task:
     def __eq__(self, other) -> bool:
         return self.id == other.id
 
+    def __setattr__(self, name, value) -> None:
+        object.__setattr__(self, name, value)
+        if name in self.MERMAID_FIELDS:
+            self.mark_dirty()
+        if name[0] != "_":
+            gantt = self.gantt()
+            if gantt is not None:
+                gantt.notify("task", self, name, value)
+
+    def mark_dirty(self) -> None:
+        object.__setattr__(self, "_dirty", True)
+        if self._parent is not None:
+            self._parent.mark_dirty()
+
+    def gantt(self):
+        return self._parent._parent if self._parent is not None else None
+
     def add_before(self, task) -> None:
-        self.before.append(task)
+        self.before = [*self.before, task]
 
     def add_after(self, task) -> None:
-        self.after.append(task)
+        self.after = [*self.after, task]
 
     def set_start(self, start: str) -> None:
         self.start = start
@@ -64,26 +99,68 @@ class Task:
     def set_title(self, title: str) -> None:
         self.title = title
 
-    def format_array(self, name: str, arr: list) -> str:
+    def format_array(self, name: str, arr: list, alias = str) -> str:
         if len(arr) > 0:
-            return name + " ".join( t.__str__() for t in arr)  + ", "
+            return name + " ".join(alias(t) for t in arr)  + ", "
         else:
             return ""
         
-    def get_mermaid_str(self) -> str:
+    def get_mermaid_str(self, aliases = None) -> str:
+        '''The mermaid line of the task, with the short names of aliases instead of the ids if given.'''
+        if self._dirty:
+            # both variants are built on demand, the editor only ever needs the short one
+            object.__setattr__(self, "_mermaid", "")
+            object.__setattr__(self, "_compact", "")
+            object.__setattr__(self, "_dirty", False)
+        if aliases is None:
+            if not self._mermaid:
+                object.__setattr__(self, "_mermaid", self.build_mermaid_str())
+            return self._mermaid
+        if not self._compact:
+            object.__setattr__(self, "_compact", self.build_mermaid_str(aliases.alias))
+        return self._compact
+
+    def build_mermaid_str(self, alias = str) -> str:
         return f"  {self.title}: {'crit, ' if self.critical else ''}" + \
             f"{self.status + ', ' if self.status else ''}" + \
             f"{'milestone, ' if self.type == 'Milestone' else ''}" +\
-            f"{self.id}, " +\
+            f"{alias(self.id)}, " +\
             f"{self.start + ', ' if self.start else ''}" + \
-            f"{self.format_array('after ',self.after)}" + \
-            f"{self.format_array('before ',self.before)}" + \
-            f"{self.end if self.end else self.length if self.length else ''}\n"
+            f"{self.format_array('after ',self.after, alias)}" + \
+            f"{self.format_array('before ',self.before, alias)}" + \
+            f"{self.end if self.end else getattr(self, 'length', '')}\n"
 
 class Section:
-    def __init__(self, title: str, tasks = []):
+    __slots__ = ("_parent", "_dirty", "_mermaid", "_compact", "title", "tasks")
+
+    def __init__(self, title: str, tasks = None):
+        object.__setattr__(self, "_parent", None)
+        object.__setattr__(self, "_dirty", True)
+        object.__setattr__(self, "_mermaid", "")
+        object.__setattr__(self, "_compact", "")
         self.title = title
-        self.tasks = tasks
+        self.tasks = tasks if tasks is not None else []
+
+    def __setattr__(self, name, value) -> None:
+        if name == "tasks":
+            # tasks which are not taken over are no longer part of the section
+            for task in getattr(self, "tasks", None) or ():
+                object.__setattr__(task, "_parent", None)
+            if not isinstance(value, TaskList):
+                value = TaskList(value)
+        object.__setattr__(self, name, value)
+        if name == "tasks":
+            for task in value:
+                object.__setattr__(task, "_parent", self)
+        if name in ("title", "tasks"):
+            self.mark_dirty()
+            if self._parent is not None:
+                self._parent.notify("section", self, name, value)
+
+    def mark_dirty(self) -> None:
+        object.__setattr__(self, "_dirty", True)
+        if self._parent is not None:
+            self._parent.mark_dirty()
 
    #def to_json(self):
    #    return json.dumps(self, default=lambda o: o.__dict__)
@@ -91,30 +168,110 @@ class Section:
     def __contains__(self, task):
         return task in self.tasks
 
+    def get_task(self, id: str) -> Task:
+        return self.tasks.get(id)
+
     def add_task(self, title: str, previous_task: Task = None) -> Task:
         task = Task(title)
-        if not previous_task:
-            self.tasks.append(task)
-        else:
-            index = self.tasks.index(previous_task)
-            self.tasks.insert(index+1, task)
+        self.insert_tasks([task], previous_task)
         return task
 
+    def insert_tasks(self, tasks: list, previous_task: Task = None) -> None:
+        # behind previous_task or at the end, one add_task change per task
+        self.tasks.insert_after(previous_task if previous_task else None, tasks)
+        for task in tasks:
+            object.__setattr__(task, "_parent", self)
+        self.mark_dirty()
+        if self._parent is not None:
+            for task in tasks:
+                self._parent.notify("add_task", self, task)
+
     def remove_task(self, task: Task) -> None:
         self.tasks.remove(task)
-
-    def get_mermaid_str(self) -> str:
-        result = ""
-        for task in self.tasks:
-            result += task.get_mermaid_str()
-
-        return f"section {self.title}\n{result}"
+        object.__setattr__(task, "_parent", None)
+        self.mark_dirty()
+        if self._parent is not None:
+            self._parent.notify("remove_task", self, task)
+
+    def remove_tasks(self, ids) -> list:
+        removed = self.tasks.remove_keys(ids)
+        for task in removed:
+            object.__setattr__(task, "_parent", None)
+        if removed:
+            self.mark_dirty()
+        if self._parent is not None:
+            for task in removed:
+                self._parent.notify("remove_task", self, task)
+        return removed
+
+    def move_task(self, task: Task, previous_task: Task = None) -> None:
+        '''Moves the task behind previous_task, to the front without one.'''
+        self.tasks.remove(task)
+        if previous_task:
+            self.tasks.insert_after(previous_task, [task])
+        else:
+            self.tasks.insert(0, task)
+        self.mark_dirty()
+        if self._parent is not None:
+            # there is no move for listeners, they see the task go and come back at its new position
+            self._parent.notify("remove_task", self, task)
+            self._parent.notify("add_task", self, task)
+
+    def get_mermaid_str(self, aliases = None) -> str:
+        # only the fragments of changed tasks are rebuilt, the clean ones come from their cache
+        if self._dirty:
+            object.__setattr__(self, "_mermaid", "")
+            object.__setattr__(self, "_compact", "")
+            object.__setattr__(self, "_dirty", False)
+        cache = "_mermaid" if aliases is None else "_compact"
+        if not getattr(self, cache):
+            fragments = [f"section {self.title}\n"]
+            fragments.extend(task.get_mermaid_str(aliases) for task in self.tasks)
+            object.__setattr__(self, cache, "".join(fragments))
+        return getattr(self, cache)
         
     def format_array(self, name: str, array: list) -> str:
         return f"""
         {name} = {array}\n
         """
 
+def intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def base36(number: int) -> str:
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = "0123456789abcdefghijklmnopqrstuvwxyz"[digit] + digits
+        if not number:
+            return digits
+
+
+class Aliases(dict):
+    '''
+    Short names for the task ids in the mermaid text, t0, t1, ... tz, t10, ... An id gets its name when it is
+    first written and keeps it as long as the table lives, so the cached lines stay valid. Only the text
+    sent to mermaid is affected, the tasks keep their ids.
+    '''
+
+    def __missing__(self, id: str) -> str:
+        # names are never given back, not even for removed tasks
+        alias = self[id] = "t" + base36(len(self))
+        return alias
+
+    def alias(self, ref) -> str:
+        # references are tasks or ids
+        return self[str(ref)]
+
+
+def public_attributes(obj) -> dict:
+    # private attributes hold caches and back references, they are not part of the document
+    if hasattr(obj, "__slots__"):
+        return {key: getattr(obj, key) for key in obj.__slots__ if not key.startswith("_") and hasattr(obj, key)}
+    return {key: value for key, value in obj.__dict__.items() if not key.startswith("_")}
+
+
 def gantt_decoder(obj):
     if 'sections' in obj:
         return Gantt(**obj)
@@ -128,22 +285,51 @@ def gantt_decoder(obj):
 
 def gantt_encoder(obj):
     if isinstance(obj, (Gantt, Section, Task)):
-        return obj.__dict__
+        return public_attributes(obj)
     else:
         raise TypeError("Object of type {} is not JSON serializable".format(type(obj)))
 
 
+# front matter of the mermaid document, the colors are filled in per gantt
+MERMAID_CONFIG = """
+---
+config:
+    theme: base
+    themeVariables: 
+      sectionBkgColor: "{section0bgcolor}"
+      altSectionBkgColor: "{odd_sectionbgcolor}"
+      sectionBkgColor2: "{even_sectionbgcolor}"
+      taskBkgColor: "{taskbgcolor}"
+    gantt:
+        barGap: 10
+        barHeight: 40
+        fontSize: 20
+        sectionFontSize: 20
+        leftPadding: 200
+        topPadding: 75
+        gridLineStartPadding: 50
+---
+"""
+
+
 class Gantt:
 
-    def __init__(self, id = None, title = "", sections = [], show_weekends = False, 
+    def __init__(self, id = None, title = "", sections = None, show_weekends = False, 
                  show_title = False, axis_format = "%Y-%m-%d", 
                  tick_interval = "auto", show_today = True, 
                  section0bgcolor = "#85A0F9",
                  even_sectionbgcolor =  "#26EFE9", 
                  odd_sectionbgcolor = "#2F78C4", 
                  taskbgcolor = "#fafa05" ) -> None:
+        object.__setattr__(self, "_dirty", True)
+        # counts all changes of the gantt and its sections and tasks, used to find unsaved gantts
+        object.__setattr__(self, "_version", 0)
+        object.__setattr__(self, "_mermaid", "")
+        object.__setattr__(self, "_compact", "")
+        object.__setattr__(self, "_aliases", Aliases())
+        object.__setattr__(self, "_listeners", [])
         self.id = id
-        self.sections = sections
+        self.sections = sections if sections is not None else []
         self.title = title
         self.show_weekends = show_weekends
         self.show_title = show_title
@@ -155,6 +341,47 @@ class Gantt:
         self.odd_sectionbgcolor = odd_sectionbgcolor
         self.taskbgcolor = taskbgcolor
 
+    def __setattr__(self, name, value) -> None:
+        if name == "sections":
+            for section in getattr(self, "sections", None) or ():
+                object.__setattr__(section, "_parent", None)
+            if not isinstance(value, SectionList):
+                value = SectionList(value)
+        object.__setattr__(self, name, value)
+        if name == "sections":
+            for section in value:
+                object.__setattr__(section, "_parent", self)
+        if not name.startswith("_"):
+            self.mark_dirty()
+            self.notify("gantt", name, value)
+
+    def mark_dirty(self) -> None:
+        object.__setattr__(self, "_dirty", True)
+        object.__setattr__(self, "_version", self._version + 1)
+
+    def add_listener(self, listener) -> None:
+        '''listener(gantt, change) is called after every change of the gantt, its sections or tasks.'''
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, *change) -> None:
+        # fields outside the mermaid text (e.g. duration) change the gantt as well
+        object.__setattr__(self, "_version", self._version + 1)
+        for listener in self._listeners:
+            listener(self, change)
+
+    def announce_bulk(self) -> None:
+        '''
+        Tells the listeners with a ("bulk",) change that many changes follow, e.g. so views rebuild once
+        instead of following each of them. This is not a change of the gantt, there is nothing to save.
+        '''
+        for listener in self._listeners:
+            listener(self, ("bulk",))
+
     def to_json(self):
        return gantt_encoder(self)
 
@@ -164,32 +391,81 @@ class Gantt:
     def add_section(self, name: str) -> Section:
         section = Section(name, [])
         self.sections.append(section)
+        object.__setattr__(section, "_parent", self)
+        self.mark_dirty()
+        self.notify("add_section", section)
         return section
 
     def remove_section(self, section: Section) -> None:
-        self.sections.remove(section)
+        index = self.sections.index(section)
+        del self.sections[index]
+        object.__setattr__(section, "_parent", None)
+        self.mark_dirty()
+        self.notify("remove_section", index)
+
+    def replace_content(self, other) -> None:
+        # settings and sections of other, the id stays, so references to this gantt remain valid
+        # the cached short lines of the tasks taken over refer to the aliases of other
+        object.__setattr__(self, "_aliases", other._aliases)
+        for name, value in public_attributes(other).items():
+            if name != "id":
+                setattr(self, name, value)
 
     #def toJson(self):
     #    return json.dumps(self, default=lambda o: o.__dict__)
 
-    def get_mermaid_str(self) -> str:
-        result = "gantt"
+    def get_mermaid_header(self, tick_interval: str = None) -> str:
+        '''Everything in front of the first section, a zoomed view brings its own tick interval.'''
         if self.show_title:
-            result = f"gantt\n title {self.title}\n"
+            parts = [f"gantt\n title {self.title}\n"]
         else:
-            result = "gantt\n"
-        result += f"  axisFormat {self.axis_format}\n"
-        result += f"  tickInterval {self.tick_interval}\n"
+            parts = ["gantt\n"]
+        parts.append(f"  axisFormat {self.axis_format}\n")
+        parts.append(f"  tickInterval {tick_interval or self.tick_interval}\n")
         if not self.show_today:
-            result += "  todayMarker off\n"
-        result += "  dateformat YYYY-MM-DD\n"
+            parts.append("  todayMarker off\n")
+        parts.append("  dateformat YYYY-MM-DD\n")
 
         if self.show_weekends:
             # this is a bit strange, as we do not use mermaid calculation for the task dependencies, it has to be done this way
-            result += "  excludes weekends\n"
-        for section in self.sections:
-            result += section.get_mermaid_str()
-        return result
+            parts.append("  excludes weekends\n")
+        return "".join(parts)
+
+    def get_mermaid_str(self, compact: bool = False) -> str:
+        '''The diagram, with compact the task ids are replaced by short names (see Aliases).'''
+        if self._dirty:
+            object.__setattr__(self, "_mermaid", "")
+            object.__setattr__(self, "_compact", "")
+            object.__setattr__(self, "_dirty", False)
+        cache = "_compact" if compact else "_mermaid"
+        if not getattr(self, cache):
+            aliases = self._aliases if compact else None
+            parts = [self.get_mermaid_header()]
+            parts.extend(section.get_mermaid_str(aliases) for section in self.sections)
+            object.__setattr__(self, cache, "".join(parts))
+        return getattr(self, cache)
+
+    def get_mermaid_config(self, template: str = MERMAID_CONFIG) -> str:
+        return template.format(section0bgcolor=self.section0bgcolor, odd_sectionbgcolor=self.odd_sectionbgcolor,
+                               even_sectionbgcolor=self.even_sectionbgcolor, taskbgcolor=self.taskbgcolor)
+
+    def get_mermaid_document(self, template: str = MERMAID_CONFIG, compact: bool = False) -> str:
+        '''Config and diagram, what the editor hands to mermaid.'''
+        return self.get_mermaid_config(template) + self.get_mermaid_str(compact)
+
+    def content_hash(self) -> str:
+        # everything a rendered chart depends on, the mermaid text itself comes from the fragment cache
+        today = str(date.today()) if self.show_today else ""
+        cached = getattr(self, "_hash", None)
+        if cached is not None and cached[:2] == (self._version, today):
+            return cached[2]
+        # the title is not part of the mermaid text but shown by the SVG and the share page
+        key = "\n".join((self.get_mermaid_str(), self.title, str(self.show_title), self.section0bgcolor,
+                         self.odd_sectionbgcolor, self.even_sectionbgcolor, self.taskbgcolor, today))
+        content_hash = hashlib.sha256(key.encode()).hexdigest()
+        # unchanged gantts are hashed once, no matter how many viewers ask
+        object.__setattr__(self, "_hash", (self._version, today, content_hash))
+        return content_hash
 
     #@property
     #def mermaid(self) -> str:
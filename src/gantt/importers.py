@@ -0,0 +1,292 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import codecs
+import csv
+import os
+import re
+from datetime import date, datetime
+from operator import itemgetter
+from xml.etree import ElementTree
+
+from gantt.codec import CHUNK_SIZE, MAX_BYTES, MAX_TASKS, GanttFormatError, GanttLimitError, LimitedReader, load_stream
+from gantt.dependencies import DependencyCycleError, DependencyGraph
+from gantt.gantt_builder import Gantt, Section, Task
+from gantt.scheduler import schedule
+
+# progress is reported after this many tasks
+PROGRESS_TASKS = 1000
+
+# CSV header names (lower case, without blanks and underscores) per task field, the first column found wins
+CSV_COLUMNS = {
+    "section": ("section", "swimlane", "lane", "phase", "group"),
+    "id": ("id", "taskid", "key"),
+    "title": ("title", "task", "name", "taskname"),
+    "type": ("type",),
+    "milestone": ("milestone",),
+    "start": ("start", "startdate", "begin"),
+    "end": ("end", "enddate", "finish", "due"),
+    "duration": ("duration", "days"),
+    "status": ("status", "state"),
+    "critical": ("critical", "crit"),
+    "after": ("after", "predecessors", "dependson", "depends"),
+    "before": ("before", "successors"),
+}
+TRUE_VALUES = frozenset(("1", "true", "yes", "y", "x", "ja"))
+DURATION_UNITS = {"d": "d", "day": "d", "days": "d", "w": "w", "wk": "w", "week": "w", "weeks": "w",
+                  "m": "m", "mo": "m", "month": "m", "months": "m", "y": "y", "year": "y", "years": "y"}
+DURATION_PATTERN = re.compile(r"^([0-9]+)(?:[.,]0+)?\s*([a-z]*)$")
+REFERENCE_SEPARATORS = re.compile(r"[\s,;]+")
+# MS Project durations are ISO 8601 periods of working time, e.g. PT40H0M0S
+MSP_DURATION = re.compile(r"^P(?:([0-9.]+)D)?T?(?:([0-9.]+)H)?(?:([0-9.]+)M)?(?:([0-9.]+)S)?$")
+MSP_HOURS_PER_DAY = 8
+
+
+def normalize_date(value: str, row: int) -> str:
+    '''ISO dates (with or without time) and dd.mm.yyyy, the editor works with ISO dates only.'''
+    value = value.strip()
+    if not value:
+        return ""
+    try:
+        return date.fromisoformat(value[:10]).isoformat()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, "%d.%m.%Y").date().isoformat()
+    except ValueError:
+        raise GanttFormatError(f"Row {row}: {value} is not a date")
+
+
+def normalize_duration(value: str, row: int) -> str:
+    '''"5", "5 days", "2w" to the editor's "5d", "2w".'''
+    value = value.strip().lower()
+    if not value:
+        return ""
+    match = DURATION_PATTERN.match(value)
+    unit = DURATION_UNITS.get(match.group(2) or "d") if match else None
+    if unit is None:
+        raise GanttFormatError(f"Row {row}: {value} is not a duration")
+    return f"{int(match.group(1))}{unit}"
+
+
+def text_lines(reader, encoding: str):
+    '''Decodes the binary reader chunk by chunk and yields complete lines including their line break.'''
+    decoder = codecs.getincrementaldecoder(encoding)()
+    rest = ""
+    try:
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            text = rest + decoder.decode(chunk, final=not chunk)
+            lines = text.splitlines(keepends=True)
+            # the last line may continue in the next chunk, a \r at its end may be the first half of \r\n
+            rest = lines.pop() if lines and chunk and not lines[-1].endswith("\n") else ""
+            yield from lines
+            if not chunk:
+                if rest:
+                    yield rest
+                return
+    except UnicodeDecodeError as e:
+        raise GanttFormatError(f"The file is not {encoding} encoded: {e}") from e
+
+
+class PlanBuilder:
+    '''
+    Collects the imported tasks in their sections, in the order the sections first appear.
+    Dates are completed once at the end, for all tasks at once.
+    '''
+
+    def __init__(self, max_tasks: int = MAX_TASKS, progress=None) -> None:
+        self.max_tasks = max_tasks
+        self.progress = progress
+        self.sections = {}
+        self.task_count = 0
+        self.has_references = False
+
+    def add_task(self, section: str, task: Task, bytes_read: int = 0) -> None:
+        self.task_count += 1
+        if self.max_tasks is not None and self.task_count > self.max_tasks:
+            raise GanttLimitError(f"More than {self.max_tasks} tasks")
+        tasks = self.sections.get(section)
+        if tasks is None:
+            tasks = self.sections[section] = []
+        tasks.append(task)
+        self.has_references = self.has_references or bool(task.after or task.before)
+        if self.progress is not None and self.task_count % PROGRESS_TASKS == 0:
+            self.progress(self.task_count, bytes_read)
+
+    def build(self, title: str = "") -> Gantt:
+        gantt = Gantt(title=title, sections=[Section(name, tasks) for name, tasks in self.sections.items()])
+        if self.has_references:
+            # start dates follow the predecessors, ends come from start and duration
+            try:
+                DependencyGraph(gantt).resolve()
+            except DependencyCycleError as e:
+                raise GanttFormatError(str(e)) from e
+        else:
+            # every task with a duration gets its end with a single busday_offset call
+            schedule(gantt, chain=False)
+        return gantt
+
+
+def csv_columns(header: list) -> dict:
+    '''Task field -> column index of the header row.'''
+    names = ["".join(name.lower().replace("_", " ").split()) for name in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if "title" not in columns:
+        raise GanttFormatError(f"No task column, expected one of {', '.join(CSV_COLUMNS['title'])}")
+    return columns
+
+
+def import_csv(fileobj, max_bytes: int = MAX_BYTES, max_tasks: int = MAX_TASKS, progress=None,
+               encoding: str = "utf-8-sig") -> Gantt:
+    '''
+    Reads a plan from a binary CSV file with a header row, one task per row. The delimiter (comma,
+    semicolon or tab) is taken from the header. Rows are read one by one, only the tasks are kept.
+    progress(tasks, bytes_read) is called every PROGRESS_TASKS tasks.
+    '''
+    reader = LimitedReader(fileobj, max_bytes)
+    lines = text_lines(reader, encoding)
+    header_line = next(lines, "")
+    if not header_line.strip():
+        raise GanttFormatError("Empty CSV file")
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    columns = csv_columns(next(csv.reader([header_line], dialect)))
+    builder = PlanBuilder(max_tasks, progress)
+    # missing columns point behind the last column, rows are padded with empty cells up to there
+    width = max(columns.values()) + 1
+    cells = itemgetter(*(columns.get(field, width) for field in CSV_COLUMNS))
+    padding = [""] * (width + 1)
+
+    try:
+        # the header is row 1
+        for number, row in enumerate(csv.reader(lines, dialect), 2):
+            if not any(row):
+                continue
+            row.extend(padding[len(row):])
+            section, id, title, type, milestone, start, end, duration, status, critical, after, before = (
+                value.strip() for value in cells(row))
+            milestone = type.lower() == "milestone" or milestone.lower() in TRUE_VALUES
+            status = status.lower()
+            task = Task(
+                title,
+                id=id or None,
+                type="Milestone" if milestone else "Task",
+                status=status if status in ("active", "done") else "",
+                critical=critical.lower() in TRUE_VALUES,
+                after=REFERENCE_SEPARATORS.split(after) if after else None,
+                before=REFERENCE_SEPARATORS.split(before) if before else None,
+                start=normalize_date(start, number),
+                end=normalize_date(end, number),
+                duration="0d" if milestone else normalize_duration(duration, number),
+            )
+            builder.add_task(section, task, reader.count)
+    except csv.Error as e:
+        raise GanttFormatError(f"Broken CSV: {e}") from e
+    return builder.build()
+
+
+def msp_duration(value: str) -> str:
+    match = MSP_DURATION.match(value.strip()) if value else None
+    if match is None:
+        return ""
+    days, hours, minutes, seconds = (float(part) if part else 0 for part in match.groups())
+    hours += days * MSP_HOURS_PER_DAY + minutes / 60 + seconds / 3600
+    return f"{round(hours / MSP_HOURS_PER_DAY)}d"
+
+
+def import_msproject(fileobj, max_bytes: int = MAX_BYTES, max_tasks: int = MAX_TASKS, progress=None) -> Gantt:
+    '''
+    Reads the tasks of an MS Project XML file (File > Save As > XML). Summary tasks of the first
+    outline level become swimlanes, all other non summary tasks go into the swimlane above them.
+    Every task element is dropped right after it has been read, so the tree never holds the whole plan.
+    '''
+    reader = LimitedReader(fileobj, max_bytes)
+    builder = PlanBuilder(max_tasks, progress)
+    title = ""
+    section = ""
+    parents = []
+    try:
+        for event, element in ElementTree.iterparse(reader, events=("start", "end")):
+            # tags come with the namespace of MS Project, e.g. {http://schemas.microsoft.com/project}Task
+            tag = element.tag.rpartition("}")[2]
+            if event == "start":
+                parents.append(element)
+                continue
+            parents.pop()
+            if tag == "Title" and len(parents) == 1:
+                title = element.text or ""
+            elif tag == "Task" and parents and parents[-1].tag.endswith("Tasks"):
+                fields = {child.tag.rpartition("}")[2]: child for child in element}
+
+                def text(name: str) -> str:
+                    child = fields.get(name)
+                    return (child.text or "").strip() if child is not None else ""
+
+                uid = text("UID")
+                if uid and uid != "0" and text("IsNull") != "1":
+                    if text("Summary") == "1":
+                        if text("OutlineLevel") in ("", "1"):
+                            section = text("Name")
+                    else:
+                        predecessors = [f"task{link.findtext('{*}PredecessorUID')}"
+                                        for link in element if link.tag.endswith("PredecessorLink")]
+                        milestone = text("Milestone") == "1"
+                        done = text("PercentComplete")
+                        task = Task(
+                            text("Name"),
+                            id=f"task{uid}",
+                            type="Milestone" if milestone else "Task",
+                            status="done" if done == "100" else "active" if done not in ("", "0") else "",
+                            critical=text("Critical") == "1",
+                            after=predecessors or None,
+                            start=text("Start")[:10],
+                            end=text("Finish")[:10],
+                            duration="0d" if milestone else msp_duration(text("Duration")),
+                        )
+                        builder.add_task(section, task, reader.count)
+                # the parent only keeps the tasks which have not been read yet
+                parents[-1].remove(element)
+            elif tag in ("Resources", "Assignments", "Calendars") and parents:
+                parents[-1].remove(element)
+    except ElementTree.ParseError as e:
+        raise GanttFormatError(f"Broken XML: {e}") from e
+    # references to tasks which were not imported (e.g. summary tasks) are dropped
+    ids = {task.id for tasks in builder.sections.values() for task in tasks}
+    for tasks in builder.sections.values():
+        for task in tasks:
+            if task.after and not all(ref in ids for ref in task.after):
+                task.after = [ref for ref in task.after if ref in ids] or ()
+    return builder.build(title)
+
+
+# importers by file suffix, everything else is read as a saved gantt
+IMPORTERS = {".csv": import_csv, ".xml": import_msproject}
+
+
+def load_file(fileobj, name: str, max_bytes: int = MAX_BYTES, max_tasks: int = MAX_TASKS, progress=None) -> Gantt:
+    '''Any supported file by its name, used by the editor upload and the batch converter.'''
+    importer = IMPORTERS.get(os.path.splitext(name)[1].lower())
+    if importer is None:
+        return load_stream(fileobj, max_bytes, max_tasks)
+    return importer(fileobj, max_bytes, max_tasks, progress)
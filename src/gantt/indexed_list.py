@@ -0,0 +1,214 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from itertools import repeat
+from math import isqrt
+from operator import attrgetter
+
+
+class IndexedList(list):
+    '''
+    A list which finds its items by key without comparing them with every item in front.
+
+    The position of every key is cached together with the number of inserts and deletions seen
+    when it was written. Those changes are kept in a log and applied to a cached position when
+    it is read, so an insert or delete in the middle does not touch the positions behind it.
+    The cache is rebuilt once the log grows beyond the square root of the length.
+    Changes which reorder many items at once (slices, sort, reverse) just drop the cache.
+    '''
+
+    __slots__ = ("_positions", "_log")
+
+    def __init__(self, items=()) -> None:
+        super().__init__(items)
+        # key -> (position, length of the log when the position was valid), built on first use
+        self._positions = None
+        # (index, count) per insert (count > 0) or delete (count < 0) since the cache was built
+        self._log = []
+
+    @staticmethod
+    def key(item):
+        return item
+
+    def __reduce__(self):
+        # copies and pickles start with an empty cache
+        return self.__class__, (list(self),)
+
+    def _reindex(self) -> dict:
+        # keys and positions are zipped in C, key should be a builtin like attrgetter for the same reason
+        self._positions = dict(zip(map(self.key, self), zip(range(len(self)), repeat(0))))
+        self._log = []
+        return self._positions
+
+    def _changed(self, index: int, count: int) -> None:
+        if self._positions is None:
+            return
+        if len(self._log) >= max(64, isqrt(len(self))):
+            self._positions = None
+        else:
+            self._log.append((index, count))
+
+    def position(self, key) -> int:
+        '''The position of the item with the key, -1 if there is none.'''
+        positions = self._positions if self._positions is not None else self._reindex()
+        entry = positions.get(key)
+        if entry is None:
+            return -1
+        position, seen = entry
+        log = self._log
+        if seen < len(log):
+            for index, count in log[seen:]:
+                # the item at a deleted index is gone from the cache, so both shift the same way
+                if position >= index:
+                    position += count
+            positions[key] = (position, len(log))
+        if position < len(self) and self.key(list.__getitem__(self, position)) == key:
+            return position
+        # the item was replaced or removed behind the back of the cache
+        positions = self._reindex()
+        entry = positions.get(key)
+        return entry[0] if entry is not None else -1
+
+    def get(self, key, default=None):
+        position = self.position(key)
+        return list.__getitem__(self, position) if position >= 0 else default
+
+    def index(self, item, *args) -> int:
+        if args:
+            return super().index(item, *args)
+        position = self.position(self.key(item))
+        if position < 0:
+            raise ValueError(f"{item} is not in list")
+        return position
+
+    def __contains__(self, item) -> bool:
+        return self.position(self.key(item)) >= 0
+
+    def _normalize(self, index: int) -> int:
+        if index < 0:
+            index = max(0, index + len(self))
+        return min(index, len(self))
+
+    def _remember(self, item, position: int) -> None:
+        if self._positions is not None:
+            self._positions[self.key(item)] = (position, len(self._log))
+
+    def append(self, item) -> None:
+        super().append(item)
+        # nothing moves, only the new item is remembered
+        self._remember(item, len(self) - 1)
+
+    def extend(self, items) -> None:
+        for item in items:
+            self.append(item)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, index: int, item) -> None:
+        index = self._normalize(index)
+        super().insert(index, item)
+        self._changed(index, 1)
+        self._remember(item, index)
+
+    def insert_after(self, previous, items) -> None:
+        '''Inserts the items behind previous, or at the end when previous is None.'''
+        index = self.index(previous) + 1 if previous is not None else len(self)
+        items = list(items)
+        list.__setitem__(self, slice(index, index), items)
+        self._changed(index, len(items))
+        for offset, item in enumerate(items):
+            self._remember(item, index + offset)
+
+    def pop(self, index: int = -1):
+        if index < 0:
+            index += len(self)
+        item = super().pop(index)
+        if self._positions is not None:
+            self._positions.pop(self.key(item), None)
+            if index < len(self):
+                self._changed(index, -1)
+        return item
+
+    def remove(self, item) -> None:
+        self.pop(self.index(item))
+
+    def move(self, item, index: int) -> None:
+        '''Moves the item to index, counted without the item itself.'''
+        self.pop(self.index(item))
+        self.insert(index, item)
+
+    def remove_keys(self, keys) -> list:
+        '''Removes all items with one of the keys in one pass, returns the removed items.'''
+        keys = set(keys)
+        key = self.key
+        removed = [item for item in self if key(item) in keys]
+        if removed:
+            self[:] = [item for item in self if key(item) not in keys]
+        return removed
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            super().__delitem__(index)
+            self._positions = None
+        else:
+            self.pop(index)
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            super().__setitem__(index, value)
+            self._positions = None
+            return
+        if index < 0:
+            index += len(self)
+        if self._positions is not None:
+            self._positions.pop(self.key(list.__getitem__(self, index)), None)
+        super().__setitem__(index, value)
+        self._remember(value, index)
+
+    def clear(self) -> None:
+        super().clear()
+        self._positions = None
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self._positions = None
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._positions = None
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self._positions = None
+        return self
+
+
+class TaskList(IndexedList):
+    '''The tasks of a section, found by their id.'''
+
+    __slots__ = ()
+
+    key = staticmethod(attrgetter("id"))
+
+
+class SectionList(IndexedList):
+    '''The sections of a gantt, sections have no id and are found by identity.'''
+
+    __slots__ = ()
+
+    key = staticmethod(id)
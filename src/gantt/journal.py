@@ -0,0 +1,133 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from gantt import codec
+from gantt.gantt_builder import Gantt
+
+# Journal records are small JSON arrays, one per change of the model:
+#   ["gantt", field, value]                 a setting, "sections" carries all sections
+#   ["section", index, field, value]        "title" or "tasks" (all tasks of the swimlane)
+#   ["task", id, field, value]
+#   ["add_section", index, section]
+#   ["remove_section", index]
+#   ["add_task", section index, position, task]
+#   ["remove_task", id]
+# Sections and tasks are written like in the save file format.
+
+
+def encode_value(field: str, value):
+    if field in codec.REFERENCE_FIELDS:
+        return [codec.ref_id(ref) for ref in value]
+    if field == "sections":
+        return [codec.encode_section(section) for section in value]
+    if field == "tasks":
+        return [codec.encode_task(task) for task in value]
+    return value
+
+
+def encode(gantt: Gantt, change: tuple):
+    '''The record of a change reported to a listener of the gantt, None for announcements which change nothing.'''
+    op = change[0]
+    if op == "bulk":
+        return None
+    if op == "gantt":
+        return [op, change[1], encode_value(change[1], change[2])]
+    if op == "section":
+        _, section, field, value = change
+        return [op, gantt.sections.index(section), field, encode_value(field, value)]
+    if op == "task":
+        _, task, field, value = change
+        return [op, task.id, field, encode_value(field, value)]
+    if op == "add_section":
+        section = change[1]
+        return [op, gantt.sections.index(section), codec.encode_section(section)]
+    if op == "remove_section":
+        return [op, change[1]]
+    if op == "add_task":
+        _, section, task = change
+        return [op, gantt.sections.index(section), section.tasks.index(task), codec.encode_task(task)]
+    if op == "remove_task":
+        return [op, change[2].id]
+    raise ValueError(f"Unknown change {op}")
+
+
+def key(record: list):
+    '''Records with the same key overwrite each other, only the last one needs to be kept.'''
+    if record[0] in ("gantt", "section", "task"):
+        return tuple(record[:-1])
+    return None
+
+
+def replay(gantt: Gantt, records: list) -> None:
+    '''
+    Applies the records in order, the gantt must not have listeners which write them again.
+    Raises GanttFormatError for records which do not fit the gantt, the gantt is left half way then.
+    '''
+    tasks = {task.id: task for section in gantt.sections for task in section.tasks}
+    for record in records:
+        try:
+            tasks = apply(gantt, tasks, record)
+        except (IndexError, KeyError, TypeError, ValueError, AttributeError) as e:
+            raise codec.GanttFormatError(f"Journal record {str(record)[:80]} does not apply: {e}") from e
+
+
+def apply(gantt: Gantt, tasks: dict, record: list) -> dict:
+    '''Applies one record, returns the tasks by id afterwards.'''
+    op = record[0]
+    if op == "gantt":
+        _, field, value = record
+        if field == "sections":
+            value = [codec.decode_section(doc) for doc in value]
+            tasks = {task.id: task for section in value for task in section.tasks}
+        setattr(gantt, field, value)
+    elif op == "section":
+        _, index, field, value = record
+        section = gantt.sections[index]
+        if field == "tasks":
+            for task in section.tasks:
+                tasks.pop(task.id, None)
+            value = [codec.decode_task(doc) for doc in value]
+            tasks.update((task.id, task) for task in value)
+        setattr(section, field, value)
+    elif op == "task":
+        _, task_id, field, value = record
+        task = tasks.get(task_id)
+        if task is not None:
+            setattr(task, field, value)
+    elif op == "add_section":
+        _, index, doc = record
+        section = codec.decode_section(doc)
+        gantt.sections.insert(index, section)
+        object.__setattr__(section, "_parent", gantt)
+        gantt.mark_dirty()
+        tasks.update((task.id, task) for task in section.tasks)
+    elif op == "remove_section":
+        gantt.remove_section(gantt.sections[record[1]])
+    elif op == "add_task":
+        _, index, position, doc = record
+        section = gantt.sections[index]
+        task = codec.decode_task(doc)
+        section.tasks.insert(position, task)
+        object.__setattr__(task, "_parent", section)
+        section.mark_dirty()
+        tasks[task.id] = task
+    elif op == "remove_task":
+        task = tasks.pop(record[1], None)
+        if task is not None and task._parent is not None:
+            task._parent.remove_task(task)
+    else:
+        raise codec.GanttFormatError(f"Unknown journal record {op}")
+    return tasks
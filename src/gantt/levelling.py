@@ -0,0 +1,201 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from datetime import date
+from heapq import heapify, heappop, heappush
+
+import numpy as np
+
+from gantt.dependencies import ORIGIN, DependencyGraph, follow
+from gantt.gantt_builder import Gantt
+
+# tasks of one swimlane running at the same time unless configured otherwise
+DEFAULT_CAPACITY = 1
+
+
+def level_days(lengths: list, releases: list, predecessors: list, lanes: list, capacities: list,
+               ranks: list, successors: list = None) -> list:
+    '''
+    Start day of every task, scheduled on business day numbers with a parallel schedule generation scheme.
+
+    Task i may start once all predecessors[i] have ended and not before releases[i]. At most
+    capacities[lane] tasks of a lane run at the same time (None for no limit), tasks of length 0 do
+    not count. Whenever a lane has free capacity the waiting task with the lowest rank goes first,
+    ranks are 0 ... n - 1. Every task enters each heap once, O((tasks + dependencies) log tasks).
+    '''
+    n = len(lengths)
+    if successors is None:
+        successors = [[] for _ in range(n)]
+        for task, preds in enumerate(predecessors):
+            for pred in preds:
+                successors[pred].append(task)
+    remaining = list(map(len, predecessors))
+    by_rank = [0] * n
+    for task, rank in enumerate(ranks):
+        by_rank[rank] = task
+    starts = [0] * n
+    # the earliest start from releases and predecessors, final once remaining drops to 0
+    ready = list(releases)
+    # the heaps hold plain ints, day * n + rank or day * n + task, which compare much faster than tuples:
+    # the tasks whose predecessors have all ended by the day they may start and rank
+    pending = [ready[task] * n + ranks[task] for task in range(n) if not remaining[task]]
+    heapify(pending)
+    # per lane the ranks of the tasks which could start now
+    queues = [[] for _ in capacities]
+    free = [capacity if capacity is not None else n for capacity in capacities]
+    # the started tasks which occupy their lane by their end
+    running = []
+    touched = set()
+    done = 0
+    day = pending[0] // n if pending else 0
+
+    push, pop = heappush, heappop
+
+    def finish(task: int, end: int) -> None:
+        for succ in successors[task]:
+            if ready[succ] < end:
+                ready[succ] = end
+            remaining[succ] -= 1
+            if not remaining[succ]:
+                push(pending, ready[succ] * n + ranks[succ])
+
+    while done < n:
+        limit = (day + 1) * n
+        while running and running[0] < limit:
+            task = pop(running) % n
+            lane = lanes[task]
+            free[lane] += 1
+            touched.add(lane)
+            if successors[task]:
+                finish(task, day)
+        while pending and pending[0] < limit:
+            rank = pop(pending) % n
+            task = by_rank[rank]
+            if lengths[task] == 0:
+                # milestones take no capacity, their successors may become ready at the same day
+                starts[task] = day
+                done += 1
+                finish(task, day)
+            else:
+                lane = lanes[task]
+                push(queues[lane], rank)
+                touched.add(lane)
+        for lane in touched:
+            queue = queues[lane]
+            while queue and free[lane] > 0:
+                task = by_rank[pop(queue)]
+                starts[task] = day
+                free[lane] -= 1
+                done += 1
+                push(running, (day + lengths[task]) * n + task)
+        touched.clear()
+        if not running and not pending:
+            break
+        # the next day something can change: a task ends or becomes ready
+        day = min(running[0] if running else pending[0], pending[0] if pending else running[0]) // n
+    return starts
+
+
+class Leveller:
+    '''
+    Resource levelling of a gantt: dependencies as in DependencyGraph, and per swimlane only
+    capacity tasks at the same time. Tasks without predecessors do not start before their start date
+    (or the first start date of the plan), the longest chain of remaining work goes first.
+    Without a graph the one kept with the gantt is used (see follow), so levelling again only reads the
+    dates changed since.
+    '''
+
+    def __init__(self, gantt: Gantt, capacity=DEFAULT_CAPACITY, graph: DependencyGraph = None) -> None:
+        self.gantt = gantt
+        # a number for every swimlane or a dict swimlane title -> number, None for no limit
+        self.capacity = capacity
+        self.graph = graph if graph is not None else follow(gantt)
+
+    def lane_capacity(self, title: str):
+        capacity = self.capacity.get(title, DEFAULT_CAPACITY) if isinstance(self.capacity, dict) else self.capacity
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"Swimlane {title} needs a capacity of at least 1")
+        return capacity
+
+    def plan(self) -> tuple:
+        '''(tasks, start days, lengths) in topological order, nothing is written to the tasks.'''
+        graph = self.graph
+        graph.refresh()
+        order = graph.order
+        index = graph.position
+        tasks = [graph.tasks[task_id] for task_id in order]
+        lengths = [graph.length[task_id] for task_id in order]
+        predecessors = [[index[pred] for pred in preds] if preds else ()
+                        for preds in map(graph.predecessors.__getitem__, order)]
+
+        known = [day for day in map(graph.start_day.get, order) if day is not None]
+        first_day = min(known) if known else int(np.busday_count(ORIGIN, np.datetime64(date.today(), "D")))
+        releases = [first_day if day is None or preds else day
+                    for day, preds in zip(map(graph.start_day.get, order), predecessors)]
+
+        lane_of = {}
+        capacities = []
+        for section in self.gantt.sections:
+            capacities.append(self.lane_capacity(section.title))
+            for task in section.tasks:
+                lane_of[task.id] = len(capacities) - 1
+        lanes = [lane_of[task_id] for task_id in order]
+
+        # remaining work on the longest chain starting with the task, counted backwards over the order
+        tails = lengths[:]
+        successors = [()] * len(order)
+        for task, preds in enumerate(predecessors):
+            for pred in preds:
+                if successors[pred]:
+                    successors[pred].append(task)
+                else:
+                    successors[pred] = [task]
+        for task in range(len(order) - 1, -1, -1):
+            if successors[task]:
+                tails[task] = lengths[task] + max(tails[succ] for succ in successors[task])
+        # ties keep the order of the plan
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[np.argsort(-np.array(tails, dtype=np.int64), kind="stable")] = np.arange(len(order))
+        ranks = ranks.tolist()
+
+        starts = level_days(lengths, releases, predecessors, lanes, capacities, ranks, successors)
+        return tasks, starts, lengths
+
+    def write_dates(self, tasks: list, starts: list, lengths: list) -> int:
+        if not tasks:
+            return 0
+        start_days = np.array(starts)
+        start_strs = np.datetime_as_string(np.busday_offset(ORIGIN, start_days, roll="forward"), unit="D")
+        end_strs = np.datetime_as_string(np.busday_offset(ORIGIN, start_days + np.array(lengths), roll="forward"),
+                                         unit="D")
+        changed = 0
+        for task, start, end in zip(tasks, start_strs.tolist(), end_strs.tolist()):
+            if task.start != start:
+                task.start = start
+                changed += 1
+            if task.end != end:
+                task.end = end
+                changed += 1
+        return changed
+
+    def level(self) -> int:
+        '''Moves the tasks to their levelled dates, returns the number of changed dates.'''
+        return self.write_dates(*self.plan())
+
+
+def level(gantt: Gantt, capacity=DEFAULT_CAPACITY) -> int:
+    '''Levels the whole plan, see Leveller. Raises DependencyCycleError for cyclic references.'''
+    return Leveller(gantt, capacity).level()
@@ -0,0 +1,173 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import cProfile
+import itertools
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+COUNT_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()) -> None:
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, format_labels(self.labels, key), value
+
+
+class Gauge(Metric):
+    '''Either set explicitly or read from function when the metrics are collected.'''
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, function=None) -> None:
+        super().__init__(name, help)
+        self.function = function
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self):
+        yield self.name, "", self.function() if self.function is not None else self.value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = SECONDS_BUCKETS, labels: tuple = ()) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # per label values the count per bucket (the last one is +Inf), the sum and the count
+        self.values = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        counts = self.values.get(key)
+        if counts is None:
+            counts = self.values[key] = [[0] * (len(self.buckets) + 1), 0, 0]
+        counts[0][bisect_left(self.buckets, value)] += 1
+        counts[1] += value
+        counts[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        names = self.labels + ("le",)
+        for key, (buckets, total, count) in self.values.items():
+            cumulative = itertools.accumulate(buckets)
+            for bound, value in zip(self.buckets + ("+Inf",), cumulative):
+                yield f"{self.name}_bucket", format_labels(names, key + (bound,)), value
+            yield f"{self.name}_sum", format_labels(self.labels, key), total
+            yield f"{self.name}_count", format_labels(self.labels, key), count
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # modules may be imported more than once (e.g. as __main__), the first registration wins
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, function=None) -> Gauge:
+        return self.register(Gauge(name, help, function))
+
+    def histogram(self, name: str, help: str, buckets: tuple = SECONDS_BUCKETS, labels: tuple = ()) -> Histogram:
+        return self.register(Histogram(name, help, buckets, labels))
+
+    def render(self) -> str:
+        '''All metrics in the Prometheus text format.'''
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# profiles of the hot paths are written here when set, e.g. GANTT_PROFILE_DIR=/tmp/profiles
+profile_directory = os.environ.get("GANTT_PROFILE_DIR")
+_profile_counter = itertools.count()
+
+
+@contextmanager
+def profiled(name: str):
+    '''
+    Runs the block under cProfile and writes the stats to <profile_directory>/<name>-<pid>-<n>.prof,
+    does nothing unless a profile directory is set. The files can be read with pstats or snakeviz.
+    '''
+    if not profile_directory:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(profile_directory, exist_ok=True)
+        profile.dump_stats(os.path.join(profile_directory, f"{name}-{os.getpid()}-{next(_profile_counter)}.prof"))
@@ -0,0 +1,60 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import os
+from collections import OrderedDict
+
+from gantt.metrics import REGISTRY
+
+CACHE_HITS = REGISTRY.counter("gantt_render_cache_hits_total", "Charts served from the render cache", ("format",))
+CACHE_MISSES = REGISTRY.counter("gantt_render_cache_misses_total", "Charts rendered for the render cache", ("format",))
+
+
+class RenderCache:
+    '''
+    Rendered charts by (content hash, format, ...). Equal charts share one entry, no matter which
+    gantt or client asked for it. The least recently used entries are dropped once the cached
+    text exceeds max_bytes.
+    '''
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: tuple, render):
+        '''The cached value of key, render() is called and its result kept on a miss.'''
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            CACHE_HITS.inc(format=key[1])
+            return value
+        CACHE_MISSES.inc(format=key[1])
+        value = render()
+        self.entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, dropped = self.entries.popitem(last=False)
+            self.size -= len(dropped)
+        return value
+
+
+# one cache per process for the editor, the SVG renderer and the share pages
+RENDER_CACHE = RenderCache(int(os.environ.get("GANTT_RENDER_CACHE_MB", "64")) * 1024 * 1024)
+REGISTRY.gauge("gantt_render_cache_bytes", "Size of the cached charts", lambda: RENDER_CACHE.size)
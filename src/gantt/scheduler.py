@@ -0,0 +1,126 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from gantt.gantt_builder import Gantt, Section
+
+# a duration is counted in business days, the factors are the same the editor always used
+UNIT_DAYS = {"d": 1, "w": 7, "m": 30, "y": 365}
+DURATION_PATTERN = re.compile(r"^([0-9]+)([dwmy])$")
+
+
+# plans use a handful of different durations, each is parsed once
+@lru_cache(maxsize=4096)
+def parse_duration(duration: str) -> int:
+    '''Business days of a duration like "3d" or "2 w", -1 if it is empty or invalid.'''
+    match = DURATION_PATTERN.match("".join(duration.split())) if duration else None
+    if match is None:
+        return -1
+    return int(match.group(1)) * UNIT_DAYS[match.group(2)]
+
+
+def parse_durations(durations: list) -> np.ndarray:
+    return np.fromiter((parse_duration(d) for d in durations), dtype=np.int64, count=len(durations))
+
+
+def parse_dates(values: list) -> np.ndarray:
+    '''ISO dates to datetime64[D], empty or invalid values become NaT.'''
+    try:
+        return np.array([v if v else "NaT" for v in values], dtype="datetime64[D]")
+    except ValueError:
+        result = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[D]")
+        for i, value in enumerate(values):
+            try:
+                result[i] = np.datetime64(value, "D")
+            except ValueError:
+                pass
+        return result
+
+
+def schedule_tasks(tasks: list, first: np.ndarray, chain: bool = True) -> int:
+    '''
+    Computes the end date of all tasks with a duration in one batch.
+
+    first marks the first task of each section. With chain a task whose start equals the end of its
+    predecessor is considered to be chained to it and gets the new end of the predecessor as start,
+    the same way add_task sets it up. Tasks without a duration keep their end date.
+    Returns the number of changed tasks.
+    '''
+    n = len(tasks)
+    if n == 0:
+        return 0
+    starts = parse_dates([t.start for t in tasks])
+    old_ends = parse_dates([t.end for t in tasks])
+    offsets = parse_durations([t.duration for t in tasks])
+    has_duration = offsets >= 0
+
+    linked = np.zeros(n, dtype=bool)
+    if chain:
+        linked[1:] = ~first[1:] & (starts[1:] == old_ends[:-1])
+
+    # a run is a sequence of chained tasks, its end dates are offsets from the start of the first task.
+    # busday_offset(busday_offset(d, a), b) == busday_offset(d, a + b) for business days, so a cumulative sum is enough
+    run_start = first | ~linked
+    # a predecessor without a duration or without a start keeps its end, the next task is anchored at its own start
+    run_start[1:] |= ~has_duration[:-1] | np.isnat(starts[:-1])
+    run_start[0] = True
+    run = np.cumsum(run_start) - 1
+    anchors = starts[run_start][run]
+
+    days = np.where(has_duration, offsets, 0)
+    total = np.cumsum(days)
+    before_run = (total - days)[run_start][run]
+    ends = np.busday_offset(anchors, total - before_run, roll="forward")
+    chained_starts = np.busday_offset(anchors, total - days - before_run, roll="forward")
+
+    new_starts = np.where(run_start, starts, chained_starts)
+    new_ends = np.where(has_duration, ends, old_ends)
+    # chained tasks without a duration only move their start
+    fixed = np.flatnonzero(linked & ~has_duration)
+    new_starts[fixed] = new_ends[fixed - 1]
+
+    start_strs = np.datetime_as_string(new_starts, unit="D")
+    end_strs = np.datetime_as_string(new_ends, unit="D")
+    start_changed = ~np.isnat(new_starts) & (new_starts != starts)
+    end_changed = ~np.isnat(new_ends) & (new_ends != old_ends)
+    changed = np.flatnonzero(start_changed | end_changed)
+    for i in changed:
+        if start_changed[i]:
+            tasks[i].start = str(start_strs[i])
+        if end_changed[i]:
+            tasks[i].end = str(end_strs[i])
+    return len(changed)
+
+
+def schedule_section(section: Section, chain: bool = True) -> int:
+    first = np.zeros(len(section.tasks), dtype=bool)
+    first[:1] = True
+    return schedule_tasks(list(section.tasks), first, chain)
+
+
+def schedule(gantt: Gantt, chain: bool = True) -> int:
+    '''Re-schedules the whole plan with one busday_offset call for all sections.'''
+    tasks = []
+    first = []
+    for section in gantt.sections:
+        tasks.extend(section.tasks)
+        first.extend(i == 0 for i in range(len(section.tasks)))
+    return schedule_tasks(tasks, np.array(first, dtype=bool), chain)
+
@@ -0,0 +1,278 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+import sys
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from gantt.backends import GanttBackend, SqliteBackend
+from gantt import codec, journal
+from gantt.gantt_builder import Gantt
+
+
+def estimate_size(gantt: Gantt) -> int:
+    '''Rough number of bytes a gantt occupies in memory.'''
+    size = sys.getsizeof(gantt) + sys.getsizeof(gantt.__dict__) + sys.getsizeof(gantt.sections)
+    for section in gantt.sections:
+        size += sys.getsizeof(section) + sys.getsizeof(section.tasks)
+        size += sys.getsizeof(section.title) + sys.getsizeof(section._mermaid) + sys.getsizeof(section._compact)
+        for task in section.tasks:
+            # the slots are part of the object, the values only count when they are not shared
+            size += sys.getsizeof(task) + sys.getsizeof(task.id) + sys.getsizeof(task.title) + sys.getsizeof(task._mermaid)
+            size += sys.getsizeof(task._compact)
+            size += sys.getsizeof(task.before) + sys.getsizeof(task.after)
+    return size
+
+
+class SessionStore(MutableMapping):
+    '''
+    Dict like store of the gantts of all sessions with a memory budget.
+
+    Every gantt is persisted in a backend which can be shared by several worker processes.
+    flush() writes the gantts changed since they were saved, an unchanged gantt is loaded
+    again when another worker has saved a newer version of it.
+
+    Gantts which have not been used for idle_seconds, and the least recently used ones as long
+    as the budget is exceeded, are dropped from memory and loaded again on access.
+    A dropped gantt which is still referenced (e.g. by an open page) is handed out again as is.
+
+    The changes of a gantt are recorded as journal records. If the backend keeps a journal,
+    flush() only appends these records, so a write is as large as the edit rather than the plan.
+    After snapshot_records records the whole gantt is saved again and the journal is dropped.
+    Records are only appended to the version of the gantt they were made for. When another worker has
+    written in between, the whole gantt is saved instead.
+    '''
+
+    def __init__(self, backend: GanttBackend = None, memory_budget: int = 256 * 1024 * 1024, idle_seconds: float = 900,
+                 snapshot_records: int = 1000) -> None:
+        self.backend = backend if backend is not None else SqliteBackend("gantt_sessions.db")
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self.sessions = OrderedDict()
+        self.last_access = {}
+        self.sizes = {}
+        self.spilled = weakref.WeakValueDictionary()
+        # per id the change counter of the gantt and the backend version of the last save or load
+        self.saved = {}
+        self.snapshot_records = snapshot_records
+        # per id the records not written yet (key of the record, JSON) and the journal length since the snapshot
+        self.pending = {}
+        self.journaled = {}
+
+    def __getitem__(self, id: str) -> Gantt:
+        gantt = self.sessions.get(id)
+        if gantt is None:
+            gantt = self.spilled.pop(id, None)
+        saved = self.saved.get(id)
+        if gantt is not None and saved is not None and saved[0] == gantt._version:
+            # no local changes, but another worker may have saved a newer version
+            if self.backend.version(id) != saved[1]:
+                self.reload(id, gantt)
+        if gantt is None:
+            gantt, version, journaled = self.load(id)
+            self.saved[id] = (gantt._version, version)
+            self.journaled[id] = journaled
+            gantt.add_listener(self.record)
+            if journaled is None:
+                # the snapshot replaces the journal which could not be applied
+                self.save(id, gantt)
+        self.sessions[id] = gantt
+        self.sessions.move_to_end(id)
+        self.last_access[id] = time.monotonic()
+        if id not in self.sizes:
+            self.sizes[id] = estimate_size(gantt)
+        return gantt
+
+    def __setitem__(self, id: str, gantt: Gantt) -> None:
+        self.spilled.pop(id, None)
+        self.sessions[id] = gantt
+        self.sessions.move_to_end(id)
+        self.last_access[id] = time.monotonic()
+        self.sizes[id] = estimate_size(gantt)
+        # written right away, so other workers know the gantt
+        self.save(id, gantt)
+        gantt.add_listener(self.record)
+
+    def __delitem__(self, id: str) -> None:
+        found = id in self.sessions or id in self.spilled
+        gantt = self.sessions.pop(id, None) or self.spilled.pop(id, None)
+        if gantt is not None:
+            gantt.remove_listener(self.record)
+        self.last_access.pop(id, None)
+        self.sizes.pop(id, None)
+        self.spilled.pop(id, None)
+        self.forget(id)
+        if not self.backend.delete(id) and not found:
+            raise KeyError(id)
+
+    def __contains__(self, id) -> bool:
+        return id in self.sessions or id in self.spilled or self.backend.version(id) is not None
+
+    def __iter__(self):
+        yield from self.sessions
+        for id in self.backend.ids():
+            if id not in self.sessions:
+                yield id
+
+    def __len__(self) -> int:
+        return len(self.sessions) + sum(1 for id in self.backend.ids() if id not in self.sessions)
+
+    def load(self, id: str) -> tuple:
+        '''
+        (gantt, backend version, journal length) from the backend. A journal which does not fit its snapshot
+        is left out, the gantt is the snapshot then and the journal length None.
+        '''
+        loaded = self.backend.load(id)
+        if loaded is None:
+            raise KeyError(id)
+        data, version, records = loaded
+        gantt = codec.loads(data, max_bytes=None, max_tasks=None)
+        try:
+            journal.replay(gantt, [codec.loads_json(record) for record in records])
+        except codec.GanttFormatError:
+            # e.g. written by an older version which mixed the records of several workers, better to lose
+            # the latest changes than to have a gantt which can never be opened again
+            return codec.loads(data, max_bytes=None, max_tasks=None), version, None
+        return gantt, version, len(records)
+
+    def reload(self, id: str, gantt: Gantt) -> None:
+        '''
+        Takes over the version saved by another worker. Open pages keep the gantt object, so it is changed in
+        place: they see the new content and their later edits are still recorded.
+        '''
+        loaded, version, journaled = self.load(id)
+        # taking over is not an edit of this worker
+        gantt.remove_listener(self.record)
+        gantt.replace_content(loaded)
+        gantt.add_listener(self.record)
+        self.pending.pop(id, None)
+        self.saved[id] = (gantt._version, version)
+        self.journaled[id] = journaled
+        self.sizes.pop(id, None)
+        if journaled is None:
+            self.save(id, gantt)
+
+    def share_token(self, id: str) -> str:
+        '''The token of the read-only link of a stored gantt, see GanttBackend.share.'''
+        return self.backend.share(id)
+
+    def shared_id(self, token: str):
+        '''The id of the gantt shared with token, None if there is none.'''
+        id = self.backend.shared(token)
+        return id if id is not None and id in self else None
+
+    def assign(self, user: str, id: str, replace: bool = True) -> str:
+        '''Keeps the gantt of a browser in the backend for all workers, see GanttBackend.assign.'''
+        return self.backend.assign(user, id, replace)
+
+    def assigned(self, user: str):
+        '''The id of the gantt of a browser, None if none has been assigned yet.'''
+        return self.backend.assigned(user)
+
+    def session_size(self, id: str) -> int:
+        '''Estimated memory of a loaded session in bytes, 0 if it is not in memory.'''
+        return self.sizes.get(id, 0)
+
+    @property
+    def memory_used(self) -> int:
+        return sum(self.sizes.values())
+
+    def record(self, gantt: Gantt, change: tuple) -> None:
+        '''Listener of the gantts in the store, keeps the journal records until the next flush.'''
+        pending = self.pending.setdefault(gantt.id, [])
+        if pending is None:
+            return
+        try:
+            record = journal.encode(gantt, change)
+        except ValueError:
+            # e.g. a change of a section which is no longer part of the gantt, the next write is a snapshot
+            self.pending[gantt.id] = None
+            return
+        if record is None:
+            return
+        key = journal.key(record)
+        # typing into an input sets the same field over and over, only the last value is written
+        if key is not None and pending and pending[-1][0] == key:
+            pending.pop()
+        pending.append((key, codec.dumps_json(record).decode()))
+
+    def forget(self, id: str) -> None:
+        self.saved.pop(id, None)
+        self.pending.pop(id, None)
+        self.journaled.pop(id, None)
+
+    def save(self, id: str, gantt: Gantt) -> None:
+        '''Writes a snapshot of the whole gantt.'''
+        data = codec.dumps(gantt).decode()
+        self.pending.pop(id, None)
+        self.saved[id] = (gantt._version, self.backend.save(id, data))
+        self.journaled[id] = 0
+
+    def write(self, id: str, gantt: Gantt) -> bool:
+        '''Writes the changes since the last write, as journal records if possible. Returns False if there were none.'''
+        saved = self.saved.get(id)
+        if saved is not None and saved[0] == gantt._version:
+            return False
+        pending = self.pending.pop(id, [])
+        records = [record for _, record in pending] if pending is not None else []
+        journaled = self.journaled.get(id, 0) + len(records)
+        if saved is not None and records and journaled <= self.snapshot_records:
+            # the records are made for the version this worker knows, if another worker has written since, the
+            # snapshot is written instead: the last writer wins, but the journal stays consistent
+            version = self.backend.append(id, records, saved[1])
+            if version is not None:
+                self.saved[id] = (gantt._version, version)
+                self.journaled[id] = journaled
+                return True
+        self.save(id, gantt)
+        return True
+
+    def flush(self) -> int:
+        '''Writes all gantts changed since their last write, returns the number of written gantts.'''
+        flushed = 0
+        for id, gantt in list(self.sessions.items()) + list(self.spilled.items()):
+            if self.write(id, gantt):
+                flushed += 1
+        for id in list(self.saved):
+            if id not in self.sessions and id not in self.spilled:
+                self.forget(id)
+        return flushed
+
+    def spill(self, id: str) -> None:
+        gantt = self.sessions.pop(id)
+        self.last_access.pop(id)
+        self.sizes.pop(id)
+        self.write(id, gantt)
+        self.spilled[id] = gantt
+
+    def evict(self) -> int:
+        '''Drops idle sessions and the least recently used ones until the budget is met, returns the number of dropped sessions.'''
+        self.flush()
+        for id, gantt in self.sessions.items():
+            self.sizes[id] = estimate_size(gantt)
+        used = self.memory_used
+        now = time.monotonic()
+        spilled = 0
+        # the sessions are ordered by their last access, so the idle ones come first
+        for id in list(self.sessions):
+            if now - self.last_access[id] <= self.idle_seconds and used <= self.memory_budget:
+                break
+            used -= self.sizes[id]
+            self.spill(id)
+            spilled += 1
+        return spilled
@@ -0,0 +1,55 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from html import escape
+
+from gantt.gantt_builder import Gantt
+from gantt.render_cache import RENDER_CACHE
+from gantt.svg_renderer import render_svg
+
+# read-only formats -> media type
+FORMATS = {
+    "html": "text/html; charset=utf-8",
+    "svg": "image/svg+xml",
+    "mermaid": "text/plain; charset=utf-8",
+}
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>body {{ margin: 1rem; font-family: sans-serif; }} svg {{ max-width: 100%; height: auto; }}</style>
+</head>
+<body>
+{svg}
+</body>
+</html>
+'''
+
+
+def render_share(gantt: Gantt, format: str) -> str:
+    '''
+    The chart as a static page (SVG inline, no scripts), SVG or mermaid text. Every version of a chart
+    is rendered once, later viewers get the text from the render cache.
+    '''
+    if format == "svg":
+        return render_svg(gantt)
+    key = (gantt.content_hash(), format, None)
+    if format == "mermaid":
+        return RENDER_CACHE.get(key, gantt.get_mermaid_document)
+    return RENDER_CACHE.get(key, lambda: PAGE.format(title=escape(gantt.title or "Gantt"), svg=render_svg(gantt)))
@@ -0,0 +1,178 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from datetime import date, timedelta
+from html import escape
+from itertools import groupby
+from operator import itemgetter
+
+from gantt.gantt_builder import Gantt, Task
+from gantt.render_cache import RENDER_CACHE
+
+# same geometry as MERMAID_CONFIG in gantt_builder
+BAR_HEIGHT = 40
+BAR_GAP = 10
+FONT_SIZE = 20
+SECTION_FONT_SIZE = 20
+LEFT_PADDING = 200
+RIGHT_PADDING = 75
+TOP_PADDING = 75
+GRID_LINE_START_PADDING = 50
+AXIS_HEIGHT = 40
+WIDTH = 1600
+
+CRIT_COLOR = "#ff8888"
+CRIT_BORDER_COLOR = "#ff0000"
+DONE_COLOR = "#d3d3d3"
+ACTIVE_COLOR = "#bfc7ff"
+TASK_BORDER_COLOR = "#534fbc"
+TODAY_COLOR = "#ff0000"
+GRID_COLOR = "#d3d3d3"
+
+TICK_DAYS = {"1day": 1, "1week": 7, "1month": 30, "3month": 91}
+MAX_AUTO_TICKS = 20
+
+
+def task_dates(task: Task):
+    try:
+        start = date.fromisoformat(task.start)
+    except ValueError:
+        return None
+    try:
+        end = date.fromisoformat(task.end) if task.type != "Milestone" else start
+    except ValueError:
+        end = start
+    return start, max(start, end)
+
+
+def section_color(gantt: Gantt, index: int) -> str:
+    if index == 0:
+        return gantt.section0bgcolor
+    return gantt.odd_sectionbgcolor if index % 2 else gantt.even_sectionbgcolor
+
+
+def tick_dates(first: date, last: date, tick_interval: str) -> list:
+    days = (last - first).days
+    step = TICK_DAYS.get(tick_interval)
+    if step is None:
+        step = next((s for s in (1, 7, 30, 91, 365) if days / s <= MAX_AUTO_TICKS), 365)
+    if step >= 30:
+        # month based ticks start at the first of a month
+        months = max(step // 30, 1) if step < 365 else 12
+        tick = date(first.year, first.month, 1)
+        ticks = []
+        while tick <= last:
+            if tick >= first:
+                ticks.append(tick)
+            month = tick.month - 1 + months
+            tick = date(tick.year + month // 12, month % 12 + 1, 1)
+        return ticks
+    return [first + timedelta(days=d) for d in range(0, days + 1, step)]
+
+
+def build_svg(gantt: Gantt, part=None) -> str:
+    '''The whole gantt or one part of it (see gantt.viewport), the axis then spans the window of the part.'''
+    rows = []
+    window = part.window if part is not None else None
+    if part is not None:
+        for section, tasks in part.rows:
+            for task, dates in tasks:
+                if dates:
+                    rows.append((section, task, window.clip(dates) if window else dates))
+    else:
+        for section in gantt.sections:
+            for task in section.tasks:
+                dates = task_dates(task)
+                if dates:
+                    rows.append((section, task, dates))
+
+    title_height = TOP_PADDING if gantt.show_title else GRID_LINE_START_PADDING
+    height = title_height + len(rows) * (BAR_HEIGHT + BAR_GAP) + AXIS_HEIGHT + BAR_GAP
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{height}" '
+           f'viewBox="0 0 {WIDTH} {height}" font-family="sans-serif">']
+    if gantt.show_title:
+        out.append(f'<text x="{WIDTH / 2}" y="{TOP_PADDING / 2}" text-anchor="middle" font-size="36">{escape(gantt.title)}</text>')
+    if not rows:
+        out.append("</svg>")
+        return "".join(out)
+
+    if window is not None:
+        first, last = window.start, window.end
+    else:
+        first = min(start for _, _, (start, _) in rows)
+        last = max(end for _, _, (_, end) in rows)
+    last = max(last, first + timedelta(days=1))
+    scale = (WIDTH - LEFT_PADDING - RIGHT_PADDING) / (last - first).days
+
+    def x(day: date) -> float:
+        return round(LEFT_PADDING + (day - first).days * scale, 1)
+
+    chart_bottom = title_height + len(rows) * (BAR_HEIGHT + BAR_GAP)
+
+    # swimlane bands with their titles, coloured by their position in the gantt like in mermaid even if
+    # swimlanes before them are empty or outside the window
+    band_y = title_height
+    for section, section_rows in groupby(rows, key=itemgetter(0)):
+        band_height = sum(1 for _ in section_rows) * (BAR_HEIGHT + BAR_GAP)
+        out.append(f'<rect x="0" y="{band_y}" width="{WIDTH}" height="{band_height}" '
+                   f'fill="{escape(section_color(gantt, gantt.sections.index(section)))}" fill-opacity="0.3"/>')
+        out.append(f'<text x="10" y="{band_y + band_height / 2}" dominant-baseline="middle" '
+                   f'font-size="{SECTION_FONT_SIZE}">{escape(section.title)}</text>')
+        band_y += band_height
+
+    # axis with grid lines
+    for tick in tick_dates(first, last, window.tick_interval if window and window.tick_interval else gantt.tick_interval):
+        tx = x(tick)
+        out.append(f'<line x1="{tx}" y1="{title_height}" x2="{tx}" y2="{chart_bottom}" stroke="{GRID_COLOR}"/>')
+        out.append(f'<text x="{tx}" y="{chart_bottom + AXIS_HEIGHT / 2}" text-anchor="middle" '
+                   f'font-size="16">{escape(tick.strftime(gantt.axis_format))}</text>')
+
+    for i, (_, task, (start, end)) in enumerate(rows):
+        y = title_height + i * (BAR_HEIGHT + BAR_GAP) + BAR_GAP / 2
+        if task.critical:
+            fill, stroke = CRIT_COLOR, CRIT_BORDER_COLOR
+        elif task.status == "done":
+            fill, stroke = DONE_COLOR, GRID_COLOR
+        elif task.status == "active":
+            fill, stroke = ACTIVE_COLOR, TASK_BORDER_COLOR
+        else:
+            fill, stroke = gantt.taskbgcolor, TASK_BORDER_COLOR
+        title = escape(task.title)
+        if task.type == "Milestone":
+            cx, cy, r = x(start), y + BAR_HEIGHT / 2, BAR_HEIGHT / 2
+            out.append(f'<polygon points="{cx},{cy - r} {cx + r},{cy} {cx},{cy + r} {cx - r},{cy}" '
+                       f'fill="{escape(fill)}" stroke="{stroke}"/>')
+            out.append(f'<text x="{cx + r + 5}" y="{cy}" dominant-baseline="middle" font-size="{FONT_SIZE}">{title}</text>')
+        else:
+            bx = x(start)
+            width = max(x(end) - bx, 1)
+            out.append(f'<rect x="{bx}" y="{y}" width="{width}" height="{BAR_HEIGHT}" rx="3" '
+                       f'fill="{escape(fill)}" stroke="{stroke}"/>')
+            out.append(f'<text x="{bx + width / 2}" y="{y + BAR_HEIGHT / 2}" text-anchor="middle" '
+                       f'dominant-baseline="middle" font-size="{FONT_SIZE}">{title}</text>')
+
+    today = date.today()
+    if gantt.show_today and first <= today <= last:
+        out.append(f'<line x1="{x(today)}" y1="{title_height}" x2="{x(today)}" y2="{chart_bottom}" '
+                   f'stroke="{TODAY_COLOR}" stroke-width="2"/>')
+    out.append("</svg>")
+    return "".join(out)
+
+
+def render_svg(gantt: Gantt, part=None) -> str:
+    '''SVG of the gantt, an unchanged chart is served from the cache.'''
+    key = (gantt.content_hash(), "svg", part.key() if part is not None else None)
+    return RENDER_CACHE.get(key, lambda: build_svg(gantt, part))
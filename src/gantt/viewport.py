@@ -0,0 +1,187 @@
+'''
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+from datetime import date, timedelta
+
+from gantt.codec import ref_id
+from gantt.gantt_builder import MERMAID_CONFIG, Gantt, Task
+from gantt.svg_renderer import task_dates
+
+# zoom level -> (tick interval, days in the window)
+ZOOMS = {
+    "Day": ("1day", 14),
+    "Week": ("1week", 91),
+    "Month": ("1month", 365),
+    "Year": ("3month", 3 * 365),
+}
+
+SPLIT_NONE = "None"
+SPLIT_AUTO = "Auto"
+SPLIT_SECTIONS = "Swimlanes"
+SPLIT_QUARTERS = "Quarters"
+SPLITS = (SPLIT_AUTO, SPLIT_NONE, SPLIT_SECTIONS, SPLIT_QUARTERS)
+
+# more tasks than this in one diagram are split by "Auto", mermaid lays out each diagram as a whole
+MAX_PART_TASKS = 250
+
+
+def quarter_start(day: date) -> date:
+    return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+
+
+class Viewport:
+    '''The visible date window of a chart, both days included.'''
+
+    def __init__(self, start: date, end: date, tick_interval: str = None) -> None:
+        self.start = start
+        self.end = max(start, end)
+        self.tick_interval = tick_interval
+
+    @classmethod
+    def zoomed(cls, start: date, zoom: str):
+        tick_interval, days = ZOOMS[zoom]
+        return cls(start, start + timedelta(days=days - 1), tick_interval)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Viewport) and self.key() == other.key()
+
+    def key(self) -> tuple:
+        return self.start, self.end, self.tick_interval
+
+    def shifted(self, steps: int):
+        '''The window moved by half its width per step, forwards or backwards.'''
+        days = max(1, ((self.end - self.start).days + 1) // 2) * steps
+        return Viewport(self.start + timedelta(days=days), self.end + timedelta(days=days), self.tick_interval)
+
+    def overlaps(self, dates: tuple) -> bool:
+        return dates is not None and dates[0] <= self.end and dates[1] >= self.start
+
+    def contains(self, dates: tuple) -> bool:
+        return self.start <= dates[0] and dates[1] <= self.end
+
+    def clip(self, dates: tuple) -> tuple:
+        return max(dates[0], self.start), min(dates[1], self.end)
+
+
+def dated_rows(sections: list) -> list:
+    '''(section, [(task, dates), ...]) for the sections, the dates are only parsed once per chart.'''
+    return [(section, [(task, task_dates(task)) for task in section.tasks]) for section in sections]
+
+
+def plan_range(rows: list):
+    '''First and last day of all dated tasks, None for a plan without dates.'''
+    first = last = None
+    for _, tasks in rows:
+        for _, dates in tasks:
+            if dates is not None:
+                if first is None or dates[0] < first:
+                    first = dates[0]
+                if last is None or dates[1] > last:
+                    last = dates[1]
+    return (first, last) if first is not None else None
+
+
+class Part:
+    '''
+    One diagram of a split chart: some sections, each with the tasks overlapping the window.
+    Tasks sticking out of the window are cut at its borders, references to tasks which are not
+    part of the diagram are left out as mermaid does not know them.
+    '''
+
+    def __init__(self, gantt: Gantt, title: str, rows: list, window: Viewport = None) -> None:
+        self.gantt = gantt
+        self.title = title
+        self.window = window
+        # the dated_rows in the window, without the sections which have no task in it
+        self.rows = []
+        for section, tasks in rows:
+            if window is not None:
+                tasks = [(task, dates) for task, dates in tasks if window.overlaps(dates)]
+            if tasks:
+                self.rows.append((section, tasks))
+
+    def __len__(self) -> int:
+        return sum(len(tasks) for _, tasks in self.rows)
+
+    def key(self) -> tuple:
+        # unique within one state of the gantt, used next to its content hash for caching
+        sections = tuple(self.gantt.sections.index(section) for section, _ in self.rows)
+        return self.title, sections, self.window.key() if self.window else None
+
+    def task_line(self, task: Task, dates: tuple, emitted: set, aliases = None) -> str:
+        references = (*task.after, *task.before)
+        clipped = self.window is not None and not self.window.contains(dates)
+        if not clipped and all(ref_id(ref) in emitted for ref in references):
+            # the cached fragment of the full chart
+            return task.get_mermaid_str(aliases)
+        if dates is None:
+            timing = task.end if task.end else getattr(task, "length", "")
+        else:
+            start, end = self.window.clip(dates) if clipped else dates
+            timing = f"{start.isoformat()}, {end.isoformat()}"
+        return f"  {task.title}: {'crit, ' if task.critical else ''}" + \
+            f"{task.status + ', ' if task.status else ''}" + \
+            f"{'milestone, ' if task.type == 'Milestone' else ''}" + \
+            f"{aliases[task.id] if aliases is not None else task.id}, {timing}\n"
+
+    def get_mermaid_str(self, compact: bool = False) -> str:
+        '''The diagram of the part, with compact the task ids are replaced by the short names of the gantt.'''
+        aliases = self.gantt._aliases if compact else None
+        emitted = {task.id for _, tasks in self.rows for task, _ in tasks}
+        parts = [self.gantt.get_mermaid_header(self.window.tick_interval if self.window else None)]
+        for section, tasks in self.rows:
+            parts.append(f"section {section.title}\n")
+            parts.extend(self.task_line(task, dates, emitted, aliases) for task, dates in tasks)
+        return "".join(parts)
+
+    def get_mermaid_document(self, template: str = MERMAID_CONFIG, compact: bool = False) -> str:
+        return self.gantt.get_mermaid_config(template) + self.get_mermaid_str(compact)
+
+
+def partition(gantt: Gantt, split: str = SPLIT_AUTO, window: Viewport = None,
+              max_tasks: int = MAX_PART_TASKS) -> list:
+    '''
+    The diagrams for the gantt, a single part unless split. "Auto" keeps one diagram up to max_tasks
+    and otherwise splits by swimlane, or by quarter when a single swimlane is still too large.
+    '''
+    rows = dated_rows(gantt.sections)
+    whole = Part(gantt, gantt.title, rows, window)
+    if split == SPLIT_AUTO:
+        if len(whole) <= max_tasks:
+            return [whole]
+        largest = max(len(tasks) for _, tasks in whole.rows)
+        split = SPLIT_SECTIONS if largest <= max_tasks else SPLIT_QUARTERS
+    if split == SPLIT_SECTIONS:
+        return [Part(gantt, section.title, [(section, tasks)], window) for section, tasks in whole.rows]
+    if split == SPLIT_QUARTERS:
+        dates = plan_range(whole.rows)
+        if dates is None:
+            return [whole]
+        first, last = dates
+        if window is not None:
+            first, last = max(first, window.start), min(last, window.end)
+        tick_interval = window.tick_interval if window else None
+        parts = []
+        start = quarter_start(first)
+        while start <= last:
+            following = quarter_start(start + timedelta(days=92))
+            quarter = Viewport(max(start, first), min(following - timedelta(days=1), last), tick_interval)
+            part = Part(gantt, f"{start.year} Q{(start.month - 1) // 3 + 1}", whole.rows, quarter)
+            if len(part):
+                parts.append(part)
+            start = following
+        return parts or [whole]
+    return [whole]
@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from gantt import codec
+from gantt.backends import SqliteBackend
+from gantt.gantt_builder import Gantt, Task
+from gantt.session_store import SessionStore
+from ui.api import create_router, delete_tasks, upsert_tasks
+from ui.share import create_share_router
+
+
+def make_gantt(id="g"):
+    gantt = Gantt(id=id, title="Plan")
+    gantt.add_section("one").tasks = [
+        Task("A", id="a", start="2024-01-01", end="2024-01-03", duration="2d"),
+        Task("B", id="b", start="2024-01-03", end="2024-01-04", duration="1d", after=["a"]),
+    ]
+    gantt.add_section("two").tasks = [Task("C", id="c", start="2024-01-04", end="2024-01-05", duration="1d", after=["b"])]
+    return gantt
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    sessions = SessionStore(SqliteBackend(str(tmp_path / "s.db")))
+    sessions["g"] = make_gantt()
+    return sessions
+
+
+class Client:
+    '''Sends requests to the app without a server, one event loop per request.'''
+
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, url, **kwargs):
+        async def send():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.request(method, url, **kwargs)
+
+        return asyncio.run(send())
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+@pytest.fixture
+def client(sessions):
+    app = FastAPI()
+    app.include_router(create_router(sessions, 10_000, 100))
+    app.include_router(create_share_router(sessions, 60))
+    return Client(app)
+
+
+def test_upsert_updates_moves_and_creates():
+    gantt = make_gantt()
+    changes = upsert_tasks(gantt, [
+        {"id": "a", "title": "A!"},
+        {"id": "c", "section": "one"},
+        {"title": "New", "section": "three"},
+    ])
+    assert changes["updated"] == ["a", "c"]
+    assert len(changes["created"]) == 1
+    # two is left empty and removed
+    assert [section.title for section in gantt.sections] == ["one", "three"]
+    assert [task.id for task in gantt.sections[0].tasks] == ["a", "b", "c"]
+    assert gantt.sections[0].tasks[0].title == "A!"
+
+
+def test_broken_upsert_leaves_the_gantt_as_it_was():
+    gantt = make_gantt()
+    before = codec.encode(gantt)
+    with pytest.raises(codec.GanttFormatError):
+        upsert_tasks(gantt, [{"id": "a", "title": "A!"}, {"id": "new"}])
+    with pytest.raises(codec.GanttLimitError):
+        upsert_tasks(gantt, [{"title": "x"}, {"title": "y"}], max_tasks=4)
+    assert codec.encode(gantt) == before
+
+
+def test_delete_removes_references_and_empty_swimlanes():
+    gantt = make_gantt()
+    assert delete_tasks(gantt, ["b", "c", "unknown"]) == ["b", "c"]
+    assert [section.title for section in gantt.sections] == ["one"]
+    assert [task.id for task in gantt.sections[0].tasks] == ["a"]
+
+
+def test_read_and_replace(client, sessions):
+    response = client.get("/api/gantts/g")
+    assert response.status_code == 200
+    assert codec.encode(codec.loads(response.content)) == codec.encode(sessions["g"])
+    assert client.get("/api/gantts/unknown").status_code == 404
+
+    doc = codec.encode(make_gantt())
+    doc["title"] = "Replaced"
+    page = sessions["g"]
+    assert client.put("/api/gantts/g", json=doc).json() == {"id": "g", "created": False}
+    # open editors keep their object
+    assert sessions["g"] is page and page.title == "Replaced"
+    assert client.put("/api/gantts/h", json=doc).status_code == 201
+    assert client.put("/api/gantts/h", json={"sections": 5}).status_code == 400
+    assert client.put("/api/gantts/h", content=b"x" * 20_000).status_code == 413
+
+
+def test_upsert_moves_the_tasks_after_the_changed_ones(client, sessions):
+    response = client.post("/api/gantts/g/tasks", json={"tasks": [{"id": "a", "duration": "4d", "end": "2024-01-05"}]})
+    assert response.status_code == 200
+    # start and end of b and c
+    assert response.json()["moved"] == 4
+    b, c = sessions["g"].sections[0].tasks[1], sessions["g"].sections[1].tasks[0]
+    assert (b.start, b.end, c.start, c.end) == ("2024-01-05", "2024-01-08", "2024-01-08", "2024-01-09")
+    assert client.post("/api/gantts/g/tasks", json={"items": []}).status_code == 400
+
+
+def test_upsert_with_a_cycle_keeps_the_tasks(client, sessions):
+    response = client.post("/api/gantts/g/tasks", json={"tasks": [{"id": "a", "after": ["c"]}]})
+    assert response.status_code == 200
+    assert set(response.json()["cycle"]) >= {"a", "b", "c"}
+    assert sessions["g"].sections[0].tasks[0].after == ["c"]
+    assert client.post("/api/gantts/g/critical").status_code == 400
+
+
+def test_delete_level_and_critical(client, sessions):
+    assert client.post("/api/gantts/g/critical").json() == {"critical": ["a", "b", "c"]}
+    assert sessions["g"].sections[1].tasks[0].critical is True
+    assert client.post("/api/gantts/g/level?capacity=1").status_code == 200
+    assert client.post("/api/gantts/g/tasks/delete", json={"ids": ["c"]}).json() == {"deleted": ["c"]}
+    assert [section.title for section in sessions["g"].sections] == ["one"]
+
+
+def test_share_links(client, sessions):
+    token = sessions.share_token("g")
+    page = client.get(f"/share/{token}")
+    assert page.status_code == 200
+    assert "g" not in page.url.path.split("/")
+    mermaid = client.get(f"/share/{token}/chart.mmd")
+    assert mermaid.text == sessions["g"].get_mermaid_document()
+    svg = client.get(f"/share/{token}/chart.svg")
+    assert svg.headers["content-type"].startswith("image/svg+xml")
+    # the same content is not sent twice
+    etag = svg.headers["etag"]
+    assert client.get(f"/share/{token}/chart.svg", headers={"If-None-Match": etag}).status_code == 304
+    sessions["g"].title = "Changed"
+    assert client.get(f"/share/{token}/chart.svg", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/share/unknown").status_code == 404
@@ -0,0 +1,76 @@
+import io
+import json
+
+import pytest
+
+from gantt import codec
+from gantt.gantt_builder import Gantt, Task, gantt_encoder
+
+
+def make_gantt():
+    gantt = Gantt(id="g", title="Plan", show_weekends=True, tick_interval="1week")
+    gantt.add_section("one").tasks = [
+        Task("A", id="a", start="2024-01-01", end="2024-01-03", duration="2d", status="done", critical=True),
+        Task("B", id="b", type="Milestone", start="2024-01-03", end="2024-01-03", after=["a"]),
+    ]
+    gantt.add_section("two").tasks = [Task("C", id="c", start="2024-01-04", end="2024-01-05", before=["b"])]
+    return gantt
+
+
+def test_round_trip():
+    gantt = make_gantt()
+    data = codec.dumps(gantt)
+    for loaded in (codec.loads(data), codec.load_stream(io.BytesIO(data))):
+        assert codec.encode(loaded) == codec.encode(gantt)
+        assert loaded.get_mermaid_str() == gantt.get_mermaid_str()
+
+
+def test_references_are_stored_as_ids():
+    gantt = make_gantt()
+    a, b = gantt.sections[0].tasks
+    b.after = [a]
+    doc = codec.encode(gantt)
+    assert doc["sections"][0]["tasks"][1]["after"] == ["a"]
+
+
+def test_legacy_format():
+    gantt = make_gantt()
+    legacy = json.dumps(gantt, default=gantt_encoder).encode()
+    assert codec.encode(codec.loads(legacy)) == codec.encode(gantt)
+    assert codec.encode(codec.load_stream(io.BytesIO(legacy))) == codec.encode(gantt)
+
+
+def task_doc(**fields):
+    return {"schema": 1, "sections": [{"title": "s", "tasks": [dict({"id": "a", "title": "t"}, **fields)]}]}
+
+
+@pytest.mark.parametrize("doc", [
+    {"schema": "2", "sections": []},
+    {"schema": True, "sections": []},
+    {"schema": codec.SCHEMA_VERSION + 1, "sections": []},
+    {"sections": [1]},
+    {"sections": [{"title": 3, "tasks": []}]},
+    {"sections": [{"tasks": 5}]},
+    {"title": 5, "sections": []},
+    task_doc(start=5),
+    task_doc(critical="yes"),
+    task_doc(after=[1]),
+    task_doc(before="b"),
+    task_doc(before=[{"title": "no id"}]),
+    task_doc(id=5),
+])
+def test_broken_documents(doc):
+    with pytest.raises(codec.GanttFormatError):
+        codec.decode(doc)
+    with pytest.raises(codec.GanttFormatError):
+        codec.load_stream(io.BytesIO(json.dumps(doc).encode()))
+
+
+def test_limits():
+    data = codec.dumps(make_gantt())
+    with pytest.raises(codec.GanttLimitError):
+        codec.loads(data, max_tasks=2)
+    with pytest.raises(codec.GanttLimitError):
+        codec.load_stream(io.BytesIO(data), max_bytes=len(data) - 1)
+    with pytest.raises(codec.GanttLimitError):
+        codec.load_stream(io.BytesIO(data), max_tasks=2)
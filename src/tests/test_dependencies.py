@@ -0,0 +1,113 @@
+import pytest
+
+from gantt.dependencies import DependencyCycleError, DependencyGraph, follow
+from gantt.gantt_builder import Gantt, Task
+
+
+def make_gantt():
+    # a -> b -> c and a -> d, e has no dependencies
+    gantt = Gantt(id="g")
+    gantt.add_section("one").tasks = [
+        Task("A", id="a", start="2024-01-01", end="2024-01-03", duration="2d"),
+        Task("B", id="b", start="2024-01-01", end="2024-01-04", duration="3d", after=["a"]),
+    ]
+    gantt.add_section("two").tasks = [
+        Task("C", id="c", start="2024-01-01", end="2024-01-02", duration="1d", after=["b"]),
+        Task("D", id="d", start="2024-01-01", end="2024-01-02", duration="1d", after=["a"]),
+        Task("E", id="e", start="2024-01-02", end="2024-01-03", duration="1d"),
+    ]
+    return gantt
+
+
+def dates(gantt):
+    return {task.id: (task.start, task.end) for section in gantt.sections for task in section.tasks}
+
+
+def test_resolve_starts_tasks_at_the_end_of_their_predecessors():
+    gantt = make_gantt()
+    DependencyGraph(gantt).resolve()
+    assert dates(gantt) == {
+        "a": ("2024-01-01", "2024-01-03"),
+        "b": ("2024-01-03", "2024-01-08"),
+        "c": ("2024-01-08", "2024-01-09"),
+        "d": ("2024-01-03", "2024-01-04"),
+        "e": ("2024-01-02", "2024-01-03"),
+    }
+
+
+def test_before_is_the_reverse_of_after():
+    gantt = Gantt(id="g")
+    gantt.add_section("s").tasks = [
+        Task("A", id="a", start="2024-01-01", end="2024-01-03", duration="2d", before=["b"]),
+        Task("B", id="b", start="2024-01-01", end="2024-01-02", duration="1d"),
+    ]
+    DependencyGraph(gantt).resolve()
+    assert dates(gantt)["b"] == ("2024-01-03", "2024-01-04")
+
+
+def test_propagate_only_touches_downstream_tasks():
+    gantt = make_gantt()
+    graph = follow(gantt)
+    graph.resolve()
+    changed = []
+    gantt.add_listener(lambda gantt, change: changed.append(change[1].id) if change[0] == "task" else None)
+    a = gantt.sections[0].tasks[0]
+    a.duration = "4d"
+    a.end = "2024-01-05"
+    changed.clear()
+    graph.propagate(a)
+    assert set(changed) == {"b", "c", "d"}
+    assert dates(gantt)["c"] == ("2024-01-10", "2024-01-11")
+    assert dates(gantt)["e"] == ("2024-01-02", "2024-01-03")
+
+
+def test_propagate_keeps_the_dates_of_tasks_which_do_not_move():
+    gantt = Gantt(id="g")
+    # ends on a saturday, without a duration
+    gantt.add_section("s").tasks = [Task("A", id="a", start="2024-02-01", end="2024-02-03")]
+    follow(gantt).propagate(gantt.sections[0].tasks[0])
+    assert dates(gantt)["a"] == ("2024-02-01", "2024-02-03")
+
+
+def test_follow_keeps_the_graph_until_the_structure_changes():
+    gantt = make_gantt()
+    graph = follow(gantt)
+    gantt.sections[0].tasks[0].duration = "5d"
+    assert follow(gantt) is graph
+    assert "a" in graph.stale
+    gantt.sections[1].tasks[2].after = ["c"]
+    assert follow(gantt) is not graph
+    graph = follow(gantt)
+    gantt.sections[1].add_task("F")
+    assert follow(gantt) is not graph
+
+
+def test_critical_path():
+    gantt = make_gantt()
+    graph = follow(gantt)
+    graph.resolve()
+    assert graph.mark_critical() == ["a", "b", "c"]
+    assert [task.critical for section in gantt.sections for task in section.tasks] == [True, True, True, False, False]
+    # d becomes the longer branch, the re-read dates are used without building the graph again
+    gantt.sections[1].tasks[1].duration = "9d"
+    assert follow(gantt).mark_critical() == ["a", "d"]
+    assert gantt.sections[0].tasks[1].critical is False
+
+
+def test_cycle():
+    gantt = make_gantt()
+    gantt.sections[0].tasks[0].after = ["c"]
+    with pytest.raises(DependencyCycleError) as e:
+        follow(gantt)
+    assert {"a", "b", "c"} <= set(e.value.task_ids)
+    # breaking the cycle makes the graph usable again
+    gantt.sections[0].tasks[0].after = []
+    assert follow(gantt).critical_path()
+
+
+def test_references_to_unknown_tasks_are_ignored():
+    gantt = Gantt(id="g")
+    gantt.add_section("s").tasks = [Task("A", id="a", start="2024-01-01", end="2024-01-02", duration="1d", after=["x"])]
+    graph = DependencyGraph(gantt)
+    assert graph.missing == {"x"}
+    assert graph.resolve() == 0
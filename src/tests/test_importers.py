@@ -0,0 +1,125 @@
+import io
+
+import pytest
+
+from gantt import codec
+from gantt.codec import GanttFormatError, GanttLimitError
+from gantt.importers import import_csv, import_msproject, load_file
+
+
+def dates(gantt):
+    return {task.id: (task.start, task.end, task.duration) for section in gantt.sections for task in section.tasks}
+
+
+def csv_file(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_csv_with_dependencies():
+    gantt = import_csv(csv_file(
+        "Swimlane;ID;Task Name;Start Date;Duration;Depends on;Milestone\n"
+        "Build;a;Foundation;01.01.2024;2 days;;\n"
+        "Build;b;Walls;2024-01-01;1w;a;\n"
+        "\n"
+        "Move;c;Keys;2024-01-01;;b;yes\n"
+    ))
+    assert [section.title for section in gantt.sections] == ["Build", "Move"]
+    assert [task.title for task in gantt.sections[0].tasks] == ["Foundation", "Walls"]
+    assert dates(gantt) == {
+        "a": ("2024-01-01", "2024-01-03", "2d"),
+        # a week is seven business days, like in the editor
+        "b": ("2024-01-03", "2024-01-12", "1w"),
+        "c": ("2024-01-12", "2024-01-12", "0d"),
+    }
+    assert gantt.sections[1].tasks[0].type == "Milestone"
+
+
+def test_csv_without_dependencies_gets_its_end_dates():
+    gantt = import_csv(csv_file("title,start,duration,status\nA,2024-01-05,1d,Done\nB,2024-01-01,,\n"))
+    a, b = gantt.sections[0].tasks
+    # friday plus one business day
+    assert (a.start, a.end, a.status) == ("2024-01-05", "2024-01-08", "done")
+    assert (b.start, b.end) == ("2024-01-01", "")
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "start,end\n2024-01-01,2024-01-02\n",
+    "title,start\nA,tomorrow\n",
+    "title,duration\nA,5 fortnights\n",
+    "id,title,after\na,A,b\nb,B,a\n",
+])
+def test_broken_csv(text):
+    with pytest.raises(GanttFormatError):
+        import_csv(csv_file(text))
+
+
+def test_csv_limits():
+    text = "title\n" + "task\n" * 10
+    with pytest.raises(GanttLimitError):
+        import_csv(csv_file(text), max_tasks=5)
+    with pytest.raises(GanttLimitError):
+        import_csv(csv_file(text), max_bytes=20)
+
+
+def test_csv_progress():
+    reported = []
+    import_csv(csv_file("title\n" + "task\n" * 2500), progress=lambda tasks, read: reported.append(tasks))
+    assert reported == [1000, 2000]
+
+
+MSP_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Project xmlns="http://schemas.microsoft.com/project">
+  <Title>House</Title>
+  <Tasks>
+    <Task><UID>0</UID><Name>Project</Name><Summary>1</Summary></Task>
+    <Task><UID>1</UID><Name>Build</Name><Summary>1</Summary><OutlineLevel>1</OutlineLevel></Task>
+    <Task>
+      <UID>2</UID><Name>Foundation</Name><OutlineLevel>2</OutlineLevel>
+      <Start>2024-01-01T08:00:00</Start><Finish>2024-01-02T17:00:00</Finish>
+      <Duration>PT16H0M0S</Duration><PercentComplete>100</PercentComplete><Critical>1</Critical>
+      <PredecessorLink><PredecessorUID>1</PredecessorUID></PredecessorLink>
+    </Task>
+    <Task>
+      <UID>3</UID><Name>Walls</Name><OutlineLevel>2</OutlineLevel>
+      <Start>2024-01-03T08:00:00</Start><Finish>2024-01-05T17:00:00</Finish>
+      <Duration>PT24H0M0S</Duration><PercentComplete>50</PercentComplete>
+      <PredecessorLink><PredecessorUID>2</PredecessorUID></PredecessorLink>
+    </Task>
+    <Task>
+      <UID>4</UID><Name>Done</Name><OutlineLevel>2</OutlineLevel><Milestone>1</Milestone>
+      <Start>2024-01-08T08:00:00</Start><Finish>2024-01-08T08:00:00</Finish>
+    </Task>
+  </Tasks>
+  <Resources><Resource><UID>1</UID></Resource></Resources>
+</Project>
+"""
+
+
+def test_msproject():
+    gantt = import_msproject(io.BytesIO(MSP_XML))
+    assert gantt.title == "House"
+    assert [section.title for section in gantt.sections] == ["Build"]
+    foundation, walls, done = gantt.sections[0].tasks
+    # the reference to the summary task is dropped
+    assert not foundation.after
+    assert walls.after == ["task2"]
+    assert (foundation.status, foundation.critical, walls.status) == ("done", True, "active")
+    assert dates(gantt) == {
+        "task2": ("2024-01-01", "2024-01-03", "2d"),
+        "task3": ("2024-01-03", "2024-01-08", "3d"),
+        "task4": ("2024-01-08", "2024-01-08", "0d"),
+    }
+    assert done.type == "Milestone"
+
+
+def test_broken_xml():
+    with pytest.raises(GanttFormatError):
+        import_msproject(io.BytesIO(MSP_XML[:200]))
+
+
+def test_load_file_by_suffix():
+    assert load_file(csv_file("title\nA\n"), "plan.CSV").sections[0].tasks[0].title == "A"
+    assert load_file(io.BytesIO(MSP_XML), "plan.xml").title == "House"
+    saved = codec.dumps(load_file(io.BytesIO(MSP_XML), "plan.xml"))
+    assert codec.encode(load_file(io.BytesIO(saved), "plan.json")) == codec.encode(codec.loads(saved))
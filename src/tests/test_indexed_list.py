@@ -0,0 +1,108 @@
+import copy
+import pickle
+
+import pytest
+
+from gantt.gantt_builder import Section, Task
+from gantt.indexed_list import IndexedList, SectionList, TaskList
+
+
+def make_tasks(count):
+    return TaskList(Task(f"T{i}", id=f"t{i}") for i in range(count))
+
+
+def check_positions(tasks):
+    for position, task in enumerate(tasks):
+        assert tasks.position(task.id) == position
+        assert tasks.index(task) == position
+
+
+def test_position_and_get():
+    tasks = make_tasks(5)
+    check_positions(tasks)
+    assert tasks.get("t3") is tasks[3]
+    assert tasks.get("unknown") is None
+    assert tasks.position("unknown") == -1
+    assert Task("X", id="x") not in tasks
+    with pytest.raises(ValueError):
+        tasks.index(Task("X", id="x"))
+
+
+def test_inserts_and_deletes_in_the_middle():
+    tasks = make_tasks(10)
+    tasks.position("t0")
+    tasks.insert(3, Task("New", id="new"))
+    del tasks[7]
+    tasks.pop(0)
+    tasks.insert(-1, Task("Other", id="other"))
+    check_positions(tasks)
+    assert tasks.position("t0") == -1
+
+
+def test_many_changes_rebuild_the_cache():
+    tasks = make_tasks(100)
+    tasks.position("t0")
+    for i in range(200):
+        tasks.insert(i % 50, Task(f"N{i}", id=f"n{i}"))
+        if i % 3 == 0:
+            tasks.pop(i % 70)
+    check_positions(tasks)
+
+
+def test_insert_after_move_and_remove_keys():
+    tasks = make_tasks(5)
+    tasks.insert_after(tasks[1], [Task("X", id="x"), Task("Y", id="y")])
+    assert [task.id for task in tasks] == ["t0", "t1", "x", "y", "t2", "t3", "t4"]
+    tasks.insert_after(None, [Task("Z", id="z")])
+    assert tasks[-1].id == "z"
+    tasks.move(tasks.get("t0"), 3)
+    assert [task.id for task in tasks] == ["t1", "x", "y", "t0", "t2", "t3", "t4", "z"]
+    removed = tasks.remove_keys({"x", "t3", "unknown"})
+    assert [task.id for task in removed] == ["x", "t3"]
+    assert [task.id for task in tasks] == ["t1", "y", "t0", "t2", "t4", "z"]
+    check_positions(tasks)
+
+
+def test_changes_which_reorder_the_list():
+    tasks = make_tasks(6)
+    tasks.position("t0")
+    tasks.reverse()
+    check_positions(tasks)
+    tasks[1:3] = [Task("S", id="s")]
+    check_positions(tasks)
+    tasks[0] = Task("R", id="r")
+    assert tasks.position("t5") == -1
+    check_positions(tasks)
+    tasks.sort(key=lambda task: task.id)
+    check_positions(tasks)
+
+
+def test_items_replaced_behind_the_back_of_the_cache():
+    tasks = make_tasks(3)
+    tasks.position("t0")
+    # list methods bypass the cache, the next lookup notices the wrong item and rebuilds it
+    list.__setitem__(tasks, 0, Task("Other", id="other"))
+    assert tasks.position("t0") == -1
+    assert tasks.position("other") == 0
+
+
+def test_copies_start_with_an_empty_cache():
+    tasks = make_tasks(3)
+    tasks.position("t0")
+    for copied in (copy.copy(tasks), pickle.loads(pickle.dumps(tasks))):
+        assert type(copied) is TaskList
+        assert [task.id for task in copied] == ["t0", "t1", "t2"]
+        check_positions(copied)
+
+
+def test_sections_are_found_by_identity():
+    sections = SectionList([Section("a"), Section("a")])
+    assert sections.index(sections[1]) == 1
+    assert Section("a") not in sections
+
+
+def test_plain_items_are_their_own_key():
+    items = IndexedList("abc")
+    items.insert(1, "x")
+    assert items.index("b") == 2
+    assert items.index("c", 1) == 3
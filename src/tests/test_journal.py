@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from gantt import codec, journal
+from gantt.gantt_builder import Gantt, Task
+
+
+def make_gantt():
+    gantt = Gantt(id="g", title="Plan")
+    gantt.add_section("one").tasks = [Task("A", id="a", start="2024-01-01", end="2024-01-03", duration="2d")]
+    gantt.add_section("two").tasks = [Task("B", id="b", start="2024-01-03", end="2024-01-04", after=["a"])]
+    return gantt
+
+
+def recorded(gantt, edit):
+    '''The journal records of the changes made by edit, as they are stored.'''
+    records = []
+    gantt.add_listener(lambda gantt, change: records.append(journal.encode(gantt, change)))
+    edit(gantt)
+    return [json.loads(json.dumps(record)) for record in records if record is not None]
+
+
+def edit(gantt):
+    one, two = gantt.sections
+    a = one.tasks[0]
+    gantt.title = "Renamed plan"
+    one.title = "first"
+    a.duration = "5d"
+    a.end = "2024-01-08"
+    c = one.add_task("C", a)
+    c.start = "2024-01-08"
+    c.add_after(a)
+    three = gantt.add_section("three")
+    three.add_task("D")
+    two.remove_task(two.tasks[0])
+    gantt.remove_section(two)
+    one.tasks = list(reversed(one.tasks))
+    gantt.announce_bulk()
+
+
+def test_replay_gives_the_edited_gantt():
+    original = codec.dumps(make_gantt())
+    gantt = codec.loads(original)
+    records = recorded(gantt, edit)
+    assert ["bulk"] not in records
+    copy = codec.loads(original)
+    journal.replay(copy, records)
+    assert codec.encode(copy) == codec.encode(gantt)
+    assert copy.get_mermaid_str() == gantt.get_mermaid_str()
+
+
+def test_replay_of_replaced_sections():
+    gantt = make_gantt()
+    original = codec.dumps(gantt)
+    records = recorded(gantt, lambda gantt: setattr(gantt, "sections", gantt.sections[1:]))
+    copy = codec.loads(original)
+    journal.replay(copy, records)
+    assert codec.encode(copy) == codec.encode(gantt)
+    # the tasks of the new sections are found by later records
+    journal.replay(copy, [["task", "b", "title", "moved"]])
+    assert copy.sections[0].tasks[0].title == "moved"
+
+
+def test_repeated_changes_share_a_key():
+    assert journal.key(["task", "a", "title", "x"]) == journal.key(["task", "a", "title", "y"])
+    assert journal.key(["task", "a", "title", "x"]) != journal.key(["task", "a", "end", "x"])
+    assert journal.key(["remove_task", "a"]) is None
+
+
+@pytest.mark.parametrize("record", [
+    ["section", 7, "title", "x"],
+    ["add_task", 9, 0, {"id": "x", "title": "x"}],
+    ["remove_section", 5],
+    ["nonsense"],
+])
+def test_records_which_do_not_fit(record):
+    with pytest.raises(codec.GanttFormatError):
+        journal.replay(make_gantt(), [record])
@@ -0,0 +1,97 @@
+import pytest
+
+from gantt.dependencies import DependencyCycleError
+from gantt.gantt_builder import Gantt, Task
+from gantt.levelling import Leveller, level, level_days
+
+
+def test_level_days_resolves_capacity_conflicts():
+    # three tasks of one lane which could all start on day 0, the longest chain first
+    starts = level_days(lengths=[2, 3, 1], releases=[0, 0, 0], predecessors=[(), (), ()], lanes=[0, 0, 0],
+                        capacities=[1], ranks=[1, 0, 2])
+    assert starts == [3, 0, 5]
+
+
+def test_level_days_with_two_lanes_and_a_dependency():
+    # task 2 in lane 1 waits for task 0 in lane 0, the lanes do not block each other
+    starts = level_days(lengths=[2, 2, 1], releases=[0, 0, 0], predecessors=[(), (), (0,)], lanes=[0, 0, 1],
+                        capacities=[1, 1], ranks=[0, 1, 2])
+    assert starts == [0, 2, 2]
+
+
+def test_level_days_without_limit():
+    starts = level_days(lengths=[2, 3], releases=[0, 1], predecessors=[(), ()], lanes=[0, 0],
+                        capacities=[None], ranks=[0, 1])
+    assert starts == [0, 1]
+
+
+def test_milestones_take_no_capacity():
+    starts = level_days(lengths=[2, 0, 1], releases=[0, 0, 0], predecessors=[(), (), (1,)], lanes=[0, 0, 0],
+                        capacities=[1], ranks=[0, 1, 2])
+    assert starts == [0, 0, 2]
+
+
+def make_gantt():
+    gantt = Gantt(id="g")
+    # both tasks of a start on monday 2024-01-01, b2 depends on a1
+    gantt.add_section("a").tasks = [
+        Task("A1", id="a1", start="2024-01-01", end="2024-01-03", duration="2d"),
+        Task("A2", id="a2", start="2024-01-01", end="2024-01-04", duration="3d"),
+    ]
+    gantt.add_section("b").tasks = [
+        Task("B1", id="b1", start="2024-01-01", end="2024-01-02", duration="1d"),
+        Task("B2", id="b2", start="2024-01-01", end="2024-01-02", duration="1d", after=["a1"]),
+    ]
+    return gantt
+
+
+def dates(gantt):
+    return {task.id: (task.start, task.end) for section in gantt.sections for task in section.tasks}
+
+
+def test_level_one_task_per_swimlane():
+    gantt = make_gantt()
+    assert level(gantt, 1) > 0
+    assert dates(gantt) == {
+        # a1 with b2 after it has as much remaining work as a2, ties keep the order of the plan
+        "a1": ("2024-01-01", "2024-01-03"),
+        "a2": ("2024-01-03", "2024-01-08"),
+        "b1": ("2024-01-01", "2024-01-02"),
+        "b2": ("2024-01-03", "2024-01-04"),
+    }
+    # a levelled plan stays as it is
+    assert level(gantt, 1) == 0
+
+
+def test_level_dependencies_only():
+    gantt = make_gantt()
+    level(gantt, None)
+    assert dates(gantt)["a1"] == ("2024-01-01", "2024-01-03")
+    assert dates(gantt)["a2"] == ("2024-01-01", "2024-01-04")
+    assert dates(gantt)["b2"] == ("2024-01-03", "2024-01-04")
+
+
+def test_capacity_per_swimlane():
+    gantt = make_gantt()
+    level(gantt, {"a": 2, "b": 1})
+    assert dates(gantt)["a1"][0] == dates(gantt)["a2"][0] == "2024-01-01"
+    with pytest.raises(ValueError):
+        Leveller(gantt, {"a": 0}).plan()
+
+
+def test_level_after_an_edit():
+    gantt = make_gantt()
+    level(gantt, 1)
+    # the graph kept with the gantt reads the new duration, the tasks after a1 move along
+    gantt.sections[0].tasks[0].duration = "4d"
+    level(gantt, 1)
+    assert dates(gantt)["a1"] == ("2024-01-01", "2024-01-05")
+    assert dates(gantt)["a2"] == ("2024-01-05", "2024-01-10")
+    assert dates(gantt)["b2"] == ("2024-01-05", "2024-01-08")
+
+
+def test_cycle():
+    gantt = make_gantt()
+    gantt.sections[0].tasks[0].after = ["b2"]
+    with pytest.raises(DependencyCycleError):
+        level(gantt, 1)
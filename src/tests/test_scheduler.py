@@ -0,0 +1,123 @@
+import numpy as np
+
+from gantt.gantt_builder import Gantt, Task
+from gantt.scheduler import parse_duration, schedule, schedule_section, schedule_tasks
+
+
+def make_section(*tasks):
+    gantt = Gantt(id="g")
+    section = gantt.add_section("s")
+    section.tasks = [Task(id=str(i), title=str(i), **fields) for i, fields in enumerate(tasks)]
+    return gantt, section
+
+
+def dates(section):
+    return [(task.start, task.end) for task in section.tasks]
+
+
+def test_parse_duration():
+    assert parse_duration("3d") == 3
+    assert parse_duration("2 w") == 14
+    assert parse_duration("1m") == 30
+    assert parse_duration("") == -1
+    assert parse_duration("3x") == -1
+
+
+def test_chained_tasks_move_with_their_predecessor():
+    gantt, section = make_section(
+        dict(start="2024-01-01", end="2024-01-03", duration="5d"),
+        dict(start="2024-01-03", end="2024-01-04", duration="1d"),
+        # not chained, starts later than the end of its predecessor
+        dict(start="2024-01-10", end="2024-01-11", duration="1d"),
+    )
+    assert schedule_section(section) == 2
+    assert dates(section) == [
+        ("2024-01-01", "2024-01-08"),
+        ("2024-01-08", "2024-01-09"),
+        ("2024-01-10", "2024-01-11"),
+    ]
+
+
+def test_without_chain_only_ends_change():
+    gantt, section = make_section(
+        dict(start="2024-01-01", end="2024-01-03", duration="5d"),
+        dict(start="2024-01-03", end="2024-01-04", duration="1d"),
+    )
+    schedule_section(section, chain=False)
+    assert dates(section) == [("2024-01-01", "2024-01-08"), ("2024-01-03", "2024-01-04")]
+
+
+def test_task_without_duration_keeps_its_end():
+    gantt, section = make_section(
+        dict(start="2024-01-01", end="2024-01-03", duration="5d"),
+        dict(start="2024-01-03", end="2024-01-05", duration=""),
+        dict(start="2024-01-05", end="2024-01-08", duration="1d"),
+    )
+    schedule_section(section)
+    assert dates(section) == [
+        ("2024-01-01", "2024-01-08"),
+        ("2024-01-08", "2024-01-05"),
+        ("2024-01-05", "2024-01-08"),
+    ]
+
+
+def test_gap_in_a_chain():
+    # the predecessor of the second task has no start, its end stays and the run starts again after it
+    gantt, section = make_section(
+        dict(start="", end="2024-01-11", duration="2d"),
+        dict(start="2024-01-11", end="2024-01-10", duration="0d"),
+        dict(start="2024-01-10", end="2024-01-12", duration="2d"),
+    )
+    schedule_section(section)
+    assert dates(section) == [
+        ("", "2024-01-11"),
+        ("2024-01-11", "2024-01-11"),
+        ("2024-01-11", "2024-01-15"),
+    ]
+
+
+def test_sections_are_scheduled_separately():
+    gantt = Gantt(id="g")
+    for title in ("a", "b"):
+        gantt.add_section(title).tasks = [
+            Task(id=title + "1", title="1", start="2024-01-01", end="2024-01-02", duration="3d"),
+            Task(id=title + "2", title="2", start="2024-01-02", end="2024-01-03", duration="1d"),
+        ]
+    schedule(gantt)
+    for section in gantt.sections:
+        assert dates(section) == [("2024-01-01", "2024-01-04"), ("2024-01-04", "2024-01-05")]
+
+
+def test_same_result_as_a_task_by_task_loop():
+    rnd = np.random.default_rng(7)
+    days = [str(np.datetime64("2024-01-01") + k) for k in range(20)] + [""]
+    for _ in range(200):
+        n = int(rnd.integers(1, 12))
+        tasks = []
+        for i in range(n):
+            start = tasks[-1].end if i and rnd.random() < 0.6 else str(rnd.choice(days))
+            tasks.append(Task(id=str(i), title="t", start=start, end=str(rnd.choice(days)),
+                              duration=str(rnd.choice(["1d", "3d", "", "1w", "0d"]))))
+        first = np.zeros(n, dtype=bool)
+        first[0] = True
+        expected = task_by_task(tasks, first)
+        schedule_tasks(tasks, first)
+        assert [(task.start, task.end) for task in tasks] == expected
+
+
+def task_by_task(tasks, first):
+    '''A task starting at the end of its predecessor moves to its new end, the way the editor scheduled.'''
+    result = []
+    old_end = new_end = None
+    for i, task in enumerate(tasks):
+        start = task.start
+        if i and not first[i] and start and start == old_end:
+            start = new_end
+        old_end = task.end
+        days = parse_duration(task.duration)
+        if days >= 0 and start:
+            new_end = str(np.busday_offset(np.datetime64(start, "D"), days, roll="forward"))
+        else:
+            new_end = task.end
+        result.append((start, new_end))
+    return result
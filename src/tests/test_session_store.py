@@ -0,0 +1,136 @@
+import json
+import sqlite3
+
+import pytest
+
+from gantt import codec
+from gantt.backends import FileBackend, SqliteBackend
+from gantt.gantt_builder import Gantt
+from gantt.session_store import SessionStore
+
+
+def make_gantt(id="g"):
+    gantt = Gantt(id=id)
+    for title in ("a", "b", "c"):
+        gantt.add_section(title).add_task(title + "1")
+    return gantt
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def journal_length(path):
+    return sqlite3.connect(path).execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+
+def test_changes_are_appended_to_the_journal(path):
+    store = SessionStore(SqliteBackend(path))
+    gantt = make_gantt()
+    store["g"] = gantt
+    for i in range(5):
+        # only the last value of a field is written
+        gantt.sections[0].tasks[0].title = f"t{i}"
+        gantt.sections[0].tasks[0].title = f"t{i}!"
+        store.flush()
+    assert journal_length(path) == 5
+    loaded = SessionStore(SqliteBackend(path))["g"]
+    assert codec.encode(loaded) == codec.encode(gantt)
+
+
+def test_snapshot_after_snapshot_records(path):
+    store = SessionStore(SqliteBackend(path), snapshot_records=3)
+    gantt = make_gantt()
+    store["g"] = gantt
+    for i in range(4):
+        gantt.title = f"title {i}"
+        store.flush()
+    assert journal_length(path) == 0
+    assert SessionStore(SqliteBackend(path))["g"].title == "title 3"
+
+
+def test_conflicting_writes_keep_the_journal_consistent(path):
+    first = SessionStore(SqliteBackend(path))
+    second = SessionStore(SqliteBackend(path))
+    first["g"] = make_gantt()
+    a = first["g"]
+    b = second["g"]
+    a.remove_section(a.sections[0])
+    b.sections[1].title = "renamed"
+    first.flush()
+    # the records of second were made for the version before the removal, a snapshot is written instead
+    second.flush()
+    loaded = SessionStore(SqliteBackend(path))["g"]
+    assert [section.title for section in loaded.sections] == ["a", "renamed", "c"]
+
+
+def test_broken_journal_falls_back_to_the_snapshot(path):
+    store = SessionStore(SqliteBackend(path))
+    store["g"] = make_gantt()
+    db = sqlite3.connect(path)
+    db.execute("INSERT INTO journal (id, record) VALUES ('g', ?)", (json.dumps(["section", 7, "title", "x"]),))
+    db.commit()
+    loaded = SessionStore(SqliteBackend(path))["g"]
+    assert [section.title for section in loaded.sections] == ["a", "b", "c"]
+    assert journal_length(path) == 0
+
+
+def test_newer_versions_are_loaded_into_the_open_gantt(path):
+    first = SessionStore(SqliteBackend(path))
+    second = SessionStore(SqliteBackend(path))
+    first["g"] = make_gantt()
+    page = first["g"]
+    changes = []
+    page.add_listener(lambda gantt, change: changes.append(change))
+    second["g"].sections[0].add_task("from second")
+    second.flush()
+    assert first["g"] is page
+    assert [task.title for task in page.sections[0].tasks] == ["a1", "from second"]
+    assert changes
+    # the reloaded gantt is still journaled
+    page.sections[0].add_task("from first")
+    first.flush()
+    loaded = SessionStore(SqliteBackend(path))["g"]
+    assert [task.title for task in loaded.sections[0].tasks] == ["a1", "from second", "from first"]
+
+
+def test_eviction_keeps_the_changes(path):
+    store = SessionStore(SqliteBackend(path), idle_seconds=0)
+    gantt = make_gantt()
+    store["g"] = gantt
+    gantt.title = "changed"
+    del gantt
+    store.evict()
+    assert store.session_size("g") == 0
+    assert store["g"].title == "changed"
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def backends(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteBackend(str(tmp_path / "s.db")), SqliteBackend(str(tmp_path / "s.db"))
+    return FileBackend(str(tmp_path / "files")), FileBackend(str(tmp_path / "files"))
+
+
+def test_share_tokens(backends):
+    first, second = SessionStore(backends[0]), SessionStore(backends[1])
+    first["abc-1"] = make_gantt("abc-1")
+    token = first.share_token("abc-1")
+    assert "abc" not in token
+    assert second.share_token("abc-1") == token
+    assert second.shared_id(token) == "abc-1"
+    assert second.shared_id("unknown") is None
+    del first["abc-1"]
+    assert first.shared_id(token) is None
+
+
+def test_browser_assignment(backends):
+    first, second = backends
+    assert first.assigned("browser-1") is None
+    assert first.assign("browser-1", "g-1", replace=False) == "g-1"
+    # another worker building the first page at the same time gets the same gantt
+    assert second.assign("browser-1", "g-2", replace=False) == "g-1"
+    # joining another gantt replaces it
+    assert second.assign("browser-1", "g-3") == "g-3"
+    assert first.assigned("browser-1") == "g-3"
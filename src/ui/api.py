@@ -0,0 +1,271 @@
+"""
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+"""
+
+from datetime import date
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from gantt import codec
+from gantt.gantt_builder import Gantt, Task
+from gantt.session_store import SessionStore
+from gantt.viewport import SPLIT_NONE, Viewport, partition
+
+JSON = "application/json"
+
+
+def upsert_tasks(gantt: Gantt, items: list, max_tasks: int = codec.MAX_TASKS) -> dict:
+    """
+    Updates the tasks with a known id and appends the others to the swimlane named in "section"
+    (created if needed, the last swimlane otherwise). A task of an update which names another
+    swimlane is moved to its end.
+    """
+    index = {}
+    sections = {}
+    for section in gantt.sections:
+        sections.setdefault(section.title, section)
+        for task in section.tasks:
+            index[task.id] = (section, task)
+    # everything is checked before the first change, a broken item leaves the gantt as it was
+    parsed = []
+    for item in items:
+        # the same checks as for a saved gantt
+        fields = codec.task_fields(item)
+        task_id = codec.task_id(item)
+        title = item.get("section")
+        if title is not None and not isinstance(title, str):
+            raise codec.GanttFormatError("section must be a string")
+        if task_id not in index and "title" not in fields:
+            raise codec.GanttFormatError("New task without title")
+        parsed.append((task_id, title, fields))
+    # the same new id may appear more than once, tasks without id are always new
+    new_ids = {task_id for task_id, _, _ in parsed if task_id not in index}
+    new = len(new_ids - {None}) + sum(1 for task_id, _, _ in parsed if task_id is None)
+    if max_tasks is not None and len(index) + new > max_tasks:
+        raise codec.GanttLimitError(f"More than {max_tasks} tasks")
+
+    # tasks to append and to take out per section, applied at the end with one change per section
+    appended = {}
+    taken = {}
+    created, updated = [], []
+    for task_id, title, fields in parsed:
+        target = None
+        if title is not None:
+            target = sections.get(title)
+            if target is None:
+                target = sections[title] = gantt.add_section(title)
+        found = index.get(task_id)
+        if found is not None:
+            section, task = found
+            for field, value in fields.items():
+                setattr(task, field, value)
+            if target is not None and target is not section:
+                if task.id in appended.get(id(section), (None, {}))[1]:
+                    del appended[id(section)][1][task.id]
+                else:
+                    taken.setdefault(id(section), (section, set()))[1].add(task.id)
+                appended.setdefault(id(target), (target, {}))[1][task.id] = task
+                index[task.id] = (target, task)
+            updated.append(task.id)
+            continue
+        if target is None:
+            target = gantt.sections[-1] if gantt.sections else gantt.add_section("")
+            sections.setdefault(target.title, target)
+        task = Task(id=task_id, **fields)
+        appended.setdefault(id(target), (target, {}))[1][task.id] = task
+        index[task.id] = (target, task)
+        created.append(task.id)
+    for section, ids in taken.values():
+        section.tasks = [task for task in section.tasks if task.id not in ids]
+    for section, tasks in appended.values():
+        if tasks:
+            section.tasks = section.tasks + list(tasks.values())
+    if taken:
+        # moving tasks may have left empty swimlanes behind, the editor removes those as well
+        gantt.sections = [section for section in gantt.sections if section.tasks]
+    return {"created": created, "updated": updated}
+
+
+def propagate_changes(gantt: Gantt, changes: dict) -> dict:
+    """Moves the tasks depending on the changed ones, like the editor does after an edit."""
+    # numpy is only loaded with the first dependency, like the scheduler
+    from gantt.dependencies import DependencyCycleError, follow
+
+    ids = set(changes["created"]) | set(changes["updated"])
+    tasks = [
+        task for section in gantt.sections for task in section.tasks if task.id in ids
+    ]
+    try:
+        changes["moved"] = follow(gantt).propagate(*tasks)
+    except DependencyCycleError as e:
+        # the tasks are stored as sent, the dates follow once the cycle is broken
+        changes["moved"] = 0
+        changes["cycle"] = e.task_ids
+    return changes
+
+
+def delete_tasks(gantt: Gantt, ids: list) -> list:
+    """Removes the tasks, the references to them and swimlanes left empty. Returns the removed ids."""
+    ids = set(ids)
+    removed = []
+    sections = []
+    for section in gantt.sections:
+        tasks = []
+        for task in section.tasks:
+            (removed if task.id in ids else tasks).append(task)
+        if len(tasks) != len(section.tasks):
+            section.tasks = tasks
+        if tasks:
+            sections.append(section)
+    if removed:
+        gone = {task.id for task in removed}
+        for section in sections:
+            for task in section.tasks:
+                for field in codec.REFERENCE_FIELDS:
+                    refs = getattr(task, field)
+                    if any(codec.ref_id(ref) in gone for ref in refs):
+                        setattr(
+                            task,
+                            field,
+                            [r for r in refs if codec.ref_id(r) not in gone],
+                        )
+        gantt.sections = sections
+    return [task.id for task in removed]
+
+
+def create_router(sessions: SessionStore, max_bytes: int, max_tasks: int) -> APIRouter:
+    router = APIRouter(prefix="/api/gantts", tags=["gantts"])
+
+    def get_gantt(id: str) -> Gantt:
+        try:
+            return sessions[id]
+        except KeyError:
+            raise HTTPException(404, f"No gantt {id}")
+
+    async def read_json(request: Request):
+        data = await request.body()
+        try:
+            if max_bytes is not None and len(data) > max_bytes:
+                raise codec.GanttLimitError(f"Request larger than {max_bytes} bytes")
+            return codec.loads_json(data)
+        except codec.GanttLimitError as e:
+            raise HTTPException(413, str(e))
+        except codec.GanttFormatError as e:
+            raise HTTPException(400, str(e))
+
+    def result(doc) -> Response:
+        return Response(codec.dumps_json(doc), media_type=JSON)
+
+    # all handlers are coroutines, the session store is only used from the event loop
+    @router.get("/{id}")
+    async def read(id: str) -> Response:
+        return Response(codec.dumps(get_gantt(id)), media_type=JSON)
+
+    @router.put("/{id}")
+    async def replace(id: str, request: Request) -> Response:
+        doc = await read_json(request)
+        try:
+            new_gantt = codec.decode(doc, max_tasks)
+        except codec.GanttLimitError as e:
+            raise HTTPException(413, str(e))
+        except codec.GanttFormatError as e:
+            raise HTTPException(400, str(e))
+        if id in sessions:
+            # replaced in place, open editors keep working on the same object
+            sessions[id].replace_content(new_gantt)
+            return result({"id": id, "created": False})
+        new_gantt.id = id
+        sessions[id] = new_gantt
+        return Response(
+            codec.dumps_json({"id": id, "created": True}), 201, media_type=JSON
+        )
+
+    @router.post("/{id}/tasks")
+    async def upsert(id: str, request: Request) -> Response:
+        """Body: {"tasks": [{"id": ..., "section": ..., "title": ..., ...}, ...]}"""
+        gantt = get_gantt(id)
+        doc = await read_json(request)
+        items = doc.get("tasks") if isinstance(doc, dict) else None
+        if not isinstance(items, list):
+            raise HTTPException(400, 'Expected {"tasks": [...]}')
+        try:
+            changes = upsert_tasks(gantt, items, max_tasks)
+        except codec.GanttLimitError as e:
+            raise HTTPException(413, str(e))
+        except codec.GanttFormatError as e:
+            raise HTTPException(400, str(e))
+        return result(propagate_changes(gantt, changes))
+
+    @router.post("/{id}/tasks/delete")
+    async def delete(id: str, request: Request) -> Response:
+        """Body: {"ids": [...]}, a POST as DELETE requests with a body are not forwarded by every proxy."""
+        gantt = get_gantt(id)
+        doc = await read_json(request)
+        ids = doc.get("ids") if isinstance(doc, dict) else None
+        if not isinstance(ids, list):
+            raise HTTPException(400, 'Expected {"ids": [...]}')
+        return result({"deleted": delete_tasks(gantt, ids)})
+
+    @router.post("/{id}/level")
+    async def level_resources(id: str, capacity: int = 1) -> Response:
+        """Moves the tasks to a levelled schedule, ?capacity=0 puts no limit on the swimlanes."""
+        # numpy is only loaded with the first levelling, like the scheduler
+        from gantt.levelling import level
+
+        gantt = get_gantt(id)
+        try:
+            changed = level(gantt, capacity if capacity > 0 else None)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        return result({"changed": changed})
+
+    @router.post("/{id}/critical")
+    async def critical_path(id: str) -> Response:
+        """Sets critical for the tasks without slack and clears it for the others."""
+        from gantt.dependencies import DependencyCycleError, follow
+
+        gantt = get_gantt(id)
+        try:
+            critical = follow(gantt).mark_critical()
+        except DependencyCycleError as e:
+            raise HTTPException(400, str(e))
+        return result({"critical": critical})
+
+    @router.get("/{id}/mermaid")
+    async def mermaid(
+        id: str,
+        request: Request,
+        config: bool = True,
+        start: str = None,
+        end: str = None,
+    ) -> Response:
+        """?start=2024-01-01&end=2024-03-31 leaves out the tasks outside of the window."""
+        gantt = get_gantt(id)
+        window = None
+        if start or end:
+            try:
+                window = Viewport(date.fromisoformat(start), date.fromisoformat(end))
+            except (TypeError, ValueError):
+                raise HTTPException(400, "start and end must both be dates")
+        # the hash comes from the cached mermaid text, an unchanged chart is not generated again
+        etag = f'"{gantt.content_hash()}{"" if config else "-plain"}{f"-{start}-{end}" if window else ""}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        chart = gantt if window is None else partition(gantt, SPLIT_NONE, window)[0]
+        text = chart.get_mermaid_document() if config else chart.get_mermaid_str()
+        return Response(text, media_type="text/plain; charset=utf-8", headers=headers)
+
+    return router
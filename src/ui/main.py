@@ -15,19 +15,83 @@ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 GNU General Public License for more details.
 """
 
-import json
+import time
+
+# taken before the other imports, so the startup time includes them
+STARTED = time.perf_counter()
+
+import asyncio
+import os
 import re
+import sys
 import uuid
+import weakref
 from datetime import date, datetime
 
-import numpy as np
-from gantt.gantt_builder import Gantt, Section, Task, gantt_decoder, gantt_encoder
-from nicegui import app, context, events, ui
+from gantt import codec
+from gantt.gantt_builder import MERMAID_CONFIG, Gantt, Section, Task
+from gantt.backends import open_backend
+from gantt.metrics import BYTES_BUCKETS, COUNT_BUCKETS, REGISTRY, profiled
+from gantt.session_store import SessionStore
+from gantt.svg_renderer import render_svg
+from gantt.viewport import (
+    MAX_PART_TASKS,
+    SPLIT_AUTO,
+    SPLIT_NONE,
+    SPLITS,
+    ZOOMS,
+    Viewport,
+    dated_rows,
+    partition,
+    plan_range,
+)
+from fastapi import Request
+from fastapi.responses import PlainTextResponse, Response
+from nicegui import Client, app, background_tasks, context, events, run, ui
+from nicegui import binding
+from nicegui.binding import BindableProperty
+from ui.api import create_router
+from ui.model_binding import ModelBindings
+from ui.share import create_share_router
+from ui.task_grid import TaskGrid
+
+RENDER_SECONDS = REGISTRY.histogram(
+    "gantt_render_seconds", "Time to generate the chart", labels=("renderer",)
+)
+PAGE_BUILD_SECONDS = REGISTRY.histogram(
+    "gantt_page_build_seconds", "Time to build the editor page"
+)
+CLIENT_ELEMENTS = REGISTRY.histogram(
+    "gantt_client_elements", "Elements of a client after the page build", COUNT_BUCKETS
+)
+UPLOAD_BYTES = REGISTRY.histogram(
+    "gantt_upload_bytes", "Size of uploaded gantts", BYTES_BUCKETS
+)
+UPLOAD_ERRORS = REGISTRY.counter(
+    "gantt_upload_errors_total", "Uploads rejected as invalid or too large"
+)
+DOWNLOAD_BYTES = REGISTRY.histogram(
+    "gantt_download_bytes", "Size of downloaded gantts", BYTES_BUCKETS
+)
 
 
 class GanttEditor:
     CHART_LABEL = "Timeline"
     DATA_LABEL = "Data"
+    MERMAID_RENDERER = "Mermaid"
+    SVG_RENDERER = "SVG"
+    # above this number of tasks the data tab uses the virtualized grid
+    GRID_THRESHOLD = 200
+    # changes of other clients are collected for this many seconds before the diagram is redrawn
+    DIAGRAM_DELAY = 0.5
+    # zoom level without a date window
+    ALL_DATES = "All"
+
+    # page settings bound to elements, pushed on change instead of being polled
+    renderer = BindableProperty()
+    zoom = BindableProperty()
+    window_start = BindableProperty()
+    split = BindableProperty()
 
     gantt = Gantt()
     # active_section = gantt.add_section("Swimlane")
@@ -36,61 +100,143 @@ class GanttEditor:
 
     def __init__(self):
         self.gantt = None
-        self.config = """
----
-config:
-    theme: base
-    themeVariables: 
-      sectionBkgColor: "{section0bgcolor}"
-      altSectionBkgColor: "{odd_sectionbgcolor}"
-      sectionBkgColor2: "{even_sectionbgcolor}"
-      taskBkgColor: "{taskbgcolor}"
-    gantt:
-        barGap: 10
-        barHeight: 40
-        fontSize: 20
-        sectionFontSize: 20
-        leftPadding: 200
-        topPadding: 75
-        gridLineStartPadding: 50
----
-"""
+        # the gantt whose changes this editor follows, until its page is closed
+        self.listening = None
+        # large charts are better rendered on the server, mermaid lays out the whole chart in the browser
+        self.renderer = self.MERMAID_RENDERER
+        self.grid = None
+        self.config = MERMAID_CONFIG
+        self.client = None
+        # the elements bound to the gantt, its sections and tasks
+        self.bindings = ModelBindings()
+        # the rows of the tasks by task id
+        self.rows = {}
+        self.data_container = None
+        self.tab_panels = None
+        self.rebuild_pending = False
+        self.diagram_pending = False
+        # the date window and the splitting of the chart belong to the page, not to the gantt
+        self.zoom = self.ALL_DATES
+        self.window_start = ""
+        self.split = SPLIT_AUTO
+        # (title label, chart element) per part of a split chart
+        self.part_views = []
+        self.part_renderer = None
 
     def update_gantt(self, gantt: Gantt) -> None:
-        config = self.config.format(
-            section0bgcolor=gantt.section0bgcolor,
-            odd_sectionbgcolor=gantt.odd_sectionbgcolor,
-            even_sectionbgcolor=gantt.even_sectionbgcolor,
-            taskbgcolor=gantt.taskbgcolor,
-        )
-        print(config + gantt.get_mermaid_str())
-        self.mermaid.set_content(config + gantt.get_mermaid_str())
-        self.mermaid.update()
-
-    def add_days_date_as_str(self, date_str: str, days: int) -> str:
-        d = date.fromisoformat(date_str)
-        result = np.busday_offset(d, days, roll="forward")
-        return str(result.astype("datetime64[D]"))
-
-    def calc_end_date(self, active_task: Task) -> None:
-        d = date.fromisoformat(active_task.start)
+        use_svg = self.renderer == self.SVG_RENDERER
+        with RENDER_SECONDS.time(renderer=self.renderer), profiled("render"):
+            if self.is_whole_chart(gantt):
+                # the common case comes straight from the cached mermaid text
+                self.parts_area.set_visibility(False)
+                self.mermaid.set_visibility(not use_svg)
+                self.svg.set_visibility(use_svg)
+                if use_svg:
+                    self.svg.set_content(render_svg(gantt))
+                    return
+
+                # short task ids, the browser gets and parses a lot less text
+                self.mermaid.set_content(
+                    gantt.get_mermaid_document(self.config, compact=True)
+                )
+                self.mermaid.update()
+                return
+
+            self.mermaid.set_visibility(False)
+            self.svg.set_visibility(False)
+            self.parts_area.set_visibility(True)
+            self.show_parts(gantt, partition(gantt, self.split, self.viewport(gantt)))
+
+    def is_whole_chart(self, gantt: Gantt) -> bool:
+        if self.zoom in ZOOMS:
+            return False
+        if self.split == SPLIT_AUTO:
+            return (
+                sum(len(section.tasks) for section in gantt.sections) <= MAX_PART_TASKS
+            )
+        return self.split == SPLIT_NONE
+
+    def viewport(self, gantt: Gantt) -> Viewport:
+        if self.zoom not in ZOOMS:
+            return None
+        try:
+            start = date.fromisoformat(self.window_start)
+        except ValueError:
+            # the window starts with the plan until a date is picked
+            dates = plan_range(dated_rows(gantt.sections))
+            start = dates[0] if dates else date.today()
+        return Viewport.zoomed(start, self.zoom)
+
+    def shift_window(self, steps: int) -> None:
+        window = self.viewport(self.gantt)
+        if window is not None:
+            # the input calls update_gantt with its change
+            self.window_input.value = str(window.shifted(steps).start)
+
+    def show_parts(self, gantt: Gantt, parts: list) -> None:
+        # every part is a diagram of its own, mermaid lays them out one by one
+        use_svg = self.renderer == self.SVG_RENDERER
+        if len(self.part_views) != len(parts) or self.part_renderer != self.renderer:
+            self.parts_area.clear()
+            self.part_views = []
+            self.part_renderer = self.renderer
+            with self.parts_area:
+                for _ in parts:
+                    label = ui.label("").classes("text-h6")
+                    if use_svg:
+                        view = ui.html("").classes("w-full overflow-auto")
+                    else:
+                        view = ui.mermaid("").classes("w-full")
+                    self.part_views.append((label, view))
+        for (label, view), part in zip(self.part_views, parts):
+            label.set_text(part.title if len(parts) > 1 else "")
+            if use_svg:
+                view.set_content(render_svg(gantt, part))
+            else:
+                view.set_content(part.get_mermaid_document(self.config, compact=True))
+
+    def calc_end_date(self, active_section: Section, active_task: Task) -> None:
         if active_task.duration == "":
             active_task.duration = "0d"
+        # the following tasks of the swimlane which start at the end of their predecessor move along
+        from gantt.scheduler import schedule_section
+
+        before = [(task.start, task.end) for task in active_section.tasks]
+        schedule_section(active_section)
+        moved = [
+            task
+            for task, dates in zip(active_section.tasks, before)
+            if (task.start, task.end) != dates
+        ]
+        self.propagate_dependencies(active_task, *moved)
+
+    def change_start(self, active_section: Section, active_task: Task) -> None:
+        # without a duration the end stays where it was put, only the tasks depending on it follow
+        if active_task.duration:
+            self.calc_end_date(active_section, active_task)
+        else:
+            self.propagate_dependencies(active_task)
 
-        duration = "".join(active_task.duration.split())
-        num = int(duration[:-1])
-        unit = duration[-1:]
+    def propagate_dependencies(self, *tasks: Task) -> None:
+        """Moves the tasks depending on the given ones (after/before), in all swimlanes."""
+        from gantt.dependencies import DependencyCycleError, follow
 
-        if unit == "d":
-            end = np.busday_offset(d, num, roll="forward")
-        elif unit == "w":
-            end = np.busday_offset(d, num * 7, roll="forward")
-        elif unit == "m":
-            end = np.busday_offset(d, num * 30, roll="forward")
-        elif unit == "y":
-            end = np.busday_offset(d, num * 365, roll="forward")
+        if self.gantt is None:
+            return
+        try:
+            follow(self.gantt).propagate(*tasks)
+        except DependencyCycleError as e:
+            ui.notify(str(e), type="warning")
 
-        active_task.end = str(end.astype("datetime64[D]"))
+    def mark_critical_path(self) -> None:
+        from gantt.dependencies import DependencyCycleError, follow
+
+        try:
+            critical = follow(self.gantt).mark_critical()
+        except DependencyCycleError as e:
+            ui.notify(str(e), type="warning")
+            return
+        ui.notify(f"{len(critical)} tasks on the critical path")
 
     def on_change_tab2(self, gantt):
         self.update_gantt(gantt)
@@ -99,44 +245,17 @@ config:
         if event.args[0] == self.CHART_LABEL:
             self.update_gantt(event.gantt)
 
-    def remove_task(
-        self, gantt: Gantt, section: Section, task: Task = None, row=None
-    ) -> None:
-        # get position of task to delete
-        cur_task_pos = section.tasks.index(task)
-        if cur_task_pos == 0 and len(section.tasks) > 1:
-            current_row_position = row.parent_slot.parent.default_slot.children.index(
-                row
-            )
-            if len(row.parent_slot.parent.default_slot.children) > 1:
-                # The first task of a section has been removed, so enable the swimlane input fields for the following task
-                next_row = row.parent_slot.parent.default_slot.children[
-                    current_row_position + 1
-                ]
-                next_row.default_slot.children[0] = (
-                    ui.input(
-                        placeholder="Swimlane ...",
-                        validation={"Name needed": lambda value: value != ""},
-                    )
-                    .bind_value(section, "title")
-                    .classes("col-1")
-                )
-                next_row.update()
-
+    def remove_task(self, gantt: Gantt, section: Section, task: Task) -> None:
+        # the row is removed by on_change, in this and every other client showing the gantt
         section.remove_task(task)
         if len(section.tasks) == 0:
             gantt.remove_section(section)
 
-        row.delete()
+    def add_task(self, active_section: Section, previous_task: Task = None) -> Task:
+        # the row is added by on_change, in this and every other client showing the gantt
+        return self.create_task(active_section, previous_task)
 
-    def add_task(
-        self,
-        gantt: Gantt,
-        data_container,
-        active_section: Section,
-        previous_task: Task = None,
-        previous_row=None,
-    ) -> Task:
+    def create_task(self, active_section: Section, previous_task: Task = None) -> Task:
         active_task = active_section.add_task("", previous_task)
         active_task.end = str(datetime.now().date())
 
@@ -144,104 +263,256 @@ config:
             active_task.start = previous_task.end
         else:
             active_task.start = str(datetime.now().date())
+        return active_task
+
+    def add_date_picker(self, date_input) -> None:
+        # the menu with the date picker is only created when it is opened for the first time
+        menu = None
 
+        def open_menu():
+            nonlocal menu
+            if menu is None:
+                with date_input:
+                    with ui.menu() as menu:
+                        ui.date().bind_value(date_input).props("first-day-of-week=1")
+            menu.open()
+
+        with date_input.add_slot("append"):
+            ui.icon("edit_calendar").on("click", open_menu).classes("cursor-pointer")
+
+    def add_swimlane_cell(self, section: Section, first: bool):
+        # only the first row of a swimlane has the input for its name
+        if first:
+            return self.bindings.bind_value(
+                ui.input(
+                    placeholder="Swimlane ...",
+                    validation={"Name needed": lambda value: value != ""},
+                ),
+                section,
+                "title",
+            ).classes("col-1")
+        return ui.label("").classes("col-1")
+
+    def update_swimlane_cells(self, section: Section) -> None:
+        # after an insert or removal only the first two rows of a swimlane can be wrong
+        for position, task in enumerate(section.tasks[:2]):
+            row = self.rows.get(task.id)
+            if row is None:
+                continue
+            cell = row.default_slot.children[0]
+            if isinstance(cell, ui.input) != (position == 0):
+                self.bindings.unbind(section, cell)
+                cell.delete()
+                with row:
+                    self.add_swimlane_cell(section, position == 0).move(target_index=0)
+
+    def add_row(
+        self,
+        gantt: Gantt,
+        data_container,
+        active_section: Section,
+        active_task: Task,
+    ) -> None:
         with data_container:
             with ui.element("div").classes("w-full row q-gutter-md") as active_row:
-                if len(active_section.tasks) == 1:
+                self.rows[active_task.id] = active_row
+                self.add_swimlane_cell(
+                    active_section, active_section.tasks[0] is active_task
+                )
+                bind = self.bindings.bind_value
+                bind(
                     ui.input(
-                        placeholder="Swimlane ...",
-                        validation={"Name needed": lambda value: value != ""},
-                    ).bind_value(active_section, "title").classes("col-1")
-                else:
-                    ui.label("").classes("col-1")
-
-                if previous_row:
-                    position = (
-                        active_row.parent_slot.parent.default_slot.children.index(
-                            previous_row
-                        )
-                    )
-                    active_row.move(target_index=position + 1)
-                ui.input(
-                    placeholder="Task ...",
-                    validation={"Title needed": lambda value: value != ""},
-                ).bind_value(active_task, "title").classes("col")
-                ui.select(["Task", "Milestone"]).bind_value(
-                    active_task, "type"
-                ).classes("col-1")
+                        placeholder="Task ...",
+                        validation={"Title needed": lambda value: value != ""},
+                    ),
+                    active_task,
+                    "title",
+                ).classes("col")
+                bind(ui.select(["Task", "Milestone"]), active_task, "type").classes(
+                    "col-1"
+                )
                 with ui.input().classes("col-1") as start_date:
-                    start_date.bind_value(active_task, "start")
-                    with start_date.add_slot("append"):
-                        ui.icon("edit_calendar").on(
-                            "click", lambda: menu.open()
-                        ).classes("cursor-pointer")
-                    with ui.menu() as menu:
-                        ui.date().bind_value(start_date).props("first-day-of-week=1")
+                    bind(start_date, active_task, "start").on(
+                        "blur", lambda: self.change_start(active_section, active_task)
+                    )
+                    self.add_date_picker(start_date)
 
-                ui.input(
+                duration = ui.input(
                     placeholder="Duration in d,w,m,y",
                     validation={
                         "Number followed by d for days, w for weeks, m for months, y for years": lambda value: re.match(
                             "[0-9]*[d,w,m,y]", "".join(value.split())
                         )
                     },
-                ).bind_value(active_task, "duration").on(
-                    "blur", lambda: self.calc_end_date(active_task)
+                )
+                bind(duration, active_task, "duration").on(
+                    "blur", lambda: self.calc_end_date(active_section, active_task)
                 ).classes("col-1")
 
                 with ui.input().classes("col-1") as end_date:
-                    end_date.bind_value(active_task, "end")
-                    with end_date.add_slot("append"):
-                        ui.icon("edit_calendar").on(
-                            "click", lambda: menu.open()
-                        ).classes("cursor-pointer")
-                    with ui.menu() as menu:
-                        ui.date().bind_value(end_date).props("first-day-of-week=1")
+                    bind(end_date, active_task, "end")
+                    self.add_date_picker(end_date)
 
-                ui.select(["active", "done"]).bind_value(active_task, "status").classes(
-                    "col-1"
-                )
-                ui.checkbox("Critical").bind_value(active_task, "critical").classes(
+                bind(ui.select(["active", "done"]), active_task, "status").classes(
                     "col-1"
                 )
+                bind(ui.checkbox("Critical"), active_task, "critical").classes("col-1")
                 with ui.element("q-btn-group").classes("col-1").props("flat"):
                     ui.button(
                         icon="add",
-                        on_click=lambda: self.add_task(
-                            gantt,
-                            data_container,
-                            active_section,
-                            active_task,
-                            active_row,
-                        ),
+                        on_click=lambda: self.add_task(active_section, active_task),
                     ).props("flat")  # .bind_enabled(self, "edit_visible")
                     ui.button(
                         icon="delete",
                         on_click=lambda: self.remove_task(
-                            gantt, active_section, active_task, active_row
+                            gantt, active_section, active_task
                         ),
                     ).props("flat")
                     # ui.button(icon="reorder").props("flat").bind_enabled(self, "edit_visible")
 
     def save_to_file(self, gantt: Gantt) -> None:
-        json_str = json.dumps(gantt, default=gantt_encoder, indent=2)
+        data = codec.dumps(gantt)
+        DOWNLOAD_BYTES.observe(len(data))
         ui.download(
-            json_str.encode(),
+            data,
             f'{gantt.title if gantt.title else "most_import_gantt_diagram_ever"}.json',
         )
 
-    def load_from_file(self, event: events.UploadEventArguments) -> None:
-        content = event.content.read().decode()
-        new_gantt = json.loads(content, object_hook=gantt_decoder)
-        swap_gantt(self.gantt, new_gantt)
-        self.gantt = new_gantt
-        ui.run_javascript("location.reload();")
+    async def load_from_file(self, event: events.UploadEventArguments) -> None:
+        # saved gantts, CSV and MS Project XML files, chosen by the file name
+        # the importers schedule the plan, numpy is only loaded with the first import
+        from gantt.importers import load_file
+
+        size = event.content.seek(0, 2)
+        event.content.seek(0)
+        loop = asyncio.get_running_loop()
 
-    def add_swimlane(self, gantt: Gantt, data_container) -> Section:
+        def progress(tasks: int, bytes_read: int) -> None:
+            # called in the worker thread, the elements are only touched in the event loop
+            loop.call_soon_threadsafe(
+                self.show_progress, tasks, bytes_read / max(size, 1)
+            )
+
+        self.show_progress(0, 0)
+        try:
+            # parsed in a thread, so a large upload does not block the event loop
+            new_gantt = await run.io_bound(
+                load_file,
+                event.content,
+                event.name,
+                MAX_UPLOAD_BYTES,
+                MAX_UPLOAD_TASKS,
+                progress,
+            )
+        except codec.GanttFormatError as e:
+            UPLOAD_ERRORS.inc()
+            ui.notify(f"Could not load {event.name}: {e}", type="negative")
+            return
+        finally:
+            self.import_progress.set_visibility(False)
+        UPLOAD_BYTES.observe(event.content.tell())
+        # the loaded plan replaces the content of the session's gantt, the id of the file is not taken over
+        self.gantt.replace_content(new_gantt)
+        self.show_tasks()
+
+    def show_progress(self, tasks: int, share: float) -> None:
+        self.import_progress.set_visibility(True)
+        self.import_bar.set_value(round(share, 2))
+        self.import_label.set_text(f"{tasks} tasks read" if tasks else "")
+
+    def add_swimlane(self, gantt: Gantt) -> Section:
         active_section = gantt.add_section("")
-        self.add_task(gantt, data_container, active_section)
+        self.add_task(active_section)
         return active_section
 
+    def insert_row(self, section: Section, task: Task) -> None:
+        self.add_row(self.gantt, self.data_container, section, task)
+        # the header is the first child of the container
+        position = 1 + section.tasks.index(task)
+        for other in self.gantt.sections:
+            if other is section:
+                break
+            position += len(other.tasks)
+        self.rows[task.id].move(target_index=position)
+        self.update_swimlane_cells(section)
+
+    def on_change(self, gantt: Gantt, change: tuple) -> None:
+        """
+        Listener of the gantt, called for the changes made by any client. Rows are added and
+        removed one by one, only bulk changes (e.g. a loaded plan) rebuild the task area.
+        The fields of the rows are updated through their bindings.
+        """
+        if self.client.id not in Client.instances:
+            # the page has been closed
+            self.close()
+            return
+        op = change[0]
+        # the fields of the rows and settings follow the change right away
+        self.bindings.on_change(gantt, change)
+        if op == "bulk" or (
+            op in ("gantt", "section") and change[-2] in ("sections", "tasks")
+        ):
+            self.schedule_rebuild()
+        elif self.rebuild_pending:
+            pass
+        elif self.grid is not None:
+            self.grid.on_change(change)
+        elif op == "add_task":
+            self.insert_row(change[1], change[2])
+        elif op == "remove_task":
+            row = self.rows.pop(change[2].id, None)
+            if row is not None:
+                row.delete()
+            self.bindings.unbind(change[2])
+            if not change[1].tasks:
+                self.bindings.unbind(change[1])
+            self.update_swimlane_cells(change[1])
+        if self.shows_in_diagram(change):
+            self.schedule_diagram_update()
+
+    @staticmethod
+    def shows_in_diagram(change: tuple) -> bool:
+        """False for changes of attributes the mermaid text does not contain, e.g. the duration of a task."""
+        op = change[0]
+        if op == "task" and isinstance(change[1], Task):
+            return change[2] in Task.MERMAID_FIELDS
+        if op == "gantt":
+            # swimlane and chart titles are part of the diagram, the id is not
+            return change[1] != "id"
+        return True
+
+    def call_soon(self, callback, delay: float = 0) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop (e.g. a script changing the gantt), done right away
+            callback()
+            return
+        loop.call_later(delay, callback)
+
+    def schedule_rebuild(self) -> None:
+        if not self.rebuild_pending:
+            self.rebuild_pending = True
+            self.call_soon(self.rebuild)
+
+    def rebuild(self) -> None:
+        if self.rebuild_pending and self.client.id in Client.instances:
+            # an empty gantt is filled by the client which emptied it, not by every client showing it
+            self.add_tasks(self.gantt, fill_empty=False)
+
+    def schedule_diagram_update(self) -> None:
+        # the diagram is updated at most every DIAGRAM_DELAY seconds and only while it is shown
+        if self.tab_panels is None or self.diagram_pending:
+            return
+        if self.tab_panels.value in (self.CHART_LABEL, self.diagram_tab):
+            self.diagram_pending = True
+            self.call_soon(self.refresh_diagram, self.DIAGRAM_DELAY)
+
+    def refresh_diagram(self) -> None:
+        self.diagram_pending = False
+        if self.client.id in Client.instances:
+            self.update_gantt(self.gantt)
+
     def setup_basics(self) -> None:
         ui.add_head_html(
             """
@@ -261,196 +532,238 @@ config:
         context.get_client().content.classes("h-[100vh]")
 
     def create_ui(self, gantt: Gantt) -> None:
+        self.gantt = gantt
+        self.client = context.client
         self.setup_basics()
 
         with ui.tabs().classes("w-full") as tabs:
             data_tab = ui.tab(self.DATA_LABEL)
-            diagram_tab = ui.tab(self.CHART_LABEL)
+            self.diagram_tab = ui.tab(self.CHART_LABEL)
 
         with ui.tab_panels(tabs, value=data_tab).classes("row fit") as tab_panels:
-            tab_panels.on("transition", lambda: self.on_change_tab2(gantt))
+            self.tab_panels = tab_panels
+            tab_panels.on("transition", lambda: self.on_change_tab2(self.gantt))
 
-            with ui.tab_panel(diagram_tab):
+            with ui.tab_panel(self.diagram_tab):
                 # with ui.card().classes("row fit"):
                 #    ui.textarea("Tweak UI").bind_value(self, "config").classes("col-12")
                 #    ui.button("Update", on_click=lambda: self.update_gantt())
 
+                self.add_viewport_settings()
                 with ui.card().classes("row fit"):
                     self.mermaid = ui.mermaid("").classes("col fit")
+                    self.svg = ui.html("").classes("col fit overflow-auto")
+                    self.parts_area = ui.column().classes("col fit")
 
             with ui.tab_panel(data_tab):
                 self.add_diagram_settings(gantt)
 
                 ui.row()
 
-                with ui.element("div").classes("w-full") as data_container:
-                    self.add_header()
-                    for active_section in gantt.sections:
-                        for index, active_task in enumerate(active_section.tasks):
-                            with ui.element("div").classes(
-                                "w-full row q-gutter-md"
-                            ) as active_row:
-                                if index == 0:
-                                    ui.input(
-                                        placeholder="Swimlane ...",
-                                        validation={
-                                            "Name needed": lambda value: value != ""
-                                        },
-                                    ).bind_value(active_section, "title").classes(
-                                        "col-1"
-                                    )
-                                else:
-                                    ui.label("").classes("col-1")
-
-                                ui.input(
-                                    placeholder="Task ...",
-                                    validation={
-                                        "Title needed": lambda value: value != ""
-                                    },
-                                ).bind_value(active_task, "title").classes("col")
-                                ui.select(["Task", "Milestone"]).bind_value(
-                                    active_task, "type"
-                                ).classes("col-1")
-                                with ui.input().classes("col-1") as start_date:
-                                    start_date.bind_value(active_task, "start")
-                                    with start_date.add_slot("append"):
-                                        ui.icon("edit_calendar").on(
-                                            "click", lambda: menu.open()
-                                        ).classes("cursor-pointer")
-                                    with ui.menu() as menu:
-                                        ui.date().bind_value(start_date).props(
-                                            "first-day-of-week=1"
-                                        )
-
-                                ui.input(
-                                    placeholder="Duration in d,w,m,y",
-                                    validation={
-                                        "Number followed by d for days, w for weeks, m for months, y for years": lambda value: re.match(
-                                            "[0-9]*[d,w,m,y]", "".join(value.split())
-                                        )
-                                    },
-                                ).bind_value(active_task, "duration").on(
-                                    "blur", lambda: self.calc_end_date(active_task)
-                                ).classes("col-1")
-
-                                with ui.input().classes("col-1") as end_date:
-                                    end_date.bind_value(active_task, "end")
-                                    with end_date.add_slot("append"):
-                                        ui.icon("edit_calendar").on(
-                                            "click", lambda: menu.open()
-                                        ).classes("cursor-pointer")
-                                    with ui.menu() as menu:
-                                        ui.date().bind_value(end_date).props(
-                                            "first-day-of-week=1"
-                                        )
-
-                                ui.select(["active", "done"]).bind_value(
-                                    active_task, "status"
-                                ).classes("col-1")
-                                ui.checkbox("Critical").bind_value(
-                                    active_task, "critical"
-                                ).classes("col-1")
-                                with ui.element("q-btn-group").classes("col-1").props(
-                                    "flat"
-                                ):
-                                    # this is cumbersome but I don't have a better solution for now
-                                    ui.button(
-                                        icon="add",
-                                        on_click=GanttEditor.get_add_handler(
-                                            self,
-                                            gantt,
-                                            data_container,
-                                            active_section,
-                                            active_task,
-                                            active_row,
-                                        ),
-                                    ).props(
-                                        "flat"
-                                    )  # .bind_enabled(self, "edit_visible")
-                                    ui.button(
-                                        icon="remove",
-                                        on_click=GanttEditor.get_remove_handler(
-                                            self,
-                                            gantt,
-                                            active_section,
-                                            active_task,
-                                            active_row,
-                                        ),
-                                    ).props("flat")  # .bind_enabled
-
-                with ui.element("div").classes("col-12"):
-                    ui.button(
-                        "Add Swimlane",
-                        on_click=lambda: self.add_swimlane(gantt, data_container),
-                    )
+                # the only part which depends on the tasks, rebuilt when another plan is loaded
+                self.task_area = ui.element("div").classes("w-full")
+                # all clients showing the gantt get its changes pushed, this one included
+                gantt.add_listener(self.on_change)
+                self.listening = gantt
+                OPEN_EDITORS.add(self)
+                # called once the browser has not come back within the reconnect timeout
+                self.client.on_disconnect(self.close)
+                self.add_tasks(gantt)
 
                 ui.row()
                 ui.separator()
                 ui.row()
 
                 with ui.element("div").classes("row w-full items-end q-gutter-md"):
-                    ui.button("Save Diagram", on_click=self.save_to_file)
+                    ui.button(
+                        "Save Diagram", on_click=lambda: self.save_to_file(self.gantt)
+                    )
+                    ui.button("Share", on_click=self.share)
                     with ui.expansion("Load"):
                         ui.upload(
-                            label="Load",
+                            label="Load (gantt JSON, CSV, MS Project XML)",
                             on_upload=self.load_from_file,
                             auto_upload=True,
-                        ).props("hide-upload-btn")
-                    ui.button("Clear", on_click=self.clear(gantt))
+                            max_file_size=MAX_UPLOAD_BYTES,
+                        ).props('hide-upload-btn accept=".json,.csv,.xml"')
+                        # shown while a file is read
+                        with ui.column().classes("w-full") as self.import_progress:
+                            self.import_bar = ui.linear_progress(show_value=False)
+                            self.import_label = ui.label("")
+                        self.import_progress.set_visibility(False)
+                    ui.button("Clear", on_click=lambda: self.clear(self.gantt))
                     # c.gantt = gantt
+                    self.capacity_input = ui.number(
+                        "Parallel tasks per swimlane", value=1, min=1, precision=0
+                    ).classes("col-2")
+                    ui.button("Level Resources", on_click=self.level_plan)
+                    ui.button("Critical Path", on_click=self.mark_critical_path)
+
+    def level_plan(self) -> None:
+        # dependencies first, then at most the given number of tasks per swimlane at the same time
+        # the dependency graph works on numpy dates, which are only loaded when needed
+        from gantt.levelling import Leveller
+
+        gantt = self.gantt
+        try:
+            leveller = Leveller(gantt, int(self.capacity_input.value or 1))
+            tasks, starts, lengths = leveller.plan()
+        except ValueError as e:
+            ui.notify(str(e), type="warning")
+            return
+        if self.use_grid(gantt):
+            # every client rebuilds its grid once instead of following each date, the store only saves the dates
+            gantt.announce_bulk()
+        changed = leveller.write_dates(tasks, starts, lengths)
+        ui.notify(f"{changed} dates changed")
+
+    def share(self) -> None:
+        # the link shows the chart only, the gantt id in the editor link would allow changes
+        path = f"/share/{sessions.share_token(self.gantt.id)}"
+        with ui.dialog() as dialog, ui.card():
+            ui.label("Read-only link, updated with every change of the diagram")
+            ui.link(path, path, new_tab=True)
+            with ui.row():
+                ui.link("SVG", f"{path}/chart.svg", new_tab=True)
+                ui.link("Mermaid", f"{path}/chart.mmd", new_tab=True)
+            ui.button("Close", on_click=dialog.close)
+        dialog.open()
+
+    def add_tasks(self, gantt: Gantt, fill_empty: bool = True) -> None:
+        self.task_area.clear()
+        self.bindings.prune()
+        self.grid = None
+        self.rows = {}
+        self.rebuild_pending = False
+        with self.task_area:
+            if self.use_grid(gantt):
+                # large plans get the virtualized grid instead of a row of inputs per task
+                self.grid = TaskGrid(self, gantt)
+            else:
+                with ui.element("div").classes("w-full") as data_container:
+                    self.data_container = data_container
+                    self.add_header()
+                    for active_section in gantt.sections:
+                        for active_task in active_section.tasks:
+                            self.add_row(
+                                gantt, data_container, active_section, active_task
+                            )
 
-        if len(gantt.sections) == 0:
-            self.add_swimlane(gantt, data_container)
+                with ui.element("div").classes("col-12"):
+                    ui.button(
+                        "Add Swimlane",
+                        on_click=lambda: self.add_swimlane(gantt),
+                    )
 
-    # there is probably a better way but I had interferances parallel user scenarios (aka lambda in loops).
-    @staticmethod
-    def get_add_handler(
-        this=None, gantt=None, container=None, section=None, task=None, row=None
-    ):
-        return lambda: this.add_task(gantt, container, section, task, row)
+        if fill_empty and len(gantt.sections) == 0:
+            if self.grid:
+                self.grid.add_swimlane()
+            else:
+                self.add_swimlane(gantt)
 
-    @staticmethod
-    def get_remove_handler(this=None, gantt=None, section=None, task=None, row=None):
-        return lambda: this.remove_task(gantt, section, task, row)
+    def show_tasks(self) -> None:
+        # the client, the settings bound to the gantt and the diagram elements stay, no page reload
+        self.add_tasks(self.gantt)
+        self.update_gantt(self.gantt)
+
+    def use_grid(self, gantt: Gantt) -> bool:
+        return (
+            sum(len(section.tasks) for section in gantt.sections) > self.GRID_THRESHOLD
+        )
 
-    async def clear(self, gantt) -> None:
+    def clear(self, gantt) -> None:
         gantt.sections = []
-        ui.run_javascript("location.reload();")
+        self.show_tasks()
+
+    def add_viewport_settings(self) -> None:
+        def update():
+            self.update_gantt(self.gantt)
+
+        def windowed(zoom) -> bool:
+            return zoom in ZOOMS
 
-    def add_diagram_settings(self, gantt: Gantt) -> None:
         with ui.element("div").classes("row w-full items-end q-gutter-md"):
-            ui.checkbox("Show Title").bind_value(gantt, "show_title").classes("col-1")
-            ui.input(
-                placeholder="Diagram Title ",
-                validation={"Title needed": lambda value: value != ""},
-            ).bind_value(gantt, "title").classes("col").bind_enabled(
-                gantt, "show_title"
-            )
+            # created with their values, the binding must not trigger an update before the chart exists
             ui.select(
-                ["%Y-%m-%d", "%d-%m-%Y", "%m-%Y", "%m"], label="Select Axis Time Format"
-            ).bind_value(gantt, "axis_format").classes("col-1")
+                [self.ALL_DATES, *ZOOMS],
+                label="Zoom",
+                value=self.zoom,
+                on_change=update,
+            ).bind_value(self, "zoom").classes("col-1")
+            ui.button(
+                icon="chevron_left", on_click=lambda: self.shift_window(-1)
+            ).props("flat").bind_visibility_from(self, "zoom", windowed)
+            with ui.input("From", value=self.window_start, on_change=update).classes(
+                "col-1"
+            ) as window_input:
+                window_input.bind_value(self, "window_start")
+                window_input.bind_visibility_from(self, "zoom", windowed)
+                self.add_date_picker(window_input)
+            self.window_input = window_input
+            ui.button(
+                icon="chevron_right", on_click=lambda: self.shift_window(1)
+            ).props("flat").bind_visibility_from(self, "zoom", windowed)
             ui.select(
-                ["auto", "1day", "1week", "1month"], label="Select Tick Interval"
-            ).bind_value(gantt, "tick_interval").classes("col-1")
-            ui.checkbox("Show Weekends in Timeline").bind_value(
-                gantt, "show_weekends"
+                list(SPLITS), label="Split Chart", value=self.split, on_change=update
+            ).bind_value(self, "split").classes("col-1")
+
+    def add_diagram_settings(self, gantt: Gantt) -> None:
+        with ui.element("div").classes("row w-full items-end q-gutter-md"):
+            bind = self.bindings.bind_value
+            bind(ui.checkbox("Show Title"), gantt, "show_title").classes("col-1")
+            title = bind(
+                ui.input(
+                    placeholder="Diagram Title ",
+                    validation={"Title needed": lambda value: value != ""},
+                ),
+                gantt,
+                "title",
+            ).classes("col")
+            self.bindings.bind_from(title, "enabled", gantt, "show_title")
+            bind(
+                ui.select(
+                    ["%Y-%m-%d", "%d-%m-%Y", "%m-%Y", "%m"],
+                    label="Select Axis Time Format",
+                ),
+                gantt,
+                "axis_format",
+            ).classes("col-1")
+            bind(
+                ui.select(
+                    ["auto", "1day", "1week", "1month"], label="Select Tick Interval"
+                ),
+                gantt,
+                "tick_interval",
+            ).classes("col-1")
+            bind(
+                ui.checkbox("Show Weekends in Timeline"), gantt, "show_weekends"
             ).classes("col-2")
-            ui.checkbox("Show Today Marker").bind_value(gantt, "show_today").classes(
+            bind(ui.checkbox("Show Today Marker"), gantt, "show_today").classes(
                 "col-2"
             )
+            ui.select(
+                [self.MERMAID_RENDERER, self.SVG_RENDERER], label="Renderer"
+            ).bind_value(self, "renderer").classes("col-1")
         with ui.element("div").classes("row w-full items-end q-gutter-md"):
-            ui.color_input(label="Starting Swimlane Color").classes("col").bind_value(
-                gantt, "section0bgcolor"
-            )
-            ui.color_input(label="Odd Swimlanes Color").classes("col").bind_value(
-                gantt, "odd_sectionbgcolor"
-            )
-            ui.color_input(label="Even Swimlanes Color").classes("col").bind_value(
-                gantt, "even_sectionbgcolor"
-            )
-            ui.color_input(label="Task Background Color").classes("col").bind_value(
-                gantt, "taskbgcolor"
-            )
+            for label, attribute in (
+                ("Starting Swimlane Color", "section0bgcolor"),
+                ("Odd Swimlanes Color", "odd_sectionbgcolor"),
+                ("Even Swimlanes Color", "even_sectionbgcolor"),
+                ("Task Background Color", "taskbgcolor"),
+            ):
+                bind(ui.color_input(label=label), gantt, attribute).classes("col")
+
+    def close(self) -> None:
+        """
+        Stops following the gantt. The listener is the only reference from the gantt to the page, without it
+        the elements of a closed page can be freed even if nobody edits the gantt any more.
+        """
+        if self.listening is not None:
+            self.listening.remove_listener(self.on_change)
+            self.listening = None
+        OPEN_EDITORS.discard(self)
+        # NiceGUI keeps the bindable page settings of the editor until they are removed explicitly
+        binding.remove([self])
 
     def add_header(self):
         with ui.element("div").classes("row w-full q-gutter-md"):
@@ -465,41 +778,136 @@ config:
             ui.label("Edit").classes("col-1 text-h6")
 
 
-def swap_gantt(oldGantt: Gantt, newGantt: Gantt):
-    global sessions
-    sessions.pop(oldGantt.id)
-    sessions[newGantt.id] = newGantt
-    app.storage.user["gantt_id"] = newGantt.id
-
-
 @ui.page("/")
-def index():
-    global sessions
+def index(gantt: str = None):
+    with PAGE_BUILD_SECONDS.time(), profiled("page"):
+        build_page(gantt)
+    CLIENT_ELEMENTS.observe(len(context.client.elements))
+
+
+def build_page(join: str = None) -> None:
+    # the gantt of a browser is kept in the store, not in app.storage.user which every worker keeps
+    # for itself, so any worker opens the same gantt without sticky sessions
+    user = app.storage.browser["id"]
+    if join and join in sessions:
+        # /?gantt=<id> opens the gantt of another user, both edit the same object from now on
+        sessions.assign(user, join)
     editor = GanttEditor()
-    id = app.storage.user.get("gantt_id")
+    id = sessions.assigned(user)
     if not id:
-        # did not find any way to provide a custom json encoder/decoder to NiceGUI. Therefore I was not able to
-        # just put the Gantt Object in the storare. Rather unelegant but it works for now
-        id = str(uuid.uuid4())
+        # another worker may be building the first page of this browser at the same time, the first one decides
+        id = sessions.assign(user, str(uuid.uuid4()), replace=False)
+    if id not in sessions:
+        # a new browser, or its gantt has been deleted
         gantt = Gantt(id=id, sections=[])
         editor.gantt = gantt
         sessions[id] = gantt
-        app.storage.user["gantt_id"] = id
         editor.setup_basics()
         editor.create_ui(gantt)
     else:
-        if id in sessions:
-            gantt = sessions[id]
-            editor.gantt = gantt
-            print(gantt.sections)
-            editor.create_ui(gantt)
+        gantt = sessions[id]
+        editor.gantt = gantt
+        editor.create_ui(gantt)
+
 
+@app.get("/metrics")
+def metrics(request: Request) -> Response:
+    # only for scrapers on the same host unless GANTT_METRICS_REMOTE is set
+    host = request.client.host if request.client else None
+    if not METRICS_REMOTE and host not in ("127.0.0.1", "::1"):
+        return Response(status_code=403)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def close_deleted_editors() -> None:
+    # pages which never connected are deleted by NiceGUI without calling the disconnect handlers
+    for editor in list(OPEN_EDITORS):
+        if editor.client.id not in Client.instances:
+            editor.close()
+
+
+async def flush_sessions() -> None:
+    sweeps = 0
+    while True:
+        await asyncio.sleep(SESSION_FLUSH_SECONDS)
+        close_deleted_editors()
+        sweeps += 1
+        if sweeps % SESSION_EVICT_EVERY == 0:
+            sessions.evict()
         else:
-            gantt = Gantt(id=id, sections=[])
-            editor.gantt = gantt
-            sessions[id] = gantt
-            editor.create_ui(gantt)
+            sessions.flush()
 
 
-sessions = {}
-ui.run(storage_secret="storage_gibberish")
+def create_app() -> None:
+    """
+    Opens the session store and registers the background tasks. Nothing of this happens at import,
+    so ui.main can be imported by tools and benchmarks without touching the store.
+    """
+    global sessions
+    if sessions is not None:
+        return
+    # all worker processes pointing to the same store share their gantts, e.g. GANTT_STORE=sqlite:////data/gantts.db or file:///data/gantts
+    # gantts which are idle or exceed the memory budget are dropped from memory and loaded again on access
+    budget_mb = int(os.environ.get("GANTT_MEMORY_BUDGET_MB", "256"))
+    sessions = SessionStore(
+        backend=open_backend(
+            os.environ.get("GANTT_STORE", "sqlite:///gantt_sessions.db")
+        ),
+        memory_budget=budget_mb * 1024 * 1024,
+        idle_seconds=float(os.environ.get("GANTT_SESSION_IDLE_SECONDS", "900")),
+    )
+    REGISTRY.gauge(
+        "gantt_clients", "Connected and pending clients", lambda: len(Client.instances)
+    )
+    REGISTRY.gauge("gantt_sessions", "Gantts in memory", lambda: len(sessions.sessions))
+    REGISTRY.gauge(
+        "gantt_session_memory_bytes",
+        "Estimated memory of all gantts in memory",
+        lambda: sessions.memory_used,
+    )
+    REGISTRY.gauge(
+        "gantt_session_memory_max_bytes",
+        "Estimated memory of the largest gantt in memory",
+        lambda: max(sessions.sizes.values(), default=0),
+    )
+    app.include_router(create_router(sessions, MAX_UPLOAD_BYTES, MAX_UPLOAD_TASKS))
+    app.include_router(create_share_router(sessions, SHARE_MAX_AGE))
+    app.on_startup(startup)
+    app.on_shutdown(sessions.flush)
+
+
+def startup() -> None:
+    STARTUP_SECONDS.set(time.perf_counter() - STARTED)
+    background_tasks.create(flush_sessions())
+
+
+def main() -> None:
+    if not STORAGE_SECRET:
+        # the secret signs the browser sessions, a value everybody knows would make them forgeable
+        sys.exit(
+            "Set GANTT_STORAGE_SECRET to a long random value, the same for all instances"
+        )
+    create_app()
+    # the auto reload runs a file watcher and a second process, only wanted while developing
+    ui.run(
+        storage_secret=STORAGE_SECRET,
+        port=int(os.environ.get("PORT", "8080")),
+        reload=os.environ.get("GANTT_RELOAD", "") not in ("", "0"),
+    )
+
+
+sessions = None
+# the editors following a gantt, weak so that the set does not keep closed pages alive itself
+OPEN_EDITORS = weakref.WeakSet()
+SESSION_FLUSH_SECONDS = 5
+MAX_UPLOAD_BYTES = int(os.environ.get("GANTT_MAX_UPLOAD_MB", "20")) * 1024 * 1024
+MAX_UPLOAD_TASKS = int(os.environ.get("GANTT_MAX_TASKS", str(codec.MAX_TASKS)))
+SESSION_EVICT_EVERY = 12
+STORAGE_SECRET = os.environ.get("GANTT_STORAGE_SECRET")
+SHARE_MAX_AGE = int(os.environ.get("GANTT_SHARE_MAX_AGE", "60"))
+METRICS_REMOTE = os.environ.get("GANTT_METRICS_REMOTE", "") not in ("", "0")
+STARTUP_SECONDS = REGISTRY.gauge(
+    "gantt_startup_seconds", "Time from the first import until the server was ready"
+)
+if __name__ in {"__main__", "__mp_main__"}:
+    main()
@@ -0,0 +1,93 @@
+"""
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+"""
+
+from nicegui import binding
+
+
+def identity(value):
+    return value
+
+
+class ModelBindings:
+    """
+    Bindings between elements of one client and attributes of the gantt, its sections and tasks.
+
+    NiceGUI polls every binding to a plain object ten times a second. These bindings are pushed
+    instead: element changes reach the model through the bindable value of the element, model
+    changes reach the elements through the change events of the gantt (see on_change).
+    """
+
+    def __init__(self) -> None:
+        # id(obj) -> (obj, {attribute: [(element, element attribute, backward), ...]})
+        self.bindings = {}
+
+    def bind_from(self, element, name: str, obj, attribute: str, backward=identity):
+        """One way, the element attribute name follows obj.attribute."""
+        setattr(element, name, backward(getattr(obj, attribute)))
+        entry = self.bindings.get(id(obj))
+        if entry is None or entry[0] is not obj:
+            # a new object, or a dropped one whose id has been reused
+            entry = self.bindings[id(obj)] = (obj, {})
+        entry[1].setdefault(attribute, []).append((element, name, backward))
+        return element
+
+    def bind_value(
+        self, element, obj, attribute: str, forward=identity, backward=identity
+    ):
+        """Both ways, the model value wins when binding like with NiceGUI's bind_value."""
+        self.bind_from(element, "value", obj, attribute, backward)
+        # the value of an element is a bindable property, its changes are propagated without polling
+        binding.bind_to(element, "value", obj, attribute, forward)
+        return element
+
+    def unbind(self, obj, element=None) -> None:
+        """Forgets the bindings of obj, only those of element if given."""
+        entry = self.bindings.get(id(obj))
+        if entry is None or entry[0] is not obj:
+            return
+        if element is None:
+            del self.bindings[id(obj)]
+            return
+        for entries in entry[1].values():
+            entries[:] = [item for item in entries if item[0] is not element]
+
+    def push(self, obj, attribute: str, value) -> None:
+        entry = self.bindings.get(id(obj))
+        if entry is None or entry[0] is not obj:
+            return
+        for element, name, backward in entry[1].get(attribute, ()):
+            if not element.is_deleted:
+                new_value = backward(value)
+                if getattr(element, name) != new_value:
+                    setattr(element, name, new_value)
+
+    def on_change(self, gantt, change: tuple) -> None:
+        """Applies a change event of the gantt, e.g. ("task", task, "title", "Design")."""
+        if change[0] == "gantt":
+            self.push(gantt, change[1], change[2])
+        elif change[0] in ("task", "section"):
+            self.push(change[1], change[2], change[3])
+
+    def prune(self) -> None:
+        """Drops the bindings of deleted elements, e.g. after the task area has been cleared."""
+        for key, (_, attributes) in list(self.bindings.items()):
+            for attribute, entries in list(attributes.items()):
+                entries[:] = [item for item in entries if not item[0].is_deleted]
+                if not entries:
+                    del attributes[attribute]
+            if not attributes:
+                del self.bindings[key]
@@ -0,0 +1,61 @@
+"""
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+"""
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from gantt.gantt_builder import Gantt
+from gantt.session_store import SessionStore
+from gantt.share import FORMATS, render_share
+
+
+def create_share_router(sessions: SessionStore, max_age: int) -> APIRouter:
+    """
+    Read-only views of a gantt, plain HTTP without a NiceGUI client. The links carry a random token
+    which is looked up in the store, the gantt id is never revealed. The responses may be kept by
+    browsers and proxies for max_age seconds and are revalidated by the content hash afterwards.
+    """
+    router = APIRouter(prefix="/share", tags=["share"])
+
+    def get_gantt(token: str) -> Gantt:
+        id = sessions.shared_id(token)
+        if id is None:
+            raise HTTPException(404, "Unknown share link")
+        return sessions[id]
+
+    def respond(token: str, format: str, request: Request) -> Response:
+        gantt = get_gantt(token)
+        etag = f'"{gantt.content_hash()}-{format}"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            render_share(gantt, format), media_type=FORMATS[format], headers=headers
+        )
+
+    # coroutines like the API, the session store is only used from the event loop
+    @router.get("/{token}")
+    async def page(token: str, request: Request) -> Response:
+        return respond(token, "html", request)
+
+    @router.get("/{token}/chart.svg")
+    async def svg(token: str, request: Request) -> Response:
+        return respond(token, "svg", request)
+
+    @router.get("/{token}/chart.mmd")
+    async def mermaid(token: str, request: Request) -> Response:
+        return respond(token, "mermaid", request)
+
+    return router
@@ -0,0 +1,182 @@
+"""
+Copyright (C) 2024 Tobias Himstedt
+
+
+This file is part of Gladstone Gantter (GG).
+
+GG is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+GG is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+"""
+
+from operator import itemgetter
+
+from gantt.gantt_builder import Gantt, Section, Task
+from gantt.indexed_list import IndexedList
+from nicegui import events, ui
+
+# fields of a task which can be edited in the grid
+TASK_FIELDS = ("title", "type", "start", "duration", "end", "status", "critical")
+
+
+class RowList(IndexedList):
+    """The rowData of the grid, found by task id."""
+
+    __slots__ = ()
+
+    key = staticmethod(itemgetter("id"))
+
+
+class TaskGrid:
+    """
+    Editor for large plans. AG Grid only renders the rows in the viewport and creates
+    a cell editor (including the date picker) only while a cell is edited, so the number
+    of server side elements does not depend on the size of the plan.
+    """
+
+    def __init__(self, editor, gantt: Gantt) -> None:
+        self.editor = editor
+        self.gantt = gantt
+        self.index = {}
+        # the row dicts are shared with the rowData of the grid, so they stay valid for reconnecting clients
+        self.rows = RowList()
+        self.rows_by_id = {}
+        for section in gantt.sections:
+            for task in section.tasks:
+                self.index[task.id] = (section, task)
+                self.rows_by_id[task.id] = self.row(section, task)
+                self.rows.append(self.rows_by_id[task.id])
+
+        with ui.element("div").classes("row w-full q-gutter-md"):
+            ui.button("Add Task", icon="add", on_click=self.add_task)
+            ui.button("Delete Task", icon="delete", on_click=self.remove_task)
+            ui.button("Add Swimlane", on_click=self.add_swimlane)
+        self.grid = ui.aggrid(
+            {
+                "columnDefs": [
+                    {"field": "section", "headerName": "Swimlane", "editable": True},
+                    {"field": "title", "headerName": "Task", "editable": True, "flex": 2},
+                    {
+                        "field": "type",
+                        "editable": True,
+                        "cellEditor": "agSelectCellEditor",
+                        "cellEditorParams": {"values": ["Task", "Milestone"]},
+                    },
+                    {"field": "start", "editable": True, "cellEditor": "agDateStringCellEditor"},
+                    {"field": "duration", "editable": True},
+                    {"field": "end", "editable": True, "cellEditor": "agDateStringCellEditor"},
+                    {
+                        "field": "status",
+                        "editable": True,
+                        "cellEditor": "agSelectCellEditor",
+                        "cellEditorParams": {"values": ["", "active", "done"]},
+                    },
+                    {"field": "critical", "editable": True, "cellDataType": "boolean"},
+                ],
+                "defaultColDef": {"flex": 1},
+                "rowData": self.rows,
+                "rowSelection": "single",
+                ":getRowId": "(params) => params.data.id",
+            }
+        ).classes("w-full h-[70vh]")
+        self.grid.on("cellValueChanged", self.on_cell_changed)
+
+    @staticmethod
+    def row(section: Section, task: Task) -> dict:
+        row = {field: getattr(task, field) for field in TASK_FIELDS}
+        row["id"] = task.id
+        row["section"] = section.title
+        return row
+
+    def position(self, task: Task) -> int:
+        return self.rows.position(task.id)
+
+    def update_rows(self, section: Section) -> None:
+        rows = []
+        for task in section.tasks:
+            row = self.rows_by_id[task.id]
+            row.update(self.row(section, task))
+            rows.append(row)
+        self.grid.run_grid_method("applyTransaction", {"update": rows})
+
+    def on_cell_changed(self, event: events.GenericEventArguments) -> None:
+        task_id = event.args["data"]["id"]
+        if task_id not in self.index:
+            return
+        section, task = self.index[task_id]
+        field = event.args["colId"]
+        value = event.args["newValue"]
+        if field == "section":
+            section.title = value or ""
+        elif field in TASK_FIELDS:
+            setattr(task, field, value if value is not None else "")
+            if field == "start":
+                self.editor.change_start(section, task)
+            elif field == "duration":
+                self.editor.calc_end_date(section, task)
+        # the rows are updated by on_change, like for changes of other clients
+
+    def on_change(self, change: tuple) -> None:
+        """Applies a change of the gantt to the rows, bulk changes rebuild the whole grid instead."""
+        op = change[0]
+        if op == "task":
+            _, task, field, _ = change
+            row = self.rows_by_id.get(task.id)
+            if row is not None and field in TASK_FIELDS:
+                row[field] = getattr(task, field)
+                self.grid.run_grid_method("applyTransaction", {"update": [row]})
+        elif op == "section" and change[2] == "title":
+            self.update_rows(change[1])
+        elif op == "add_task":
+            _, section, task = change
+            self.insert(section, task, self.insert_position(section, task))
+        elif op == "remove_task":
+            task = change[2]
+            row = self.rows_by_id.pop(task.id, None)
+            self.index.pop(task.id, None)
+            if row is not None:
+                self.rows.remove(row)
+                self.grid.run_grid_method("applyTransaction", {"remove": [{"id": task.id}]})
+
+    def insert_position(self, section: Section, task: Task) -> int:
+        # after the previous task of the swimlane, before the next one or at the end for a new swimlane
+        position = section.tasks.index(task)
+        if position > 0:
+            return self.position(section.tasks[position - 1]) + 1
+        if position + 1 < len(section.tasks):
+            return self.position(section.tasks[position + 1])
+        return len(self.rows)
+
+    async def selected(self):
+        row = await self.grid.get_selected_row()
+        if not row:
+            ui.notify("Select a task first")
+            return None
+        return self.index.get(row["id"])
+
+    def insert(self, section: Section, task: Task, position: int) -> None:
+        self.index[task.id] = (section, task)
+        row = self.rows_by_id[task.id] = self.row(section, task)
+        self.rows.insert(position, row)
+        self.grid.run_grid_method("applyTransaction", {"add": [row], "addIndex": position})
+
+    async def add_task(self) -> None:
+        selected = await self.selected()
+        if selected:
+            section, previous_task = selected
+            self.editor.create_task(section, previous_task)
+
+    async def remove_task(self) -> None:
+        selected = await self.selected()
+        if selected:
+            section, task = selected
+            self.editor.remove_task(self.gantt, section, task)
+
+    def add_swimlane(self) -> None:
+        self.editor.add_swimlane(self.gantt)